@@ -8,6 +8,9 @@ let mainWindow;
 
 let SERVER_HOST;
 let SERVER_PORT;
+// Intervalo do PING enviado ao servidor, que encerra conexões sem tráfego (ver HEARTBEAT_TIMEOUT_SECONDS)
+let HEARTBEAT_INTERVAL_MS = 30000;
+let heartbeatTimer = null;
 
 let userRequestedQuit = false;
 const client = new net.Socket();
@@ -16,14 +19,17 @@ let tcpBuffer = Buffer.alloc(0);
 // Mapeamento de códigos de comando
 const CommandCode = {
     REGISTER: 0x01, LOGIN: 0x02, GET_INITIAL_DATA: 0x03, SEARCH_USER: 0x04,
-    ADD_FRIEND: 0x05, ACCEPT_FRIEND: 0x06, REJECT_FRIEND: 0x07, INVITE: 0x10,
-    ACCEPT: 0x11, REJECT: 0x12, BYE: 0x13,
+    ADD_FRIEND: 0x05, ACCEPT_FRIEND: 0x06, REJECT_FRIEND: 0x07, PING: 0x08,
+    INVITE: 0x10, ACCEPT: 0x11, REJECT: 0x12, BYE: 0x13,
     REGISTER_RESPONSE: 0x81, LOGIN_RESPONSE: 0x82, FRIEND_LIST: 0x83,
     PENDING_FRIEND_REQUESTS: 0x84, SEARCH_RESPONSE: 0x85, ADD_FRIEND_RESPONSE: 0x86,
-    INCOMING_FRIEND_REQUEST: 0x87, FRIEND_REQUEST_ACCEPTED: 0x88, INVITE_RESPONSE: 0x90,
+    INCOMING_FRIEND_REQUEST: 0x87, FRIEND_REQUEST_ACCEPTED: 0x88, PONG: 0x89, FRIEND_LIST_DELTA: 0x8A,
+    INVITE_RESPONSE: 0x90,
     INCOMING_CALL: 0x91, CALL_ACCEPTED: 0x92, CALL_REJECTED: 0x93,
-    CALL_ENDED: 0x94, STATUS_UPDATE: 0xA0, ERROR: 0xFF
+    CALL_ENDED: 0x94, STATUS_UPDATE: 0xA0, STATUS_UPDATE_BATCH: 0xA1, ERROR: 0xFF
 };
+// Recursos anunciados no LOGIN: aceita STATUS_UPDATE_BATCH (FEATURE_STATUS_BATCH)
+const CLIENT_FEATURES = 0x1;
 const CODE_TO_COMMAND_NAME = Object.fromEntries(Object.entries(CommandCode).map(([k, v]) => [v, k]));
 
 function serializeString(str) {
@@ -67,6 +73,18 @@ function deserializeUInt16BE(buffer, offset = 0) {
     return { value: val, nextOffset: offset + 2 };
 }
 
+function serializeUInt32BE(num) {
+    const buf = Buffer.alloc(4);
+    buf.writeUInt32BE(num || 0, 0);
+    return buf;
+}
+
+function deserializeUInt32BE(buffer, offset = 0) {
+    if (buffer.length < offset + 4) throw new Error("Buffer insuficiente (UInt32)");
+    const val = buffer.readUInt32BE(offset);
+    return { value: val, nextOffset: offset + 4 };
+}
+
 function serializePayload(commandCode, payload) {
     const buffers = [];
     try {
@@ -75,10 +93,21 @@ function serializePayload(commandCode, payload) {
             buffers.push(serializeString(payload.password));
             if (commandCode === CommandCode.REGISTER) {
                 buffers.push(serializeString(payload.name));
+            } else {
+                buffers.push(serializeUInt32BE(CLIENT_FEATURES));
             }
-        } else if (commandCode === CommandCode.GET_INITIAL_DATA || commandCode === CommandCode.BYE) {
+        } else if (commandCode === CommandCode.GET_INITIAL_DATA) {
+            // Versão da lista de amigos em cache: o servidor responde só com as mudanças (FRIEND_LIST_DELTA)
+            if (payload.since_version !== undefined && payload.since_version !== null) {
+                buffers.push(serializeUInt32BE(payload.since_version));
+            }
+        } else if (commandCode === CommandCode.BYE || commandCode === CommandCode.PING) {
         } else if (commandCode === CommandCode.SEARCH_USER) {
             buffers.push(serializeString(payload.nickname_query));
+            // Cursor opcional de paginação (último nickname recebido); '' pede a primeira página
+            if (payload.cursor !== undefined && payload.cursor !== null) {
+                buffers.push(serializeString(payload.cursor));
+            }
         } else if (commandCode === CommandCode.ADD_FRIEND) {
             buffers.push(serializeString(payload.target_nickname));
         } else if (commandCode === CommandCode.ACCEPT_FRIEND || commandCode === CommandCode.REJECT_FRIEND) {
@@ -128,6 +157,10 @@ function deserializePayload(commandCode, payloadBuffer) {
             if (commandCode === CommandCode.LOGIN_RESPONSE && payload.success) {
                 result = deserializeString(payloadBuffer, offset); payload.nickname = result.value; offset = result.nextOffset;
             }
+            // Limite de requisições: tempo (ms) até o servidor voltar a aceitar o comando
+            if (commandCode === CommandCode.ERROR && offset + 4 <= payloadBuffer.length) {
+                payload.retry_after_ms = payloadBuffer.readUInt32BE(offset); offset += 4;
+            }
         }
         else if (commandCode === CommandCode.FRIEND_LIST) {
             let result = deserializeUInt16BE(payloadBuffer, offset); const count = result.value; offset = result.nextOffset;
@@ -137,6 +170,10 @@ function deserializePayload(commandCode, payloadBuffer) {
                 let statusRes = deserializeString(payloadBuffer, offset); offset = statusRes.nextOffset;
                 payload.friends.push({ nickname: nickRes.value, status: statusRes.value });
             }
+            // Lista em pedaços: `more` indica que ainda vêm outros frames da mesma lista
+            if (offset < payloadBuffer.length) {
+                result = deserializeBool(payloadBuffer, offset); payload.more = result.value; offset = result.nextOffset;
+            }
         }
         else if (commandCode === CommandCode.PENDING_FRIEND_REQUESTS) {
             let result = deserializeUInt16BE(payloadBuffer, offset); const count = result.value; offset = result.nextOffset;
@@ -145,6 +182,32 @@ function deserializePayload(commandCode, payloadBuffer) {
                 let nickRes = deserializeString(payloadBuffer, offset); offset = nickRes.nextOffset;
                 payload.requests_from.push(nickRes.value);
             }
+            if (offset < payloadBuffer.length) {
+                result = deserializeBool(payloadBuffer, offset); payload.more = result.value; offset = result.nextOffset;
+            }
+        }
+        else if (commandCode === CommandCode.FRIEND_LIST_DELTA) {
+            let result = deserializeUInt32BE(payloadBuffer, offset); payload.version = result.value; offset = result.nextOffset;
+            result = deserializeUInt16BE(payloadBuffer, offset); let count = result.value; offset = result.nextOffset;
+            payload.added = [];
+            for (let i = 0; i < count; i++) {
+                let nickRes = deserializeString(payloadBuffer, offset); offset = nickRes.nextOffset;
+                let statusRes = deserializeString(payloadBuffer, offset); offset = statusRes.nextOffset;
+                payload.added.push({ nickname: nickRes.value, status: statusRes.value });
+            }
+            result = deserializeUInt16BE(payloadBuffer, offset); count = result.value; offset = result.nextOffset;
+            payload.removed = [];
+            for (let i = 0; i < count; i++) {
+                let nickRes = deserializeString(payloadBuffer, offset); offset = nickRes.nextOffset;
+                payload.removed.push(nickRes.value);
+            }
+            result = deserializeUInt16BE(payloadBuffer, offset); count = result.value; offset = result.nextOffset;
+            payload.statuses = [];
+            for (let i = 0; i < count; i++) {
+                let nickRes = deserializeString(payloadBuffer, offset); offset = nickRes.nextOffset;
+                let statusRes = deserializeString(payloadBuffer, offset); offset = statusRes.nextOffset;
+                payload.statuses.push({ nickname: nickRes.value, status: statusRes.value });
+            }
         }
         else if (commandCode === CommandCode.SEARCH_RESPONSE) {
             let result = deserializeBool(payloadBuffer, offset); payload.success = result.value; offset = result.nextOffset;
@@ -155,6 +218,10 @@ function deserializePayload(commandCode, payloadBuffer) {
                 let nameRes = deserializeString(payloadBuffer, offset); offset = nameRes.nextOffset;
                 payload.results.push({ nickname: nickRes.value, name: nameRes.value });
             }
+            // Cursor da próxima página: só vem quando o pedido trouxe um cursor ('' = não há mais resultados)
+            if (offset < payloadBuffer.length) {
+                result = deserializeString(payloadBuffer, offset); payload.next_cursor = result.value; offset = result.nextOffset;
+            }
         }
         else if (commandCode === CommandCode.INCOMING_FRIEND_REQUEST) {
             let result = deserializeString(payloadBuffer, offset); payload.from_nickname = result.value; offset = result.nextOffset;
@@ -182,12 +249,26 @@ function deserializePayload(commandCode, payloadBuffer) {
             let result = deserializeString(payloadBuffer, offset); payload.nickname = result.value; offset = result.nextOffset;
             result = deserializeString(payloadBuffer, offset); payload.status = result.value; offset = result.nextOffset;
         }
+        else if (commandCode === CommandCode.STATUS_UPDATE_BATCH) {
+            // Último status de cada amigo que mudou na janela de presença do servidor
+            let result = deserializeUInt16BE(payloadBuffer, offset); const count = result.value; offset = result.nextOffset;
+            payload.updates = [];
+            for (let i = 0; i < count; i++) {
+                let nickRes = deserializeString(payloadBuffer, offset); offset = nickRes.nextOffset;
+                let statusRes = deserializeString(payloadBuffer, offset); offset = statusRes.nextOffset;
+                payload.updates.push({ nickname: nickRes.value, status: statusRes.value });
+            }
+            if (offset < payloadBuffer.length) {
+                result = deserializeBool(payloadBuffer, offset); payload.more = result.value; offset = result.nextOffset;
+            }
+        }
         else if (commandCode === CommandCode.REGISTER || commandCode === CommandCode.LOGIN ||
             commandCode === CommandCode.GET_INITIAL_DATA || commandCode === CommandCode.SEARCH_USER ||
             commandCode === CommandCode.ADD_FRIEND || commandCode === CommandCode.ACCEPT_FRIEND ||
             commandCode === CommandCode.REJECT_FRIEND || commandCode === CommandCode.INVITE ||
             commandCode === CommandCode.ACCEPT || commandCode === CommandCode.REJECT ||
-            commandCode === CommandCode.BYE) 
+            commandCode === CommandCode.BYE || commandCode === CommandCode.PING ||
+            commandCode === CommandCode.PONG) 
             { }
         else { throw new Error(`Desserialização não implementada para ${CODE_TO_COMMAND_NAME[commandCode]}`); }
 
@@ -214,6 +295,18 @@ function createBinaryMessage(commandCode, payload) {
 }
 
 
+// Heartbeat: PING periódico para o servidor não considerar a conexão ociosa
+function startHeartbeat() {
+    stopHeartbeat();
+    heartbeatTimer = setInterval(() => {
+        if (!client.destroyed) client.write(createBinaryMessage(CommandCode.PING, {}));
+    }, HEARTBEAT_INTERVAL_MS);
+}
+
+function stopHeartbeat() {
+    if (heartbeatTimer) { clearInterval(heartbeatTimer); heartbeatTimer = null; }
+}
+
 // Criação das janelas Auth e Main
 function createAuthWindow() {
     if (authWindow) return;
@@ -266,6 +359,7 @@ app.whenReady().then(() => {
 
         SERVER_HOST = config.server_host || '127.0.0.1';
         SERVER_PORT = config.server_port || 8888;
+        HEARTBEAT_INTERVAL_MS = (config.heartbeat_interval_seconds || 30) * 1000;
 
         console.log(`configurado para: ${SERVER_HOST}:${SERVER_PORT}`);
     } catch (err) {
@@ -277,6 +371,8 @@ app.whenReady().then(() => {
     }
 
     console.log('Tentando conectar ao servidor Python...');
+    // Vale também para as reconexões feitas em 'activate'
+    client.on('connect', startHeartbeat);
     client.connect(SERVER_PORT, SERVER_HOST, () => {
         console.log('[DEBUG] Dentro do callback de client.connect!');
         console.log('Cliente Electron conectado ao servidor Python.');
@@ -294,6 +390,8 @@ app.whenReady().then(() => {
             if (tcpBuffer.length < totalMessageLength) break;
             const payloadBuffer = tcpBuffer.subarray(3, totalMessageLength);
             tcpBuffer = tcpBuffer.subarray(totalMessageLength);
+            // Resposta ao heartbeat: não interessa às janelas
+            if (commandCode === CommandCode.PONG) continue;
             try {
                 const payload = deserializePayload(commandCode, payloadBuffer);
                 const commandName = CODE_TO_COMMAND_NAME[commandCode] || `UNKNOWN(0x${commandCode.toString(16)})`;
@@ -330,6 +428,7 @@ app.whenReady().then(() => {
     client.on('close', () => {
         console.log('Conexão com o servidor de sinalização fechada.');
         tcpBuffer = Buffer.alloc(0);
+        stopHeartbeat();
 
         if (userRequestedQuit) {
             console.log("Socket fechado durante o processo de quit iniciado pelo usuário. Não recriar janela.");
@@ -37,6 +37,10 @@ const endCallBtn = document.getElementById('end-call-btn');
 const state = {
     currentUser: localStorage.getItem('currentUserNickname') || 'user_error',
     contacts: new Map(),
+    // Verdadeiro enquanto chegam os pedaços de uma FRIEND_LIST (frames com `more`)
+    receivingFriendList: false,
+    // Versão da lista de amigos no servidor que o cache local reflete (null = sem cache)
+    friendListVersion: null,
     currentCall: {
         nickname: null,
         status: 'idle'
@@ -44,6 +48,27 @@ const state = {
 };
 loggedInUserNickname.innerText = state.currentUser;
 
+// Cache da lista de amigos por usuário (versão + nicknames): na reconexão só as mudanças são baixadas
+const friendCacheKey = `friendListCache:${state.currentUser}`;
+
+function loadFriendCache() {
+    try {
+        const cached = JSON.parse(localStorage.getItem(friendCacheKey));
+        if (cached && Number.isInteger(cached.version) && Array.isArray(cached.friends)) return cached;
+    } catch (e) {
+        console.warn('Cache da lista de amigos inválido, descartando.', e);
+    }
+    return null;
+}
+
+function saveFriendCache() {
+    if (state.friendListVersion === null) return;
+    localStorage.setItem(friendCacheKey, JSON.stringify({
+        version: state.friendListVersion,
+        friends: Array.from(state.contacts.keys())
+    }));
+}
+
 // Renderizando a lista de contatos
 function renderContacts() {
     contactList.innerHTML = '';
@@ -305,10 +330,34 @@ window.electron.receive('from-server', (response) => {
     // Lidando com diferentes comandos do servidor
     switch (command) {
         case 'FRIEND_LIST':
-            state.contacts.clear();
+            // Só o primeiro pedaço de uma lista substitui os contatos; os seguintes acrescentam
+            if (!state.receivingFriendList) {
+                state.contacts.clear();
+            }
+            state.receivingFriendList = !!payload.more;
             for (const friend of payload.friends) {
                 state.contacts.set(friend.nickname, friend);
             }
+            if (!state.receivingFriendList) saveFriendCache();
+            renderContacts();
+            break;
+
+        // Mudanças desde a versão em cache (ou só a versão, depois de uma lista completa).
+        // Amigos fora de `statuses` mantêm o status atual (os do cache começam como Offline).
+        case 'FRIEND_LIST_DELTA':
+            for (const nickname of payload.removed) {
+                state.contacts.delete(nickname);
+            }
+            for (const friend of payload.added) {
+                state.contacts.set(friend.nickname, friend);
+            }
+            for (const friend of payload.statuses) {
+                if (state.contacts.has(friend.nickname)) {
+                    state.contacts.get(friend.nickname).status = friend.status;
+                }
+            }
+            state.friendListVersion = payload.version;
+            saveFriendCache();
             renderContacts();
             break;
 
@@ -319,6 +368,19 @@ window.electron.receive('from-server', (response) => {
             }
             break;
 
+        // Várias mudanças de status de uma vez: a lista é redesenhada uma única vez
+        case 'STATUS_UPDATE_BATCH': {
+            let changed = false;
+            for (const update of payload.updates) {
+                if (state.contacts.has(update.nickname)) {
+                    state.contacts.get(update.nickname).status = update.status;
+                    changed = true;
+                }
+            }
+            if (changed) renderContacts();
+            break;
+        }
+
         case 'SEARCH_RESPONSE':
             if (payload.success && payload.results.length > 0) {
                 const foundUser = payload.results[0];
@@ -350,6 +412,7 @@ window.electron.receive('from-server', (response) => {
             const { by_nickname, status } = payload;
             console.log(`Agora você é amigo de ${by_nickname}`);
             state.contacts.set(by_nickname, { nickname: by_nickname, status: status });
+            saveFriendCache();
             renderContacts();
             break;
 
@@ -402,9 +465,17 @@ window.electron.receive('from-server', (response) => {
     }
 });
 
-// Inicialização
+// Inicialização: mostra os amigos em cache como Offline e pede só as mudanças desde a versão guardada
+// (sem cache pede desde a versão 0; o servidor manda a lista completa quando o delta não compensa)
+const friendCache = loadFriendCache();
+if (friendCache) {
+    state.friendListVersion = friendCache.version;
+    for (const nickname of friendCache.friends) {
+        state.contacts.set(nickname, { nickname: nickname, status: 'Offline' });
+    }
+}
 renderContacts();
 window.electron.send('to-server', {
     command: 'GET_INITIAL_DATA',
-    payload: {}
+    payload: { since_version: friendCache ? friendCache.version : 0 }
 });
\ No newline at end of file
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Hashable, Optional
+
+import config
+from client_handler import process_frames, cleanup_connection
+from framing import FrameReader
+from heartbeat import idle_reaper
+from rate_limit import rate_limiter
+from outbound import OutboundQueue
+
+# Adapta um transporte asyncio à interface de conexão usada pelos handlers (send_frame/sendall/getpeername/close).
+# Os frames passam pela mesma fila limitada do modo thread e são escritos juntos uma vez por iteração do loop.
+class AsyncConnection:
+    def __init__(self, transport: asyncio.Transport, loop: asyncio.AbstractEventLoop):
+        self._transport = transport
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._peername = transport.get_extra_info('peername')
+        self._queue = OutboundQueue(config.OUTBOX_MAX_FRAMES)
+        self._flush_scheduled = False
+        self._writing_paused = False
+        self._corked = False
+
+    def send_frame(self, frame: bytes, coalesce_key: Optional[Hashable] = None):
+        if self._transport.is_closing():
+            raise BrokenPipeError("Transporte fechado")
+        # O transporte só pode ser usado a partir da thread do event loop
+        if threading.get_ident() != self._loop_thread_id:
+            self._loop.call_soon_threadsafe(self._send_frame_if_open, frame, coalesce_key)
+            return
+        if not self._queue.push(frame, coalesce_key):
+            logging.warning(f"Encerrando conexão com {self._peername}: fila de saída excedeu {config.OUTBOX_MAX_FRAMES} frames.")
+            self._transport.abort()
+            raise BrokenPipeError("Fila de saída cheia")
+        if not self._flush_scheduled and not self._writing_paused and not self._corked:
+            self._flush_scheduled = True
+            self._loop.call_soon(self._flush)
+
+    def sendall(self, data: bytes):
+        self.send_frame(data)
+
+    # Respostas geradas dentro do bloco são escritas juntas assim que ele termina
+    @contextmanager
+    def batch(self):
+        if self._corked:
+            yield
+            return
+        self._corked = True
+        try:
+            yield
+        finally:
+            self._corked = False
+            self._flush()
+
+    def _send_frame_if_open(self, frame: bytes, coalesce_key):
+        try:
+            self.send_frame(frame, coalesce_key)
+        except BrokenPipeError:
+            pass
+
+    def _flush(self):
+        self._flush_scheduled = False
+        if self._writing_paused or self._transport.is_closing():
+            return
+        frames = self._queue.take_all()
+        if frames:
+            self._transport.writelines(frames)
+
+    # Chamados pelo protocolo quando o buffer do transporte passa/volta dos limites de escrita
+    def pause_writing(self):
+        self._writing_paused = True
+
+    def resume_writing(self):
+        self._writing_paused = False
+        self._flush()
+
+    def getpeername(self):
+        return self._peername
+
+    def close(self):
+        self._transport.close()
+
+# Protocolo asyncio que aplica o mesmo framing '!BH' do modo thread.
+# Enquanto um comando espera o pool de autenticação a conexão fica suspensa: a leitura do socket
+# é pausada e os frames já recebidos aguardam em `_backlog`, preservando a ordem dos comandos.
+class SignalingProtocol(asyncio.Protocol):
+    def __init__(self):
+        self._reader = FrameReader()
+        self._backlog: deque = deque()
+        self._transport = None
+        self._loop = None
+        self._closed = False
+        self._throttled = False
+        self._watch = None
+        self.context = None
+
+    def connection_made(self, transport: asyncio.Transport):
+        self._transport = transport
+        self._loop = asyncio.get_running_loop()
+        conn = AsyncConnection(transport, self._loop)
+        self.context = {
+            'conn': conn,
+            'addr': conn.getpeername(),
+            'current_user': None,
+            'paused': False,
+            'defer': self._defer,
+            'budget': rate_limiter.new_budget()
+        }
+        self._watch = idle_reaper.register(lambda: self._loop.call_soon_threadsafe(transport.abort), self.context['addr'])
+
+    def data_received(self, data: bytes):
+        if self._watch is not None:
+            self._watch.touch(idle_reaper)
+        frames = self._reader.feed(data)
+        if not frames:
+            return
+        if self._backlog or self.context['paused'] or self._throttled:
+            # Os payloads são views sobre o buffer do leitor; precisam ser copiados antes da próxima leitura
+            self._backlog.extend((command_value, bytes(payload)) for command_value, payload in frames)
+            return
+        processed = process_frames(self.context, frames)
+        if processed < len(frames):
+            self._backlog.extend((command_value, bytes(payload)) for command_value, payload in frames[processed:])
+        self._check_throttle()
+
+    # Conexão acima do limite de comandos: para de ler pelo tempo pedido e depois retoma o backlog
+    def _check_throttle(self):
+        throttle = self.context.pop('throttle', None)
+        if throttle:
+            self._throttled = True
+            self._transport.pause_reading()
+            self._loop.call_later(throttle, self._unthrottle)
+
+    def _unthrottle(self):
+        self._throttled = False
+        if not self._closed:
+            self._drain()
+
+    # Processa os frames retidos enquanto a conexão estava suspensa e volta a ler o socket
+    def _drain(self):
+        while self._backlog and not self.context['paused'] and not self._throttled:
+            frames = list(self._backlog)
+            self._backlog.clear()
+            processed = process_frames(self.context, frames)
+            self._backlog.extendleft(reversed(frames[processed:]))
+            self._check_throttle()
+
+        if not self.context['paused'] and not self._throttled:
+            self._transport.resume_reading()
+
+    # Suspende a conexão até `future` terminar; `continuation` roda depois no event loop
+    def _defer(self, future: Future, continuation):
+        self.context['paused'] = True
+        self._transport.pause_reading()
+        future.add_done_callback(lambda f: self._loop.call_soon_threadsafe(self._resume, f, continuation))
+
+    def _resume(self, future: Future, continuation):
+        self.context['paused'] = False
+        # Conexão encerrada durante a espera: a limpeza já rodou, então o resultado é descartado
+        if self._closed:
+            return
+        addr = self.context['addr']
+        with self.context['conn'].batch():
+            try:
+                continuation(future.result())
+            except Exception as e:
+                logging.error(f"Erro ao concluir comando de {addr}: {e}", exc_info=True)
+        self._check_throttle()
+        self._drain()
+
+    def pause_writing(self):
+        self.context['conn'].pause_writing()
+
+    def resume_writing(self):
+        self.context['conn'].resume_writing()
+
+    def connection_lost(self, exc):
+        self._closed = True
+        idle_reaper.unregister(self._watch)
+        self._backlog.clear()
+        addr = self.context['addr']
+        if exc:
+            logging.info(f"Conexão perdida para {addr}: {exc}")
+        try:
+            cleanup_connection(self.context)
+        except Exception as e:
+            logging.error(f"Erro ao limpar conexão {addr}: {e}", exc_info=True)
+        logging.info(f"Fechando conexão com {addr}")
+
+# Executa o servidor de sinalização em um único event loop
+async def serve(host: str, port: int, reuse_port: bool = False):
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(SignalingProtocol, host, port, reuse_address=True, reuse_port=reuse_port or None)
+    logging.info(f"Servidor de Sinalização (asyncio) iniciado em {host}:{port}")
+    async with server:
+        await server.serve_forever()
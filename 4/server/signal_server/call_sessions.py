@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import secrets
+import threading
+import time
+from typing import List, Optional, Tuple
+import config
+from metrics import metrics
+
+# Tamanho do id de sessão usado pelo relay: o cliente envia os primeiros 16 caracteres do token em cada pacote
+RELAY_SESSION_ID_LEN = 16
+
+# Lê a lista "ip:porta,ip:porta" de relays disponíveis
+def parse_relay_servers(value: str) -> List[Tuple[str, int]]:
+    relays = []
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.rpartition(':')
+        relays.append((host, int(port)))
+    return relays
+
+# Uma chamada ativa: participantes, relay escolhido e validade do token
+class CallSession:
+    __slots__ = ('token', 'caller', 'callee', 'relay', 'created_at', 'expires_at')
+
+    def __init__(self, token: str, caller: str, callee: str, relay: Tuple[str, int], ttl_seconds: float):
+        self.token = token
+        self.caller = caller
+        self.callee = callee
+        self.relay = relay
+        self.created_at = time.monotonic()
+        self.expires_at = self.created_at + ttl_seconds
+
+    @property
+    def relay_session_id(self) -> str:
+        return self.token[:RELAY_SESSION_ID_LEN]
+
+    def relay_info(self) -> dict:
+        return {'relay_ip': self.relay[0], 'relay_port': self.relay[1], 'token': self.token}
+
+# Registro das sessões de chamada ativas e distribuição entre os relays configurados.
+# Cada sessão é indexada pelo token e pelos dois participantes; a carga de cada relay é o número
+# de sessões ativas nele. Sessões não encerradas (BYE/desconexão perdidos) expiram após o TTL.
+class _CallSessionRegistry:
+    def __init__(self, relays: List[Tuple[str, int]], selection: str, ttl_seconds: float):
+        if not relays:
+            raise ValueError("Nenhum relay de mídia configurado")
+        self._relays = list(relays)
+        self._selection = selection
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._by_token: dict[str, CallSession] = {}
+        self._by_user: dict[str, CallSession] = {}
+        self._relay_ids: set[str] = set()
+        self._load = {relay: 0 for relay in self._relays}
+
+    # Menor carga; empates ficam com o relay que aparece primeiro na configuração
+    def _least_loaded_unlocked(self) -> Tuple[str, int]:
+        return min(self._relays, key=self._load.__getitem__)
+
+    # Rendezvous hashing pelo token: a escolha não depende do estado e só muda para 1/N das chamadas
+    # quando um relay entra ou sai da lista
+    def _hashed(self, token: str) -> Tuple[str, int]:
+        return max(self._relays, key=lambda relay: hashlib.blake2b(f"{relay[0]}:{relay[1]}/{token}".encode(),
+                                                                 digest_size=8).digest())
+
+    def _new_token_unlocked(self) -> str:
+        # O relay só enxerga o prefixo do token, então ele precisa ser único entre as sessões ativas
+        while True:
+            token = secrets.token_hex(16)
+            if token[:RELAY_SESSION_ID_LEN] not in self._relay_ids:
+                return token
+
+    # Cria uma sessão para a chamada; retorna None se algum dos dois já estiver numa sessão ativa
+    def create(self, caller: str, callee: str) -> Optional[CallSession]:
+        with self._lock:
+            self._expire_unlocked()
+            if caller in self._by_user or callee in self._by_user:
+                return None
+            token = self._new_token_unlocked()
+            relay = self._hashed(token) if self._selection == 'hash' else self._least_loaded_unlocked()
+            session = CallSession(token, caller, callee, relay, self._ttl)
+            self._by_token[token] = session
+            self._by_user[caller] = session
+            self._by_user[callee] = session
+            self._relay_ids.add(session.relay_session_id)
+            self._load[relay] += 1
+            return session
+
+    def _remove_unlocked(self, session: CallSession):
+        if self._by_token.pop(session.token, None) is None:
+            return
+        for nickname in (session.caller, session.callee):
+            if self._by_user.get(nickname) is session:
+                del self._by_user[nickname]
+        self._relay_ids.discard(session.relay_session_id)
+        self._load[session.relay] -= 1
+
+    def _expire_unlocked(self):
+        # O TTL é fixo, então a ordem de inserção do dicionário já é a ordem de expiração
+        now = time.monotonic()
+        expired = []
+        for session in self._by_token.values():
+            if session.expires_at > now:
+                break
+            expired.append(session)
+        for session in expired:
+            self._remove_unlocked(session)
+        if expired:
+            logging.info(f"Sessões de chamada: {len(expired)} expirada(s) removida(s).")
+
+    # Encerra a sessão de que o usuário participa (BYE ou desconexão), se houver
+    def end_for_user(self, nickname: str) -> Optional[CallSession]:
+        with self._lock:
+            session = self._by_user.get(nickname)
+            if session is not None:
+                self._remove_unlocked(session)
+            return session
+
+    def get_for_user(self, nickname: str) -> Optional[CallSession]:
+        with self._lock:
+            return self._by_user.get(nickname)
+
+    # Sessões ativas por relay
+    def relay_loads(self) -> dict:
+        with self._lock:
+            return dict(self._load)
+
+    def __len__(self):
+        return len(self._by_token)
+
+
+# Instância global do registro de chamadas
+call_registry = _CallSessionRegistry(parse_relay_servers(config.RELAY_SERVERS), config.RELAY_SELECTION,
+                                     config.CALL_SESSION_TTL_SECONDS)
+metrics.register_gauge('voip_relay_sessions', 'Sessões de chamada ativas por relay',
+                       lambda: {f"{ip}:{port}": load for (ip, port), load in call_registry.relay_loads().items()},
+                       label='relay')
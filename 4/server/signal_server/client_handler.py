@@ -1,110 +1,213 @@
 import socket
 import logging
-import struct 
+import time
 from models import state_manager, UserStatus 
-from db_manager import get_friends_list_db
 import command_router 
 from protocol import CommandCode, CODE_TO_COMMAND_NAME, protocol
-from typing import Optional 
+from outbound import BufferedConnection
+from framing import FrameReader, HEADER_SIZE
+from heartbeat import idle_reaper
+from log_setup import log_setup, FRAME_LOGGER
+from metrics import metrics
+from rate_limit import rate_limiter
+from workers import auth_workers
+from services import call_service
+from presence import presence_dispatcher
+from cluster import cluster_bus
 
-# Função para garantir a leitura completa de n_bytes do socket
-def recvall(conn: socket.socket, n_bytes: int) -> Optional[bytes]:
-    data_chunks = []
-    bytes_read = 0
-    try:
-        while bytes_read < n_bytes:
-            chunk = conn.recv(n_bytes - bytes_read) 
-
-            if not chunk:
-                logging.warning(f"Conexão fechada por {conn.getpeername()} durante a leitura.")
-                return None
-            
-            data_chunks.append(chunk)
-            bytes_read += len(chunk)
-        return b''.join(data_chunks)
-    
-    except (ConnectionResetError, BrokenPipeError, socket.timeout) as e:
-        logging.warning(f"Erro de socket ao ler de {conn.getpeername()}: {e}")
-        return None
+frame_log = log_setup.sampled_logger(FRAME_LOGGER)
 
-# Pega um comando e o payload, converte para bytes e envia a msg para o cli
-def send_binary_message(conn: socket.socket, command_code: CommandCode, payload: dict):
+# Pega um comando e o payload, converte para bytes e enfileira a msg para o cli.
+# STATUS_UPDATEs ainda não enviados do mesmo usuário são substituídos pelo mais recente.
+def send_binary_message(conn, command_code: CommandCode, payload: dict):
     try:
         message_bytes = protocol.create_message(command_code, payload)
-        conn.sendall(message_bytes)
+        if metrics.enabled:
+            metrics.count_out(command_code, len(message_bytes))
+        coalesce_key = ('status', payload.get('nickname')) if command_code == CommandCode.STATUS_UPDATE else None
+        conn.send_frame(message_bytes, coalesce_key)
         
     except (ConnectionResetError, BrokenPipeError, socket.timeout) as e:
         logging.warning(f"Nao foi possivel enviar mensagem binaria para {conn.getpeername()}: {e}")
     except Exception as e:
         logging.warning(f"Erro ao preparar/enviar msg para {conn.getpeername()}: {e}", exc_info=True)
 
+# Envia várias mensagens como um único bloco na fila de saída, garantindo uma só escrita no socket
+def send_binary_messages(conn, messages: list):
+    try:
+        frames = [protocol.create_message(command_code, payload) for command_code, payload in messages]
+        if metrics.enabled:
+            for (command_code, _), frame in zip(messages, frames):
+                metrics.count_out(command_code, len(frame))
+        conn.send_frame(b''.join(frames))
+
+    except (ConnectionResetError, BrokenPipeError, socket.timeout) as e:
+        logging.warning(f"Nao foi possivel enviar mensagem binaria para {conn.getpeername()}: {e}")
+    except Exception as e:
+        logging.warning(f"Erro ao preparar/enviar msg para {conn.getpeername()}: {e}", exc_info=True)
+
+# Envia uma lista possivelmente maior que um frame (FRIEND_LIST, PENDING_FRIEND_REQUESTS) em pedaços.
+# Os frames são gerados sob demanda e entram na fila um a um; dentro de conn.batch() saem numa só escrita.
+def send_chunked_message(conn, command_code: CommandCode, items) -> int:
+    sent = 0
+    try:
+        for frame in protocol.iter_chunked_messages(command_code, items):
+            if metrics.enabled:
+                metrics.count_out(command_code, len(frame))
+            conn.send_frame(frame)
+            sent += 1
+
+    except (ConnectionResetError, BrokenPipeError, socket.timeout) as e:
+        logging.warning(f"Nao foi possivel enviar mensagem binaria para {conn.getpeername()}: {e}")
+    except Exception as e:
+        logging.warning(f"Erro ao preparar/enviar msg para {conn.getpeername()}: {e}", exc_info=True)
+    return sent
+
 # Informa a todos os amigos de um usuário sobre a mudança de status.
-def broadcast_status_update(changed_user_nickname: str, new_status_str: str):
+# Com a janela de presença ligada a mudança é juntada às demais e entregue por send_status_updates.
+def broadcast_status_update(changed_user_nickname: str, new_status_str: str, recipients=None):
+    if recipients is None:
+        recipients = state_manager.get_online_friends(changed_user_nickname)
+    if presence_dispatcher.enabled:
+        presence_dispatcher.publish(changed_user_nickname, new_status_str, recipients)
+        return
     payload = {'nickname': changed_user_nickname, 'status': new_status_str}
-    friends_of_changed_user = get_friends_list_db(changed_user_nickname)
-    for nickname, user_obj in state_manager.get_all_users_items():
-        if nickname in friends_of_changed_user:
-            send_binary_message(user_obj.conn, CommandCode.STATUS_UPDATE, payload)
+    for user_obj in recipients:
+        send_binary_message(user_obj.conn, CommandCode.STATUS_UPDATE, payload)
+
+# Entrega a um amigo o último status de cada usuário que mudou na janela: um STATUS_UPDATE_BATCH para
+# clientes que o anunciaram no login, um STATUS_UPDATE por usuário para os demais
+def send_status_updates(watcher, updates: dict):
+    if watcher.status_batch:
+        items = [{'nickname': nickname, 'status': status} for nickname, status in updates.items()]
+        send_chunked_message(watcher.conn, CommandCode.STATUS_UPDATE_BATCH, items)
+        return
+    for nickname, status in updates.items():
+        send_binary_message(watcher.conn, CommandCode.STATUS_UPDATE, {'nickname': nickname, 'status': status})
+
+presence_dispatcher.set_sender(send_status_updates)
+cluster_bus.set_status_broadcaster(broadcast_status_update)
+
+# Decodifica e roteia um frame já lido (comum aos modos thread e asyncio)
+def process_frame(context, command_value: int, payload_bytes: bytes):
+    addr = context['addr']
+    if metrics.enabled:
+        metrics.count_in(HEADER_SIZE + len(payload_bytes))
+    try:
+        command_code = CommandCode(command_value) 
+        if not command_router.admit_command(context, command_code):
+            return
+        command_name = CODE_TO_COMMAND_NAME.get(command_code, f"UNKNOWN(0x{command_value:02X})")
+        
+        frame_log.debug("Recebido Binário de %s: Cmd=%s, Len=%d", context['current_user'] or addr, command_name, len(payload_bytes))
+
+        payload = protocol.deserialize_payload(command_code, payload_bytes)
+        
+        command_router.route_command(context, command_code, payload)
+        
+    except ValueError:
+         logging.warning(f"Recebido código de comando inválido: {command_value} de {addr}")
+    except Exception as e:
+        logging.error(f"Erro ao processar comando {command_value} de {addr}: {e}", exc_info=True)
+
+# Processa, em ordem, todos os frames recebidos numa mesma leitura e retorna quantos foram consumidos.
+# As respostas ficam retidas na fila de saída e são enviadas numa única escrita ao final do lote.
+def process_frames(context, frames):
+    # Log por lote, amostrado no modo production (a amostragem vem antes de montar a lista de nomes)
+    if frame_log.isEnabledFor(logging.INFO):
+        command_names = ', '.join(CODE_TO_COMMAND_NAME.get(command_value, f"0x{command_value:02X}") for command_value, _ in frames)
+        # Já amostrado acima: registra direto no logger de baixo, sem passar de novo pela amostragem
+        frame_log.logger.info("Recebido Binário de %s: %d frame(s) [%s]", context['current_user'] or context['addr'], len(frames), command_names)
+
+    processed = 0
+    with context['conn'].batch():
+        for command_value, payload_bytes in frames:
+            processed += 1
+            process_frame(context, command_value, payload_bytes)
+            # No modo asyncio um comando pode suspender a conexão até o pool de autenticação responder;
+            # o mesmo vale para uma conexão que estourou o limite de comandos (context['throttle']).
+            # Os frames restantes ficam com o chamador e são processados na retomada
+            if context.get('paused') or context.get('throttle'):
+                break
+    return processed
+
+# Executa `job(*args)` no pool de autenticação e depois `continuation(resultado)` no contexto da conexão.
+# No modo thread a thread da conexão espera o resultado (a ordem dos comandos se mantém naturalmente);
+# no modo asyncio a conexão é suspensa (context['defer']) e retomada no event loop.
+# Retorna False se o pool estiver saturado; nesse caso nada é executado.
+def offload(context, continuation, job, *args) -> bool:
+    future = auth_workers.submit(job, *args)
+    if future is None:
+        logging.warning(f"Pool de autenticação saturado; recusando pedido de {context['current_user'] or context['addr']}")
+        return False
+
+    await_result(context, future, continuation)
+    return True
+
+# Roda `continuation(resultado)` quando o Future terminar, no contexto da conexão (ver offload)
+def await_result(context, future, continuation):
+    defer = context.get('defer')
+    if defer is not None and not future.done():
+        defer(future, continuation)
+    else:
+        continuation(future.result())
+
+# Limpa o estado do usuário da conexão encerrada e avisa parceiro/amigos
+def cleanup_connection(context):
+    current_user_nickname = context.get('current_user')
+    if current_user_nickname:
+        removed_user_obj, watchers = state_manager.remove_user_with_watchers(current_user_nickname)
+        if removed_user_obj:
+            if removed_user_obj.status == UserStatus.IN_CALL:
+                call_service.end_call_session(current_user_nickname)
+                partner_nickname = removed_user_obj.in_call_with
+                partner_obj = state_manager.get_user(partner_nickname) 
+                if partner_obj: 
+                    partner_obj.end_call() 
+                    send_binary_message(partner_obj.conn, CommandCode.CALL_ENDED, {'from_nickname': current_user_nickname})
+                    broadcast_status_update(partner_nickname, UserStatus.ONLINE.value) 
+
+            broadcast_status_update(current_user_nickname, 'Offline', watchers)
+            logging.info(f"Usuário '{current_user_nickname}' desconectado. Estado limpo.")
 
 # Função executada para cada cliente em sua própria thread
-def handle_client(conn: socket.socket, addr):
+def handle_client(sock: socket.socket, addr):
+    conn = BufferedConnection(sock, addr)
     context = {
         'conn': conn, 
         'addr': addr,
-        'current_user': None 
+        'current_user': None,
+        'budget': rate_limiter.new_budget()
     }
 
+    # O reaper fecha o socket de conexões sem tráfego; o recv abaixo retorna e a limpeza segue pelo finally
+    watch = idle_reaper.register(lambda: sock.shutdown(socket.SHUT_RDWR), addr)
+    reader = FrameReader(sock)
     try:
         while True:
-            header = recvall(conn, 3) 
-
-            if not header:
-                logging.info(f"Cliente {addr} desconectou (cabeçalho).")
-                break 
-            
-            command_value, payload_length = struct.unpack('!BH', header)
-
-            payload_bytes = b''
-            if payload_length > 0:
-                payload_bytes = recvall(conn, payload_length) 
-                if not payload_bytes:
-                    logging.warning(f"Cliente {addr} desconectou (payload).")
-                    break
-
-            try:
-                command_code = CommandCode(command_value) 
-                command_name = CODE_TO_COMMAND_NAME.get(command_code, f"UNKNOWN(0x{command_value:02X})")
-                
-                logging.info(f"Recebido Binário de {context['current_user'] or addr}: Cmd={command_name}, Len={payload_length}")
-
-                payload = protocol.deserialize_payload(command_code, payload_bytes)
-                
-                command_router.route_command(context, command_code, payload)
-                
-            except ValueError:
-                 logging.warning(f"Recebido código de comando inválido: {command_value} de {addr}")
-            except Exception as e:
-                logging.error(f"Erro ao processar comando {command_value} de {addr}: {e}", exc_info=True)
+            frames = reader.read_frames()
+
+            if frames is None:
+                logging.info(f"Cliente {addr} desconectou.")
+                break
+            if watch is not None:
+                watch.touch(idle_reaper)
+
+            # As memoryviews dos payloads só valem até a próxima leitura, então são processadas aqui mesmo.
+            # Acima do limite de comandos a thread dorme sem ler o socket, e o cliente sente a pressão no TCP
+            while frames:
+                processed = process_frames(context, frames)
+                frames = frames[processed:]
+                throttle = context.pop('throttle', None)
+                if throttle:
+                    time.sleep(throttle)
 
     except (ConnectionResetError, socket.timeout, BrokenPipeError):
          logging.info(f"Conexão perdida para {addr}.")
     except Exception as e:
         logging.error(f"Erro inesperado na conexão {addr}: {e}", exc_info=True)
     finally:
-        current_user_nickname = context.get('current_user')
-        if current_user_nickname:
-            removed_user_obj = state_manager.remove_user(current_user_nickname) 
-            if removed_user_obj:
-                if removed_user_obj.status == UserStatus.IN_CALL:
-                    partner_nickname = removed_user_obj.in_call_with
-                    partner_obj = state_manager.get_user(partner_nickname) 
-                    if partner_obj: 
-                        partner_obj.end_call() 
-                        send_binary_message(partner_obj.conn, CommandCode.CALL_ENDED, {'from_nickname': current_user_nickname})
-                        broadcast_status_update(partner_nickname, UserStatus.ONLINE.value) 
-
-                broadcast_status_update(current_user_nickname, 'Offline')
-                logging.info(f"Usuário '{current_user_nickname}' desconectado. Estado limpo.")
-        
+        idle_reaper.unregister(watch)
+        cleanup_connection(context)
         logging.info(f"Fechando conexão com {addr}")
         conn.close()
\ No newline at end of file
@@ -0,0 +1,263 @@
+import logging
+import os
+import secrets
+import threading
+from contextlib import nullcontext
+from multiprocessing.connection import Client, Listener
+from typing import Callable, Hashable, Optional
+
+from call_sessions import call_registry
+from friend_cache import friend_cache
+from models import state_manager, UserStatus
+
+# Com vários processos de sinalização (server.py --workers N) cada usuário está conectado a um deles.
+# Os processos trocam mensagens por um broker local (socket Unix) e cada um mantém "espelhos" dos usuários
+# conectados aos outros: um ConnectedUser comum cuja conexão (RemoteConnection) encaminha os frames pelo
+# broker até o processo dono. Assim os handlers continuam usando state_manager.get_user(...).conn.
+#
+# Mensagens (tuplas) de um processo para o broker:
+#   ('online', nick, status, parceiro, amigos)   usuário entrou neste processo
+#   ('offline', nick)                            usuário saiu deste processo
+#   ('state', nick, status, parceiro)            início/fim de chamada (de um usuário local ou espelho)
+#   ('deliver', nick, frame, coalesce_key)       frame para um usuário de outro processo
+#   ('friendship', op, a, b)                     pedido/aceite/recusa gravado (mantém os caches coerentes)
+# O broker repassa online/offline/state/friendship aos demais processos e deliver apenas ao dono do usuário.
+
+# Conexão de um usuário espelho: os frames seguem pelo broker até o processo em que ele está conectado
+class RemoteConnection:
+    def __init__(self, bus: '_PresenceBus', nickname: str, worker_id: int):
+        self._bus = bus
+        self._nickname = nickname
+        self._worker_id = worker_id
+
+    def send_frame(self, frame: bytes, coalesce_key: Optional[Hashable] = None):
+        self._bus._send(('deliver', self._nickname, bytes(frame), coalesce_key))
+
+    def sendall(self, data: bytes):
+        self.send_frame(data)
+
+    def batch(self):
+        return nullcontext()
+
+    def getpeername(self):
+        return (f"worker-{self._worker_id}", self._nickname)
+
+    def close(self):
+        pass
+
+# Lado do processo de sinalização: publica as mudanças locais e aplica as que chegam dos outros processos.
+# Inativo (nenhuma mensagem) enquanto connect() não for chamado, como no modo de processo único.
+class _PresenceBus:
+    def __init__(self):
+        self._conn = None
+        self._send_lock = threading.Lock()
+        self._status_broadcaster: Optional[Callable] = None
+        self.worker_id: Optional[int] = None
+
+    @property
+    def active(self) -> bool:
+        return self._conn is not None
+
+    def connect(self, address: str, authkey: bytes, worker_id: int):
+        self.worker_id = worker_id
+        self._conn = Client(address, family='AF_UNIX', authkey=authkey)
+        self._conn.send(('hello', worker_id))
+        state_manager.set_listener(self)
+        threading.Thread(target=self._reader_loop, daemon=True, name=f"Bus-{worker_id}").start()
+        logging.info(f"Worker {worker_id}: conectado ao barramento de presença em {address}")
+
+    # `broadcaster(nickname, status, watchers)` avisa os usuários locais de uma mudança de status
+    # (registrado pelo client_handler, que depende deste módulo)
+    def set_status_broadcaster(self, broadcaster: Callable):
+        self._status_broadcaster = broadcaster
+
+    def _send(self, message: tuple):
+        conn = self._conn
+        if conn is None:
+            return
+        try:
+            with self._send_lock:
+                conn.send(message)
+        except OSError as e:
+            logging.error(f"Worker {self.worker_id}: falha ao publicar no barramento: {e}")
+
+    # Chamados pelo state_manager
+    def user_added(self, user, friends):
+        user.on_change = self._publish_state
+        if not isinstance(user.conn, RemoteConnection):
+            self._send(('online', user.nickname, user.status.value, user.in_call_with, tuple(friends)))
+
+    def user_removed(self, user):
+        if not isinstance(user.conn, RemoteConnection):
+            self._send(('offline', user.nickname))
+
+    def _publish_state(self, user):
+        self._send(('state', user.nickname, user.status.value, user.in_call_with))
+
+    # Chamado pelo db_manager depois que uma mudança de amizade foi confirmada no banco
+    def friendship_changed(self, op: str, requester: str, target: str):
+        self._send(('friendship', op, requester, target))
+
+    def _reader_loop(self):
+        while True:
+            try:
+                message = self._conn.recv()
+            except (EOFError, OSError) as e:
+                logging.error(f"Worker {self.worker_id}: barramento de presença encerrado ({e}); "
+                              f"usuários de outros processos ficam inacessíveis.")
+                self._conn = None
+                return
+            try:
+                self._apply(message)
+            except Exception as e:
+                logging.error(f"Worker {self.worker_id}: erro ao aplicar mensagem {message[0]!r} do barramento: {e}",
+                              exc_info=True)
+
+    def _apply(self, message: tuple):
+        kind = message[0]
+        if kind == 'deliver':
+            _, nickname, frame, coalesce_key = message
+            user = state_manager.get_user(nickname)
+            if user is not None and not isinstance(user.conn, RemoteConnection):
+                try:
+                    user.conn.send_frame(frame, coalesce_key)
+                except (ConnectionResetError, BrokenPipeError) as e:
+                    logging.warning(f"Worker {self.worker_id}: não foi possível entregar frame a {nickname}: {e}")
+
+        elif kind == 'state':
+            _, nickname, status, partner = message
+            user = state_manager.get_user(nickname)
+            if user is not None:
+                # Atribuição direta: a mudança já veio do barramento e não deve ser publicada de novo
+                user.status = UserStatus(status)
+                user.in_call_with = partner
+            if status != UserStatus.IN_CALL.value:
+                call_registry.end_for_user(nickname)
+
+        elif kind == 'online':
+            _, worker_id, nickname, status, partner, friends = message
+            if not state_manager.add_user(nickname, RemoteConnection(self, nickname, worker_id), friends):
+                logging.warning(f"Worker {self.worker_id}: {nickname} entrou no worker {worker_id} mas já estava registrado aqui")
+                return
+            user = state_manager.get_user(nickname)
+            user.status = UserStatus(status)
+            user.in_call_with = partner
+
+        elif kind == 'offline':
+            _, nickname, orphaned = message
+            user = state_manager.get_user(nickname)
+            if user is None or not isinstance(user.conn, RemoteConnection):
+                return
+            _, watchers = state_manager.remove_user_with_watchers(nickname)
+            call_registry.end_for_user(nickname)
+            # O processo dono caiu sem avisar os amigos: cada processo avisa os seus usuários locais
+            if orphaned and self._status_broadcaster is not None:
+                local = [w for w in watchers if not isinstance(w.conn, RemoteConnection)]
+                self._status_broadcaster(nickname, 'Offline', local)
+
+        elif kind == 'friendship':
+            _, op, requester, target = message
+            if op == 'pending':
+                friend_cache.add_pending(requester, target)
+            elif op == 'accepted':
+                friend_cache.accept(requester, target)
+                state_manager.link_friends(requester, target)
+            else:
+                friend_cache.reject(requester, target)
+
+
+# Broker do barramento: roda no processo lançador e mantém o diretório nickname -> processo dono
+class PresenceBroker:
+    def __init__(self, address: str):
+        if os.path.exists(address):
+            os.unlink(address)
+        self.address = address
+        self.authkey = secrets.token_bytes(16)
+        self._listener = Listener(address, family='AF_UNIX', authkey=self.authkey)
+        self._lock = threading.Lock()
+        self._workers: dict[int, tuple] = {}
+        # nickname -> [worker dono, status, parceiro, amigos]
+        self._directory: dict[str, list] = {}
+
+    def serve_forever(self):
+        logging.info(f"Barramento de presença escutando em {self.address}")
+        while True:
+            conn = self._listener.accept()
+            threading.Thread(target=self._handle_worker, args=(conn,), daemon=True).start()
+
+    def close(self):
+        self._listener.close()
+
+    def _send_to(self, worker_id: int, message: tuple):
+        entry = self._workers.get(worker_id)
+        if entry is None:
+            return
+        conn, send_lock = entry
+        try:
+            with send_lock:
+                conn.send(message)
+        except OSError as e:
+            logging.warning(f"Barramento: falha ao enviar para o worker {worker_id}: {e}")
+
+    def _broadcast(self, message: tuple, except_worker: int):
+        for worker_id in list(self._workers):
+            if worker_id != except_worker:
+                self._send_to(worker_id, message)
+
+    def _handle_worker(self, conn):
+        _, worker_id = conn.recv()
+        with self._lock:
+            self._workers[worker_id] = (conn, threading.Lock())
+            snapshot = [(nick, entry) for nick, entry in self._directory.items()]
+        logging.info(f"Barramento: worker {worker_id} conectado ({len(snapshot)} usuários em outros workers)")
+        # Um worker (re)iniciado recebe os espelhos de quem já está online nos outros
+        for nickname, (owner, status, partner, friends) in snapshot:
+            self._send_to(worker_id, ('online', owner, nickname, status, partner, tuple(friends)))
+
+        try:
+            while True:
+                self._route(worker_id, conn.recv())
+        except (EOFError, OSError):
+            logging.warning(f"Barramento: worker {worker_id} desconectado")
+        finally:
+            with self._lock:
+                self._workers.pop(worker_id, None)
+                orphans = [nick for nick, entry in self._directory.items() if entry[0] == worker_id]
+                for nickname in orphans:
+                    del self._directory[nickname]
+            for nickname in orphans:
+                self._broadcast(('offline', nickname, True), worker_id)
+            conn.close()
+
+    def _route(self, worker_id: int, message: tuple):
+        kind = message[0]
+        if kind == 'deliver':
+            entry = self._directory.get(message[1])
+            if entry is not None:
+                self._send_to(entry[0], message)
+            return
+
+        with self._lock:
+            if kind == 'online':
+                _, nickname, status, partner, friends = message
+                self._directory[nickname] = [worker_id, status, partner, set(friends)]
+                message = ('online', worker_id, nickname, status, partner, friends)
+            elif kind == 'offline':
+                entry = self._directory.get(message[1])
+                if entry is not None and entry[0] == worker_id:
+                    del self._directory[message[1]]
+                message = ('offline', message[1], False)
+            elif kind == 'state':
+                entry = self._directory.get(message[1])
+                if entry is not None:
+                    entry[1], entry[2] = message[2], message[3]
+            elif kind == 'friendship' and message[1] == 'accepted':
+                for owner, friend in ((message[2], message[3]), (message[3], message[2])):
+                    entry = self._directory.get(owner)
+                    if entry is not None:
+                        entry[3].add(friend)
+        self._broadcast(message, worker_id)
+
+
+# Instância global do barramento (usada pelo state_manager e pelo db_manager quando há vários workers)
+cluster_bus = _PresenceBus()
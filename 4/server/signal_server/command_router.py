@@ -1,109 +1,154 @@
 import logging
+import time
 import client_handler 
 from services import auth_service, friend_service, call_service
 from models import state_manager, UserStatus 
-from protocol import CODE_TO_COMMAND_NAME, CommandCode
+from protocol import CODE_TO_COMMAND_NAME, CommandCode, FEATURE_STATUS_BATCH
+from metrics import metrics
+from rate_limit import rate_limiter
 
-# Registra um usuário
+BUSY_MESSAGE = 'Servidor ocupado, tente novamente em instantes.'
+RATE_LIMITED_MESSAGE = 'Muitas requisições; aguarde antes de tentar novamente.'
+
+# Registra um usuário (o hash da senha roda no pool de autenticação)
 def handle_register(context, payload):
     nickname = payload.get('nickname')
     name = payload.get('name')
     password = payload.get('password')
-    success, message = auth_service.register_user(nickname, name, password)
-    
-    client_handler.send_binary_message(context['conn'], CommandCode.REGISTER_RESPONSE, {
-        'success': success, 'message': message
-    })
+
+    def finish(result):
+        success, message = result
+        client_handler.send_binary_message(context['conn'], CommandCode.REGISTER_RESPONSE, {
+            'success': success, 'message': message
+        })
+
+    if not client_handler.offload(context, finish, auth_service.register_user, nickname, name, password):
+        client_handler.send_binary_message(context['conn'], CommandCode.REGISTER_RESPONSE, {
+            'success': False, 'message': BUSY_MESSAGE
+        })
     
-# Processa o login de um usuário
+# Processa o login de um usuário (a verificação da senha roda no pool de autenticação)
 def handle_login(context, payload):
     nickname = payload.get('nickname')
     password = payload.get('password')
-    
-    success, message = auth_service.login_user(nickname, password, context['conn'])
+    features = payload.get('features') or 0
+
+    def finish(credentials_ok):
+        success, message = auth_service.complete_login(nickname, credentials_ok, context['conn'])
 
-    response_payload = {'success': success, 'message': message}
-    if success:
-        response_payload['nickname'] = nickname
-        context['current_user'] = nickname 
+        response_payload = {'success': success, 'message': message}
+        if success:
+            response_payload['nickname'] = nickname
+            context['current_user'] = nickname 
+            user = state_manager.get_user(nickname)
+            if user is not None:
+                user.status_batch = bool(features & FEATURE_STATUS_BATCH)
 
-        client_handler.broadcast_status_update(nickname, UserStatus.ONLINE.value)
+            client_handler.broadcast_status_update(nickname, UserStatus.ONLINE.value)
 
-    client_handler.send_binary_message(context['conn'], CommandCode.LOGIN_RESPONSE, response_payload)
+        client_handler.send_binary_message(context['conn'], CommandCode.LOGIN_RESPONSE, response_payload)
 
-# Fornece dados iniciais ao cliente após o login (amigos e pedidos pendentes)
+    if not client_handler.offload(context, finish, auth_service.verify_credentials, nickname, password):
+        client_handler.send_binary_message(context['conn'], CommandCode.LOGIN_RESPONSE, {
+            'success': False, 'message': BUSY_MESSAGE
+        })
+
+# Fornece dados iniciais ao cliente após o login (amigos e pedidos pendentes) numa única escrita.
+# As listas vão em pedaços quando não cabem num frame; o cliente acumula até o frame sem `more`.
+# Clientes com a lista em cache mandam `since_version` e recebem só o FRIEND_LIST_DELTA desde essa versão;
+# se o delta não for possível recebem a lista completa seguida de um delta vazio com a versão atual.
 def handle_get_initial_data(context, payload):
     current_user = context['current_user']
-    friends_with_status = friend_service.get_friends_with_status(current_user)
-    pending_requests = friend_service.get_pending_requests(current_user)
-    
-    client_handler.send_binary_message(context['conn'], CommandCode.FRIEND_LIST, {'friends': friends_with_status})
-    if pending_requests:
-        logging.info(f"Roteador: Enviando {len(pending_requests)} pedidos pendentes para {current_user}")
-        client_handler.send_binary_message(context['conn'], CommandCode.PENDING_FRIEND_REQUESTS, {
-            'requests_from': pending_requests
-        })
+    conn = context['conn']
+    since_version = payload.get('since_version')
+    delta = None
+    if since_version is not None:
+        delta = friend_service.get_friend_list_delta(current_user, since_version)
+        if delta is None:
+            # Versão lida antes da lista: uma mudança no meio volta no próximo delta, em vez de se perder
+            version = friend_service.get_friendship_version(current_user)
+    friends_with_status, pending_requests = friend_service.get_initial_data(current_user)
+
+    with conn.batch():
+        if delta is not None:
+            client_handler.send_binary_message(conn, CommandCode.FRIEND_LIST_DELTA, delta)
+        else:
+            client_handler.send_chunked_message(conn, CommandCode.FRIEND_LIST, friends_with_status)
+            if since_version is not None:
+                client_handler.send_binary_message(conn, CommandCode.FRIEND_LIST_DELTA, {'version': version})
+        if pending_requests:
+            logging.info(f"Roteador: Enviando {len(pending_requests)} pedidos pendentes para {current_user}")
+            client_handler.send_chunked_message(conn, CommandCode.PENDING_FRIEND_REQUESTS, pending_requests)
 
-# Procura usuário pelo nickname
+# Procura usuário pelo nickname (paginado). O cursor da próxima página só é enviado
+# a clientes que mandaram um cursor no pedido; os demais recebem apenas a primeira página.
 def handle_search_user(context, payload):
     query = payload.get('nickname_query', '')
     if not query: return
-    results_profiles = friend_service.search_users(query, context['current_user'])
+    cursor = payload.get('cursor')
+    results_profiles, next_cursor = friend_service.search_users(query, context['current_user'], cursor)
     results_dicts = [{'nickname': p.nickname, 'name': p.name} for p in results_profiles]
-    client_handler.send_binary_message(context['conn'], CommandCode.SEARCH_RESPONSE, {
-        'success': True, 'results': results_dicts
-    })
+    response_payload = {'success': True, 'results': results_dicts}
+    if cursor is not None:
+        response_payload['next_cursor'] = next_cursor
+    client_handler.send_binary_message(context['conn'], CommandCode.SEARCH_RESPONSE, response_payload)
 
-# Faz um pedido de amizade a outro usuário
+# Faz um pedido de amizade a outro usuário (responde depois que a escrita for confirmada)
 def handle_add_friend(context, payload):
     current_user = context['current_user']
     target_nickname = payload.get('target_nickname')
     if not target_nickname: return
 
-    success, message = friend_service.send_request(current_user, target_nickname)
+    def finish(result):
+        success, message = result
+
+        client_handler.send_binary_message(context['conn'], CommandCode.ADD_FRIEND_RESPONSE, {
+            'success': success, 'message': message
+        })
 
-    client_handler.send_binary_message(context['conn'], CommandCode.ADD_FRIEND_RESPONSE, {
-        'success': success, 'message': message
-    })
+        if success:
+            target_user_obj = state_manager.get_user(target_nickname)
+            if target_user_obj:
+                logging.info(f"Roteador: Notificando {target_nickname} sobre pedido de {current_user}")
+                client_handler.send_binary_message(
+                    target_user_obj.conn,
+                    CommandCode.INCOMING_FRIEND_REQUEST,
+                    {'from_nickname': current_user}
+                )
 
-    if success:
-        target_user_obj = state_manager.get_user(target_nickname)
-        if target_user_obj:
-            logging.info(f"Roteador: Notificando {target_nickname} sobre pedido de {current_user}")
-            client_handler.send_binary_message(
-                target_user_obj.conn,
-                CommandCode.INCOMING_FRIEND_REQUEST,
-                {'from_nickname': current_user}
-            )
+    client_handler.await_result(context, friend_service.send_request_async(current_user, target_nickname), finish)
 
-# Aceita um pedido de amizade
+# Aceita um pedido de amizade (notifica os dois depois que a escrita for confirmada)
 def handle_accept_friend(context, payload):
     current_user = context['current_user']
     requester_nickname = payload.get('requester_nickname')
     if not requester_nickname: return
 
-    success, requester_status, acceptor_status = friend_service.accept_request(requester_nickname, current_user)
-
-    if success:
-        acceptor_obj = state_manager.get_user(current_user)
-        requester_obj = state_manager.get_user(requester_nickname)
-
-        if requester_obj:
-            logging.info(f"Roteador: Notificando {requester_nickname} que {current_user} aceitou")
-            client_handler.send_binary_message(
-                requester_obj.conn, CommandCode.FRIEND_REQUEST_ACCEPTED,
-                {'by_nickname': current_user, 'status': acceptor_status} 
-            )
-        if acceptor_obj:
-            logging.info(f"Roteador: Notificando {current_user} sobre aceitação de {requester_nickname}")
-            client_handler.send_binary_message(
-                acceptor_obj.conn, CommandCode.FRIEND_REQUEST_ACCEPTED,
-                {'by_nickname': requester_nickname, 'status': requester_status}
-            )
-    else:
-         client_handler.send_binary_message(context['conn'], CommandCode.ERROR, {
-             'message': 'Falha ao aceitar pedido (talvez não exista mais).'
-         })
+    def finish(db_success):
+        success, requester_status, acceptor_status = friend_service.complete_accept(requester_nickname, current_user, db_success)
+
+        if success:
+            acceptor_obj = state_manager.get_user(current_user)
+            requester_obj = state_manager.get_user(requester_nickname)
+
+            if requester_obj:
+                logging.info(f"Roteador: Notificando {requester_nickname} que {current_user} aceitou")
+                client_handler.send_binary_message(
+                    requester_obj.conn, CommandCode.FRIEND_REQUEST_ACCEPTED,
+                    {'by_nickname': current_user, 'status': acceptor_status} 
+                )
+            if acceptor_obj:
+                logging.info(f"Roteador: Notificando {current_user} sobre aceitação de {requester_nickname}")
+                client_handler.send_binary_message(
+                    acceptor_obj.conn, CommandCode.FRIEND_REQUEST_ACCEPTED,
+                    {'by_nickname': requester_nickname, 'status': requester_status}
+                )
+        else:
+             client_handler.send_binary_message(context['conn'], CommandCode.ERROR, {
+                 'message': 'Falha ao aceitar pedido (talvez não exista mais).'
+             })
+
+    client_handler.await_result(context, friend_service.accept_request_async(requester_nickname, current_user), finish)
 
 # Rejeita um pedido de amizade
 def handle_reject_friend(context, payload):
@@ -177,6 +222,7 @@ def handle_bye(context, payload):
     current_user_obj = state_manager.get_user(context['current_user'])
     if not current_user_obj or current_user_obj.status != UserStatus.IN_CALL: return
     partner_nickname = current_user_obj.in_call_with
+    call_service.end_call_session(current_user_obj.nickname)
     current_user_obj.end_call()
     client_handler.broadcast_status_update(current_user_obj.nickname, UserStatus.ONLINE.value)
     partner_obj = state_manager.get_user(partner_nickname)
@@ -185,6 +231,10 @@ def handle_bye(context, payload):
         client_handler.send_binary_message(partner_obj.conn, CommandCode.CALL_ENDED, {'from_nickname': current_user_obj.nickname})
         client_handler.broadcast_status_update(partner_obj.nickname, UserStatus.ONLINE.value)
 
+# Responde ao heartbeat do cliente (a atividade em si já foi registrada ao ler o frame)
+def handle_ping(context, payload):
+    client_handler.send_binary_message(context['conn'], CommandCode.PONG, {})
+
 # Mapeia códigos de comando para suas funções
 COMMAND_MAP = {
     CommandCode.REGISTER: handle_register,
@@ -198,11 +248,29 @@ COMMAND_MAP = {
     CommandCode.ACCEPT: handle_accept,
     CommandCode.REJECT: handle_reject,
     CommandCode.BYE: handle_bye,
+    CommandCode.PING: handle_ping,
 }
 
+# Consome o orçamento da conexão para o comando (token bucket por classe), antes de decodificar e despachar
+# (PING e as respostas/fim de chamada não são limitados, ver rate_limit.UNLIMITED_COMMANDS).
+# Sem fichas, o comando é descartado, o cliente recebe um ERROR com retry_after_ms (uma vez por espera)
+# e context['throttle'] pede à conexão que pare de ler por esse tempo: o excesso fica retido no TCP.
+def admit_command(context, cmd_code: CommandCode) -> bool:
+    limited = rate_limiter.check(context.get('budget'), cmd_code)
+    if not limited:
+        return True
+    retry_after, notify = limited
+    context['throttle'] = retry_after
+    if notify:
+        logging.warning(f"Roteador: limite de {cmd_code.name} excedido por {context['current_user'] or context['addr']}")
+        client_handler.send_binary_message(context['conn'], CommandCode.ERROR, {
+            'success': False, 'message': RATE_LIMITED_MESSAGE, 'retry_after_ms': max(1, round(retry_after * 1000))
+        })
+    return False
+
 ## Roteia o comando recebido para a função apropriada
 def route_command(context, cmd_code: CommandCode, payload: dict):
-    if cmd_code not in (CommandCode.REGISTER, CommandCode.LOGIN) and not context.get('current_user'):
+    if cmd_code not in (CommandCode.REGISTER, CommandCode.LOGIN, CommandCode.PING) and not context.get('current_user'):
         client_handler.send_binary_message(context['conn'], CommandCode.ERROR, 
                                                  {'error': 'Autenticacao necessaria.'})
         return
@@ -210,7 +278,11 @@ def route_command(context, cmd_code: CommandCode, payload: dict):
     handler_function = COMMAND_MAP.get(cmd_code)
     
     if handler_function:
+        started = time.perf_counter()
         handler_function(context, payload) 
+        # Comandos suspensos à espera do pool de autenticação medem só a parte síncrona
+        if metrics.enabled:
+            metrics.observe_command(cmd_code, time.perf_counter() - started)
 
     else:
         command_name = CODE_TO_COMMAND_NAME.get(cmd_code, f"UNKNOWN(0x{cmd_code.value:02X})")
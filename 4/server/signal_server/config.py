@@ -1,4 +1,85 @@
 import os
 
+SERVER_HOST = os.environ.get('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.environ.get('SERVER_PORT', 8888))
+
+# Modo de execução do servidor: 'thread' (uma thread por conexão) ou 'async' (um único event loop)
+SERVER_MODE = os.environ.get('SERVER_MODE', 'thread')
+# Processos de sinalização na mesma porta (SO_REUSEPORT) e socket Unix do barramento de presença entre eles
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 1))
+CLUSTER_SOCKET_PATH = os.environ.get('CLUSTER_SOCKET_PATH', '')
+
 RELAY_SERVER_IP = os.environ.get('RELAY_IP', '127.0.0.1')
-RELAY_SERVER_PORT = int(os.environ.get('RELAY_PORT', 9000))
\ No newline at end of file
+RELAY_SERVER_PORT = int(os.environ.get('RELAY_PORT', 9000))
+
+# Pool de relays de mídia ("ip:porta,ip:porta"; padrão: o relay único acima) e como escolher um por chamada:
+# 'least_loaded' (menos sessões ativas) ou 'hash' (rendezvous hashing pelo token)
+RELAY_SERVERS = os.environ.get('RELAY_SERVERS', f"{RELAY_SERVER_IP}:{RELAY_SERVER_PORT}")
+RELAY_SELECTION = os.environ.get('RELAY_SELECTION', 'least_loaded')
+# Validade máxima (s) de uma sessão de chamada que não foi encerrada por BYE ou desconexão
+CALL_SESSION_TTL_SECONDS = float(os.environ.get('CALL_SESSION_TTL_SECONDS', 4 * 3600))
+
+# Relay UDP em Python (media_relay.py): inatividade (s) até remover uma sessão, intervalo (s) da limpeza,
+# máximo de pacotes lidos por evento de leitura e tamanho dos buffers do socket
+RELAY_SESSION_TIMEOUT_SECONDS = float(os.environ.get('RELAY_SESSION_TIMEOUT_SECONDS', 300))
+RELAY_CLEANUP_INTERVAL_SECONDS = float(os.environ.get('RELAY_CLEANUP_INTERVAL_SECONDS', 10))
+RELAY_RECV_BATCH = int(os.environ.get('RELAY_RECV_BATCH', 64))
+RELAY_SOCKET_BUFFER_BYTES = int(os.environ.get('RELAY_SOCKET_BUFFER_BYTES', 4 * 1024 * 1024))
+
+# Pool de conexões SQLite do db_manager
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 64))
+# Fila de escrita (pedidos de amizade): máximo de mutações por transação e espera (ms) para juntar um lote
+DB_WRITE_BATCH_SIZE = int(os.environ.get('DB_WRITE_BATCH_SIZE', 256))
+DB_WRITE_BATCH_INTERVAL_MS = float(os.environ.get('DB_WRITE_BATCH_INTERVAL_MS', 2))
+
+# Máximo de usuários mantidos no cache em memória do grafo de amizades (LRU)
+FRIEND_CACHE_MAX_USERS = int(os.environ.get('FRIEND_CACHE_MAX_USERS', 50000))
+
+# Sincronização incremental da lista de amigos: mudanças guardadas por usuário no log (as mais antigas são
+# descartadas) e orçamento de bytes do FRIEND_LIST_DELTA; acima dele o cliente recebe a lista completa
+FRIENDSHIP_LOG_MAX_ENTRIES = int(os.environ.get('FRIENDSHIP_LOG_MAX_ENTRIES', 500))
+FRIEND_DELTA_MAX_BYTES = int(os.environ.get('FRIEND_DELTA_MAX_BYTES', 60000))
+
+# Presença: janela (ms) em que as mudanças de status para cada amigo são juntadas (só o último status de
+# cada usuário é enviado, num único frame para clientes com FEATURE_STATUS_BATCH); 0 envia cada mudança na hora
+PRESENCE_COALESCE_MS = float(os.environ.get('PRESENCE_COALESCE_MS', 200))
+
+# Heartbeat: conexões sem nenhum frame (PING ou comando) por esse tempo (s) são encerradas (0 = desligado);
+# o reaper examina um slot da roda de temporização a cada HEARTBEAT_TICK_SECONDS
+HEARTBEAT_TIMEOUT_SECONDS = float(os.environ.get('HEARTBEAT_TIMEOUT_SECONDS', 90))
+HEARTBEAT_TICK_SECONDS = float(os.environ.get('HEARTBEAT_TICK_SECONDS', 1))
+
+# Limite de comandos por conexão (token bucket por classe): "classe=comandos_por_segundo:rajada,...";
+# classes: auth (login/registro), search, friends, call, other. Vazio desliga o limite
+RATE_LIMITS = os.environ.get('RATE_LIMITS', 'auth=1:5,search=5:20,friends=5:20,call=5:20,other=20:50')
+
+# Logging: 'dev' escreve cada registro de forma síncrona no stderr; 'production' usa uma thread escritora
+# (QueueHandler/QueueListener) e registra só 1 a cada LOG_FRAME_SAMPLE_EVERY logs por frame/comando;
+# 'off' registra só avisos e erros
+LOG_MODE = os.environ.get('LOG_MODE', 'dev')
+LOG_FRAME_SAMPLE_EVERY = int(os.environ.get('LOG_FRAME_SAMPLE_EVERY', 100))
+
+# Métricas: instrumentação de comandos, envios, banco e locks do estado (0 desliga) e endpoint HTTP local
+# no formato de texto do Prometheus (porta 0 = sem endpoint; no cluster cada worker usa porta + id)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))
+
+# Fila de saída por conexão: máximo de frames pendentes antes de descartar status e, depois, derrubar a conexão
+OUTBOX_MAX_FRAMES = int(os.environ.get('OUTBOX_MAX_FRAMES', 1024))
+# Tempo ocioso (s) após o qual a thread escritora de uma conexão termina (é recriada no próximo envio)
+OUTBOX_WRITER_IDLE_SECONDS = float(os.environ.get('OUTBOX_WRITER_IDLE_SECONDS', 5))
+
+# Busca de usuários: máximo de resultados por página e orçamento de bytes do SEARCH_RESPONSE (limite do frame: 65535)
+SEARCH_RESULT_LIMIT = int(os.environ.get('SEARCH_RESULT_LIMIT', 50))
+SEARCH_RESPONSE_MAX_BYTES = int(os.environ.get('SEARCH_RESPONSE_MAX_BYTES', 60000))
+
+# Hash de senhas (PBKDF2-HMAC-SHA256): iterações usadas em novos hashes; hashes mais fracos são refeitos no login
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 200000))
+
+# Pool de login/registro: threads dedicadas (0 = executa na thread da conexão) e tamanho máximo da fila
+AUTH_WORKERS = int(os.environ.get('AUTH_WORKERS', 2))
+AUTH_QUEUE_SIZE = int(os.environ.get('AUTH_QUEUE_SIZE', 256))
+# Intervalo (s) entre os registros de métricas do pool no log
+AUTH_METRICS_LOG_SECONDS = float(os.environ.get('AUTH_METRICS_LOG_SECONDS', 60))
@@ -28,6 +28,56 @@ CREATE TABLE IF NOT EXISTS friendships (
 );
 """
 
+# Migrações versionadas do esquema, aplicadas em ordem sobre as tabelas base.
+# A versão atual do banco fica em PRAGMA user_version; cada migração roda numa transação própria
+# junto com a atualização da versão, então um banco nunca fica com uma migração pela metade.
+# Para alterar o esquema, acrescente uma nova entrada no fim da lista (nunca edite uma já publicada).
+MIGRATIONS = [
+    (1, "Índice de busca por prefixo de nickname (sem distinção de maiúsculas)", [
+        "CREATE INDEX IF NOT EXISTS idx_users_nickname_nocase ON users(nickname COLLATE NOCASE, nickname)",
+    ]),
+    (2, "Índices de cobertura para amigos e pedidos pendentes", [
+        "CREATE INDEX IF NOT EXISTS idx_friendships_b_status ON friendships(user_nickname_b, status, user_nickname_a)",
+        "CREATE INDEX IF NOT EXISTS idx_friendships_a_status ON friendships(user_nickname_a, status, user_nickname_b)",
+    ]),
+    (3, "Versão da lista de amigos por usuário e log de mudanças (sincronização incremental)", [
+        "ALTER TABLE users ADD COLUMN friendship_version INTEGER NOT NULL DEFAULT 0",
+        """CREATE TABLE IF NOT EXISTS friendship_log (
+            nickname TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            friend TEXT NOT NULL,
+            added INTEGER NOT NULL,
+            PRIMARY KEY (nickname, version)
+        ) WITHOUT ROWID""",
+        # Amizades anteriores à migração não estão no log: quem já tem amigos começa na versão 1,
+        # o que obriga a lista completa na primeira sincronização
+        """UPDATE users SET friendship_version = 1 WHERE nickname IN (
+            SELECT user_nickname_a FROM friendships WHERE status = 'accepted'
+            UNION SELECT user_nickname_b FROM friendships WHERE status = 'accepted')""",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Aplica as migrações ainda não executadas no banco e retorna a versão final
+def migrate(conn: sqlite3.Connection) -> int:
+    current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, description, statements in MIGRATIONS:
+        if version <= current_version:
+            continue
+        logging.info(f"Aplicando migração {version}: {description}...")
+        try:
+            conn.execute("BEGIN")
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        current_version = version
+    return current_version
+
 def setup_database():
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
     
@@ -54,7 +104,9 @@ def setup_database():
         cursor.execute(SQL_CREATE_FRIENDSHIPS_TABLE)
         
         conn.commit()
-        logging.info("✅ Banco de dados e tabelas criados com sucesso!")
+
+        version = migrate(conn)
+        logging.info(f"✅ Banco de dados e tabelas criados com sucesso! (esquema versão {version})")
         
     except sqlite3.Error as e:
         logging.error(f"Erro ao configurar o banco de dados: {e}")
@@ -1,22 +1,242 @@
 import os
+import queue
 import sqlite3
 import logging
-import hashlib
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable
+import config
+import passwords
+from friend_cache import friend_cache, FriendEntry
+from cluster import cluster_bus
+from metrics import metrics
 
 DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '', 'db', 'voip.db')) 
 
+# Comandos SQL reutilizados; o texto idêntico permite ao cache de statements de cada conexão reaproveitá-los
+SQL_INSERT_USER = "INSERT INTO users (nickname, name, password_hash, created_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)"
+SQL_GET_PASSWORD_HASH = "SELECT password_hash FROM users WHERE nickname = ?"
+SQL_UPDATE_PASSWORD_HASH = "UPDATE users SET password_hash = ? WHERE nickname = ? AND password_hash = ?"
+# Busca por prefixo (sem distinção de maiúsculas) paginada por cursor: percorre o índice idx_users_nickname_nocase
+# a partir do maior entre prefixo e cursor e pula as linhas já entregues (nickname <= cursor na mesma chave NOCASE)
+SQL_SEARCH_USERS = (
+    "SELECT nickname, name FROM users "
+    "WHERE nickname >= ? COLLATE NOCASE AND nickname < ? COLLATE NOCASE "
+    "AND NOT (nickname = ? COLLATE NOCASE AND nickname <= ?) AND nickname != ? "
+    "ORDER BY nickname COLLATE NOCASE, nickname LIMIT ?"
+)
+SQL_FRIENDSHIP_EXISTS = "SELECT 1 FROM friendships WHERE (user_nickname_a = ? AND user_nickname_b = ?) OR (user_nickname_a = ? AND user_nickname_b = ?)"
+SQL_INSERT_FRIEND_REQUEST = "INSERT INTO friendships (user_nickname_a, user_nickname_b, status, created_at) VALUES (?, ?, 'pending', CURRENT_TIMESTAMP)"
+SQL_UPDATE_FRIEND_REQUEST = "UPDATE friendships SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE user_nickname_a = ? AND user_nickname_b = ? AND status = 'pending'"
+# Versão da lista de amigos: incrementada a cada amizade criada ou desfeita, com a mudança registrada no log
+SQL_BUMP_FRIENDSHIP_VERSION = "UPDATE users SET friendship_version = friendship_version + 1 WHERE nickname = ?"
+SQL_GET_FRIENDSHIP_VERSION = "SELECT friendship_version FROM users WHERE nickname = ?"
+SQL_INSERT_FRIENDSHIP_LOG = "INSERT INTO friendship_log (nickname, version, friend, added) VALUES (?, ?, ?, ?)"
+SQL_PRUNE_FRIENDSHIP_LOG = "DELETE FROM friendship_log WHERE nickname = ? AND version <= ?"
+SQL_FRIENDSHIP_LOG_SINCE = "SELECT version, friend, added FROM friendship_log WHERE nickname = ? AND version > ? ORDER BY version"
+# Amigos aceitos (nos dois sentidos) e pedidos pendentes recebidos, numa única consulta
+SQL_FRIENDSHIPS_OF = (
+    "SELECT user_nickname_b, status FROM friendships WHERE user_nickname_a = ? AND status = 'accepted' "
+    "UNION ALL "
+    "SELECT user_nickname_a, status FROM friendships WHERE user_nickname_b = ? AND status IN ('accepted', 'pending')"
+)
+
+# Pool fixo de conexões persistentes (modo WAL), emprestadas por thread a cada operação
+class _ConnectionPool:
+    def __init__(self, db_path: str, size: int):
+        self._db_path = db_path
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._local = threading.local()
+        for _ in range(size):
+            self._idle.put(self._open_connection())
+        logging.info(f"Pool SQLite aberto com {size} conexões em {db_path}")
+
+    def _open_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._db_path, check_same_thread=False,
+                               cached_statements=config.DB_STATEMENT_CACHE_SIZE)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    # Empresta uma conexão à thread atual; chamadas aninhadas na mesma thread reutilizam a mesma conexão
+    @contextmanager
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._idle.get()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            # Transação não confirmada (erro no meio da operação) é descartada antes de devolver ao pool
+            if conn.in_transaction:
+                conn.rollback()
+            self._local.conn = None
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pool: _ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> _ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _ConnectionPool(DB_PATH, config.DB_POOL_SIZE)
+    return _pool
+
+# Fila de escrita atrasada (write-behind): as mutações de várias threads são executadas por uma única
+# thread escritora, com conexão própria, e agrupadas numa só transação (um fsync por lote).
+# Cada tarefa roda dentro de um SAVEPOINT, então a falha de uma não desfaz as outras do lote.
+# O Future de cada tarefa só é resolvido depois do COMMIT (confirmação durável) e dos efeitos pós-commit.
+class _WriteBehindQueue:
+    def __init__(self, db_path: str, batch_size: int, interval_seconds: float):
+        self._db_path = db_path
+        self._batch_size = max(1, batch_size)
+        self._interval = max(0.0, interval_seconds)
+        self._jobs: queue.Queue = queue.Queue()
+        self._stopping = False
+        self._batches = 0
+        self._jobs_done = 0
+        self._thread = threading.Thread(target=self._run, daemon=True, name="DBWriter")
+        self._thread.start()
+
+    # `job(conn)` retorna (resultado, efeito_pós_commit ou None); `on_error(exc)` gera o resultado em caso de erro do banco
+    def submit(self, job: Callable, on_error: Callable[[Exception], object]) -> Future:
+        future = Future()
+        self._jobs.put((job, on_error, future))
+        return future
+
+    def metrics(self) -> dict:
+        return {'batches': self._batches, 'jobs': self._jobs_done, 'queue_depth': self._jobs.qsize()}
+
+    # Processa o que já estiver na fila e encerra a thread escritora
+    def close(self):
+        self._jobs.put(None)
+        self._thread.join()
+
+    def _run(self):
+        conn = sqlite3.connect(self._db_path, isolation_level=None, check_same_thread=False,
+                               cached_statements=config.DB_STATEMENT_CACHE_SIZE)
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            while not self._stopping:
+                batch = self._collect()
+                if batch:
+                    self._execute(conn, batch)
+        finally:
+            conn.close()
+
+    # Bloqueia até a primeira tarefa e junta as que chegarem até o lote encher ou o intervalo acabar
+    def _collect(self) -> list:
+        item = self._jobs.get()
+        if item is None:
+            self._stopping = True
+            return []
+        batch = [item]
+        deadline = time.monotonic() + self._interval
+        while len(batch) < self._batch_size:
+            try:
+                timeout = deadline - time.monotonic()
+                item = self._jobs.get(timeout=timeout) if timeout > 0 else self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopping = True
+                break
+            batch.append(item)
+        return batch
+
+    def _execute(self, conn: sqlite3.Connection, batch: list):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for job, on_error, future in batch:
+                conn.execute("SAVEPOINT job")
+                try:
+                    result, after_commit = job(conn)
+                    conn.execute("RELEASE job")
+                    outcomes.append((future, result, after_commit, None))
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    outcomes.append((future, on_error(e), None, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    outcomes.append((future, None, None, e))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logging.error(f"Falha ao confirmar lote de {len(batch)} escrita(s) no banco: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, on_error, future in batch:
+                future.set_result(on_error(e))
+            return
+
+        self._batches += 1
+        self._jobs_done += len(batch)
+        for future, result, after_commit, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+                continue
+            if after_commit is not None:
+                try:
+                    after_commit()
+                except Exception as e:
+                    logging.error(f"Erro ao aplicar efeito pós-commit: {e}", exc_info=True)
+            future.set_result(result)
+
+_writer: _WriteBehindQueue | None = None
+
+def _get_writer() -> _WriteBehindQueue:
+    global _writer
+    if _writer is None:
+        with _pool_lock:
+            if _writer is None:
+                _writer = _WriteBehindQueue(DB_PATH, config.DB_WRITE_BATCH_SIZE, config.DB_WRITE_BATCH_INTERVAL_MS / 1000)
+    return _writer
+
+def write_metrics() -> dict:
+    return _get_writer().metrics()
+
+# Profundidade da fila de escrita, sem abrir a thread escritora só para a coleta
+metrics.register_gauge('voip_db_write_queue_depth', 'Mutações aguardando a thread escritora',
+                       lambda: _writer.metrics()['queue_depth'] if _writer is not None else 0)
+
+# Fecha as conexões do pool e a thread escritora (a próxima operação reabre ambos em DB_PATH)
+def close_pool():
+    global _pool, _writer
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+
+def _connection():
+    return _get_pool().connection()
+
 # Registra um novo usuário no banco de dados.
+@metrics.timed_db
 def register_user(nickname, name, password):
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
-    conn = None
+    password_hash = passwords.hash_password(password)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO users (nickname, name, password_hash, created_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
-            (nickname, name, password_hash)
-        )
-        conn.commit()
+        with _connection() as conn:
+            conn.execute(SQL_INSERT_USER, (nickname, name, password_hash))
+            conn.commit()
         logging.info(f"Novo usuario registrado: {nickname}")
         return (True, "Registo concluido com sucesso!")
     except sqlite3.IntegrityError:
@@ -25,131 +245,187 @@ def register_user(nickname, name, password):
     except sqlite3.Error as e:
         logging.error(f"Erro no banco de dados ao registrar {nickname}: {e}")
         return (False, f"Erro interno do servidor: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 # Verifica as credenciais no banco de dados SQLite.
+# Hashes no formato antigo (ou com menos iterações) são refeitos após um login bem-sucedido.
+@metrics.timed_db
 def check_login(nickname, password):
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
-    conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT nickname FROM users WHERE nickname = ? AND password_hash = ?", (nickname, password_hash))
-        user = cursor.fetchone()
-        return True if user is not None else False
+        with _connection() as conn:
+            row = conn.execute(SQL_GET_PASSWORD_HASH, (nickname,)).fetchone()
+        if row is None or not passwords.verify_password(password, row[0]):
+            return False
+
+        if passwords.needs_rehash(row[0]):
+            with _connection() as conn:
+                conn.execute(SQL_UPDATE_PASSWORD_HASH, (passwords.hash_password(password), nickname, row[0]))
+                conn.commit()
+            logging.info(f"Hash de senha de {nickname} atualizado para o formato atual.")
+        return True
     except sqlite3.Error as e:
         logging.error(f"Erro no banco de dados ao autenticar {nickname}: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
-# Procura por usuários no DB, excluindo o próprio usuário.
-def search_users_db(query, current_user_nickname):
-    conn = None
+_MAX_CHAR = '\U0010ffff'
+_NOCASE_TABLE = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+def _nocase_key(value: str) -> str:
+    return value.translate(_NOCASE_TABLE)
+
+# Procura usuários cujo nickname começa com `query`, em ordem, a partir do cursor (último nickname já entregue)
+@metrics.timed_db
+def search_users_db(query, current_user_nickname, cursor=None, limit=None):
+    limit = config.SEARCH_RESULT_LIMIT if limit is None else limit
+    cursor = cursor or ''
+    # O índice NOCASE compara os bytes UTF-8 com A-Z convertidas para minúsculas; o início da varredura
+    # é o maior entre prefixo e cursor nessa ordem, e o fim é o prefixo seguido do maior caractere possível
+    start = max(query, cursor, key=_nocase_key)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT nickname, name FROM users WHERE nickname LIKE ? AND nickname != ?", 
-            (f'{query}%', current_user_nickname)
-        )
-        results = [{'nickname': row[0], 'name': row[1]} for row in cursor.fetchall()]
-        return results
+        with _connection() as conn:
+            rows = conn.execute(SQL_SEARCH_USERS, (start, query + _MAX_CHAR, cursor, cursor,
+                                                   current_user_nickname, limit)).fetchall()
+        return [{'nickname': row[0], 'name': row[1]} for row in rows]
     except sqlite3.Error as e:
         logging.error(f"Erro no banco de dados ao procurar usuários: {e}")
         return []
 
-# Adiciona um pedido de amizade com status pendente.
-def add_friend_request_db(requester, target):
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT 1 FROM friendships WHERE (user_nickname_a = ? AND user_nickname_b = ?) OR (user_nickname_a = ? AND user_nickname_b = ?)",
-            (requester, target, target, requester)
-        )
-        if cursor.fetchone():
-            return (False, "Já existe uma relação (amigo ou pendente).")
-        cursor.execute(
-            "INSERT INTO friendships (user_nickname_a, user_nickname_b, status, created_at) VALUES (?, ?, 'pending', CURRENT_TIMESTAMP)",
-            (requester, target)
-        )
-        conn.commit()
+# Registra, na transação da escrita, que `friend` entrou (ou saiu) da lista de amigos de `nickname`
+def _record_friendship_change(conn, nickname, friend, added: bool):
+    conn.execute(SQL_BUMP_FRIENDSHIP_VERSION, (nickname,))
+    version = conn.execute(SQL_GET_FRIENDSHIP_VERSION, (nickname,)).fetchone()[0]
+    conn.execute(SQL_INSERT_FRIENDSHIP_LOG, (nickname, version, friend, int(added)))
+    conn.execute(SQL_PRUNE_FRIENDSHIP_LOG, (nickname, version - config.FRIENDSHIP_LOG_MAX_ENTRIES))
+
+# Tarefas da fila de escrita: rodam na thread escritora, então o tempo medido é o da execução no banco
+# (sem a espera na fila nem o commit do lote)
+@metrics.timed_db
+def _add_friend_request_job(conn, requester, target):
+    if conn.execute(SQL_FRIENDSHIP_EXISTS, (requester, target, target, requester)).fetchone():
+        return (False, "Já existe uma relação (amigo ou pendente)."), None
+    conn.execute(SQL_INSERT_FRIEND_REQUEST, (requester, target))
+
+    def after_commit():
+        friend_cache.add_pending(requester, target)
+        cluster_bus.friendship_changed('pending', requester, target)
         logging.info(f"Novo pedido de amizade: {requester} -> {target}")
-        return (True, "Pedido de amizade enviado.")
-    except sqlite3.Error as e:
+    return (True, "Pedido de amizade enviado."), after_commit
+
+@metrics.timed_db
+def _update_friend_request_job(conn, requester, acceptor, new_status):
+    cursor = conn.execute(SQL_UPDATE_FRIEND_REQUEST, (new_status, requester, acceptor))
+    if cursor.rowcount <= 0:
+        logging.warning(f"Nenhum pedido pendente encontrado para {requester} -> {acceptor}.")
+        return False, None
+    if new_status == 'accepted':
+        _record_friendship_change(conn, requester, acceptor, True)
+        _record_friendship_change(conn, acceptor, requester, True)
+
+    def after_commit():
+        if new_status == 'accepted':
+            friend_cache.accept(requester, acceptor)
+        else:
+            friend_cache.reject(requester, acceptor)
+        cluster_bus.friendship_changed(new_status, requester, acceptor)
+        logging.info(f"Pedido de amizade {requester} -> {acceptor} atualizado para {new_status}.")
+    return True, after_commit
+
+# Adiciona um pedido de amizade com status pendente (pela fila de escrita).
+# O Future resolve para (sucesso, mensagem) depois que a escrita estiver confirmada no disco.
+def add_friend_request_async(requester, target) -> Future:
+    def on_error(e):
         logging.error(f"Erro no banco de dados ao adicionar amigo: {e}")
         return (False, f"Erro interno do servidor: {e}")
-    finally:
-        if conn:
-            conn.close()
 
-# Atualiza um pedido de amizade pendente para aceito ou rejeitado.
+    return _get_writer().submit(lambda conn: _add_friend_request_job(conn, requester, target), on_error)
+
+# Versão síncrona: o tempo medido inclui a espera na fila e o commit do lote
+@metrics.timed_db
+def add_friend_request_db(requester, target):
+    return add_friend_request_async(requester, target).result()
+
+# Atualiza um pedido de amizade pendente para aceito ou rejeitado (pela fila de escrita).
+# O Future resolve para True se havia um pedido pendente, depois da confirmação no disco.
+def update_friend_request_async(requester, acceptor, new_status) -> Future:
+    def on_error(e):
+        logging.error(f"Erro no banco de dados ao aceitar amigo: {e}")
+        return False
+
+    return _get_writer().submit(lambda conn: _update_friend_request_job(conn, requester, acceptor, new_status), on_error)
+
+@metrics.timed_db
 def update_friend_request_db(requester, acceptor, new_status):
-    conn = None
+    return update_friend_request_async(requester, acceptor, new_status).result()
+
+# Carrega do banco as relações de um usuário (amigos aceitos e pedidos pendentes recebidos) para o cache
+@metrics.timed_db
+def _load_friendships_db(nickname):
+    friends, pending = [], []
+    with _connection() as conn:
+        for other, status in conn.execute(SQL_FRIENDSHIPS_OF, (nickname, nickname)):
+            if status == 'accepted':
+                friends.append(other)
+            else:
+                pending.append(other)
+    return friends, pending
+
+# Retorna amigos e pedidos pendentes de um usuário de uma só vez (uma consulta ao cache, no máximo uma ao banco)
+@metrics.timed_db
+def get_friendships_db(nickname) -> FriendEntry:
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE friendships SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE user_nickname_a = ? AND user_nickname_b = ? AND status = 'pending'",
-            (new_status, requester, acceptor)
-        )
-        conn.commit()
-        if cursor.rowcount > 0:
-            logging.info(f"Pedido de amizade {requester} -> {acceptor} atualizado para {new_status}.")
-            return True
-        else:
-            logging.warning(f"Nenhum pedido pendente encontrado para {requester} -> {acceptor}.")
-            return False
+        return friend_cache.get(nickname, _load_friendships_db)
     except sqlite3.Error as e:
-        logging.error(f"Erro no banco de dados ao aceitar amigo: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
+        logging.error(f"Erro no banco de dados ao buscar amizades de {nickname}: {e}")
+        return FriendEntry(frozenset(), frozenset())
 
-#  Retorna uma lista de todos os nicknames que são amigos de um determinado usuário.
-def get_friends_list_db(nickname):
-    conn = None
-    friends = []
+# Retorna o conjunto (imutável) de amigos de um usuário, servido pelo cache em memória.
+@metrics.timed_db
+def get_friends_set_db(nickname) -> frozenset:
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT user_nickname_b FROM friendships WHERE user_nickname_a = ? AND status = 'accepted'", (nickname,)
-        )
-        friends.extend([row[0] for row in cursor.fetchall()])
-        cursor.execute(
-            "SELECT user_nickname_a FROM friendships WHERE user_nickname_b = ? AND status = 'accepted'", (nickname,)
-        )
-        friends.extend([row[0] for row in cursor.fetchall()])
-        return list(set(friends))
+        return friend_cache.get(nickname, _load_friendships_db).friends
     except sqlite3.Error as e:
         logging.error(f"Erro no banco de dados ao buscar amigos de {nickname}: {e}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+        return frozenset()
+
+#  Retorna uma lista de todos os nicknames que são amigos de um determinado usuário.
+@metrics.timed_db
+def get_friends_list_db(nickname):
+    return list(get_friends_set_db(nickname))
 
 # Retorna uma lista de nicknames que enviaram pedidos de amizade pendentes.
+@metrics.timed_db
 def get_pending_friend_requests_db(target_nickname):
-    conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT user_nickname_a FROM friendships WHERE user_nickname_b = ? AND status = 'pending'",
-            (target_nickname,)
-        )
-        requesters = [row[0] for row in cursor.fetchall()]
-        return requesters
+        return sorted(friend_cache.get(target_nickname, _load_friendships_db).pending_from)
     except sqlite3.Error as e:
         logging.error(f"Erro no banco de dados ao buscar pedidos pendentes de {target_nickname}: {e}")
         return []
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+
+# Versão atual da lista de amigos de um usuário (0 se nunca mudou ou se o usuário não existe)
+@metrics.timed_db
+def get_friendship_version_db(nickname) -> int:
+    try:
+        with _connection() as conn:
+            row = conn.execute(SQL_GET_FRIENDSHIP_VERSION, (nickname,)).fetchone()
+        return row[0] if row else 0
+    except sqlite3.Error as e:
+        logging.error(f"Erro no banco de dados ao buscar versão das amizades de {nickname}: {e}")
+        return 0
+
+# Mudanças na lista de amigos depois de `since_version`: retorna (versão atual, [(amigo, entrou), ...] em ordem)
+# ou (versão atual, None) quando o log não cobre o intervalo (versão desconhecida ou entradas já descartadas)
+@metrics.timed_db
+def get_friendship_changes_db(nickname, since_version):
+    try:
+        with _connection() as conn:
+            row = conn.execute(SQL_GET_FRIENDSHIP_VERSION, (nickname,)).fetchone()
+            version = row[0] if row else 0
+            if since_version > version:
+                return version, None
+            rows = conn.execute(SQL_FRIENDSHIP_LOG_SINCE, (nickname, since_version)).fetchall()
+    except sqlite3.Error as e:
+        logging.error(f"Erro no banco de dados ao buscar mudanças nas amizades de {nickname}: {e}")
+        return 0, None
+    # As versões de um usuário são consecutivas: o log cobre o intervalo se começa logo após since_version
+    if len(rows) != version - since_version or (rows and rows[0][0] != since_version + 1):
+        return version, None
+    return version, [(friend, bool(added)) for _, friend, added in rows]
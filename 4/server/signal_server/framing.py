@@ -0,0 +1,112 @@
+import socket
+import struct
+from typing import List, Optional, Tuple
+
+FMT_HEADER = struct.Struct('!BH')
+HEADER_SIZE = FMT_HEADER.size
+MAX_FRAME_SIZE = HEADER_SIZE + 0xFFFF
+# Tamanho inicial do buffer de cada conexão; cresce só quando um cabeçalho anuncia um frame maior
+INITIAL_BUFFER_SIZE = 4096
+# Abaixo disso de espaço livre no fim do buffer os bytes pendentes são movidos para o início
+MIN_FREE_SPACE = 1024
+
+# Extrai os frames completos de buffer[start:end]; retorna os frames (payload como view sobre `view`)
+# e a posição do primeiro byte não consumido
+def _parse_frames(buffer, view: memoryview, start: int, end: int) -> Tuple[List[Tuple[int, memoryview]], int]:
+    frames = []
+    while end - start >= HEADER_SIZE:
+        command_value, payload_length = FMT_HEADER.unpack_from(buffer, start)
+        frame_end = start + HEADER_SIZE + payload_length
+        if frame_end > end:
+            break
+        frames.append((command_value, view[start + HEADER_SIZE:frame_end]))
+        start = frame_end
+    return frames, start
+
+# Lê frames '!BH' de um fluxo com um buffer por conexão.
+# Cada recv_into pode trazer vários frames; todos os frames completos são devolvidos de uma vez,
+# com o payload como memoryview sobre o buffer interno (sem cópia).
+# As memoryviews devolvidas só são válidas até a próxima leitura.
+# O buffer só é alocado na primeira leitura, com INITIAL_BUFFER_SIZE; cresce até o frame anunciado no
+# cabeçalho pendente e volta ao tamanho inicial quando esvazia, então conexões ociosas ficam com pouca memória.
+class FrameReader:
+    def __init__(self, sock: Optional[socket.socket] = None, buffer_size: int = INITIAL_BUFFER_SIZE):
+        self._sock = sock
+        self._initial_size = max(buffer_size, HEADER_SIZE)
+        self._buffer = bytearray()
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+    # Troca o buffer por um novo (as views já devolvidas continuam apontando para o antigo)
+    def _reallocate(self, size: int):
+        pending = self._end - self._start
+        buffer = bytearray(size)
+        buffer[:pending] = self._view[self._start:self._end]
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        self._start = 0
+        self._end = pending
+
+    # Garante espaço para o frame pendente inteiro (ou ao menos um cabeçalho), crescendo ou
+    # movendo os bytes pendentes para o início.
+    # A atribuição de mesmo tamanho não redimensiona o bytearray, então é permitida com views exportadas.
+    def _ensure_space(self):
+        pending = self._end - self._start
+        needed = HEADER_SIZE
+        if pending >= HEADER_SIZE:
+            needed += FMT_HEADER.unpack_from(self._buffer, self._start)[1]
+        if needed > len(self._buffer):
+            self._reallocate(max(needed, self._initial_size))
+            return
+        if self._start and (self._start + needed > len(self._buffer) or len(self._buffer) - self._end < MIN_FREE_SPACE):
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+            self._start = 0
+            self._end = pending
+
+    # Extrai todos os frames completos presentes no buffer; vazio, o buffer volta ao tamanho inicial
+    def _parse(self) -> List[Tuple[int, memoryview]]:
+        frames, start = _parse_frames(self._buffer, self._view, self._start, self._end)
+        if start == self._end:
+            self._start = self._end = 0
+            if len(self._buffer) > self._initial_size:
+                self._reallocate(self._initial_size)
+        else:
+            self._start = start
+        return frames
+
+    # Faz uma única chamada recv_into e devolve os frames completos (lista vazia se ainda incompleto).
+    # Retorna None quando o par fecha a conexão.
+    def read_frames(self) -> Optional[List[Tuple[int, memoryview]]]:
+        self._ensure_space()
+        received = self._sock.recv_into(self._view[self._end:])
+        if not received:
+            return None
+        self._end += received
+        return self._parse()
+
+    # Variante para quem já recebeu os bytes (ex.: data_received do asyncio).
+    # Sem bytes pendentes os frames são lidos direto de `data`, e só a sobra incompleta vai para o buffer.
+    def feed(self, data: bytes) -> List[Tuple[int, memoryview]]:
+        data_view = memoryview(data)
+        frames = []
+        if self._start == self._end:
+            frames, consumed = _parse_frames(data, data_view, 0, len(data))
+            data_view = data_view[consumed:]
+        # frames[:safe] não apontam para o buffer interno
+        safe = len(frames)
+        while data_view:
+            if len(frames) > safe:
+                # O próximo bloco pode sobrescrever a região dos frames já extraídos do buffer
+                frames[safe:] = [(command_value, bytes(payload)) for command_value, payload in frames[safe:]]
+                safe = len(frames)
+            self._ensure_space()
+            chunk = min(len(data_view), len(self._buffer) - self._end)
+            self._view[self._end:self._end + chunk] = data_view[:chunk]
+            self._end += chunk
+            data_view = data_view[chunk:]
+            frames.extend(self._parse())
+        return frames
+
+    def pending_bytes(self) -> int:
+        return self._end - self._start
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Tuple
+import config
+
+# Relações de um usuário em cache: amigos aceitos e quem lhe enviou pedido pendente
+class FriendEntry:
+    __slots__ = ('friends', 'pending_from')
+
+    def __init__(self, friends: Iterable[str], pending_from: Iterable[str]):
+        self.friends: frozenset[str] = frozenset(friends)
+        self.pending_from: frozenset[str] = frozenset(pending_from)
+
+# Índice em memória do grafo de amizades, carregado por usuário sob demanda e limitado por LRU.
+# Os conjuntos são imutáveis (copy-on-write): leitores recebem um snapshot sem precisar de lock.
+class _FriendGraphCache:
+    def __init__(self, max_users: int):
+        self._max_users = max_users
+        self._entries: OrderedDict[str, FriendEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        # Incrementado a cada mutação; um carregamento concorrente com mutação não é guardado
+        self._generation = 0
+
+    def get(self, nickname: str, loader: Callable[[str], Tuple[Iterable[str], Iterable[str]]]) -> FriendEntry:
+        with self._lock:
+            entry = self._entries.get(nickname)
+            if entry is not None:
+                self._entries.move_to_end(nickname)
+                return entry
+            generation = self._generation
+
+        friends, pending_from = loader(nickname)
+        entry = FriendEntry(friends, pending_from)
+
+        with self._lock:
+            if self._generation == generation:
+                self._entries[nickname] = entry
+                self._entries.move_to_end(nickname)
+                while len(self._entries) > self._max_users:
+                    self._entries.popitem(last=False)
+        return entry
+
+    # Mutações abaixo só atualizam usuários já em cache; os demais serão lidos do banco quando preciso
+    def add_pending(self, requester: str, target: str):
+        with self._lock:
+            self._generation += 1
+            entry = self._entries.get(target)
+            if entry is not None:
+                self._entries[target] = FriendEntry(entry.friends, entry.pending_from | {requester})
+
+    def accept(self, requester: str, acceptor: str):
+        with self._lock:
+            self._generation += 1
+            entry = self._entries.get(acceptor)
+            if entry is not None:
+                self._entries[acceptor] = FriendEntry(entry.friends | {requester}, entry.pending_from - {requester})
+            entry = self._entries.get(requester)
+            if entry is not None:
+                self._entries[requester] = FriendEntry(entry.friends | {acceptor}, entry.pending_from)
+
+    def reject(self, requester: str, rejector: str):
+        with self._lock:
+            self._generation += 1
+            entry = self._entries.get(rejector)
+            if entry is not None:
+                self._entries[rejector] = FriendEntry(entry.friends, entry.pending_from - {requester})
+
+    def invalidate(self, nickname: str):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(nickname, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Instância global do cache de amizades
+friend_cache = _FriendGraphCache(config.FRIEND_CACHE_MAX_USERS)
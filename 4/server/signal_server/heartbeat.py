@@ -0,0 +1,115 @@
+import logging
+import math
+import threading
+import time
+from typing import Callable, Optional
+import config
+from metrics import metrics
+
+# Uma conexão vigiada: última atividade (no relógio grosso do reaper) e como derrubá-la
+class IdleWatch:
+    __slots__ = ('last_seen', 'evict', 'name', 'closed')
+
+    def __init__(self, now: float, evict: Callable[[], None], name):
+        self.last_seen = now
+        self.evict = evict
+        self.name = name
+        self.closed = False
+
+    # Marca atividade: só uma atribuição, sem lock nem chamada ao relógio do sistema
+    def touch(self, reaper: '_IdleReaper'):
+        self.last_seen = reaper.now
+
+# Derruba conexões sem tráfego (PING ou qualquer comando) há mais de HEARTBEAT_TIMEOUT_SECONDS.
+# Roda sobre uma roda de temporização (timer wheel): cada conexão fica num único slot, o do seu prazo,
+# e só é examinada quando o ponteiro passa por ele. Atividade não move a conexão de slot; no exame,
+# quem teve atividade é reinserido no slot do novo prazo. Assim cada conexão custa O(1) por período
+# de timeout, independentemente do número de comandos, e um tick só percorre o slot atual.
+# A derrubada é feita por `evict` (fechar o socket / abortar o transporte), o que leva a conexão ao
+# mesmo caminho de limpeza de uma desconexão normal (cleanup_connection).
+class _IdleReaper:
+    def __init__(self, timeout_seconds: float, tick_seconds: float, start_thread: bool = True):
+        self._timeout = timeout_seconds
+        self._tick = tick_seconds
+        self._num_slots = max(2, math.ceil(timeout_seconds / tick_seconds) + 1)
+        self._slots: list[list[IdleWatch]] = [[] for _ in range(self._num_slots)]
+        self._cursor = 0
+        self._lock = threading.Lock()
+        # Sem thread própria (start_thread=False) quem usa chama tick() a cada tick_seconds
+        self._start_thread = start_thread
+        self._thread: Optional[threading.Thread] = None
+        # Relógio grosso (resolução de um tick) usado por touch()
+        self.now = time.monotonic()
+        self.evicted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._timeout > 0
+
+    def _slot_for_unlocked(self, deadline: float) -> int:
+        ticks = math.ceil((deadline - self.now) / self._tick)
+        ticks = min(max(ticks, 1), self._num_slots - 1)
+        return (self._cursor + ticks) % self._num_slots
+
+    # Passa a vigiar uma conexão; devolve None se o heartbeat estiver desligado
+    def register(self, evict: Callable[[], None], name) -> Optional[IdleWatch]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._thread is None and self._start_thread:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="IdleReaper")
+                self._thread.start()
+            self.now = time.monotonic()
+            watch = IdleWatch(self.now, evict, name)
+            self._slots[self._slot_for_unlocked(self.now + self._timeout)].append(watch)
+        return watch
+
+    # A conexão terminou por conta própria; sai da roda no próximo exame do seu slot
+    def unregister(self, watch: Optional[IdleWatch]):
+        if watch is not None:
+            watch.closed = True
+
+    def _run(self):
+        while True:
+            time.sleep(self._tick)
+            try:
+                self.tick()
+            except Exception as e:
+                logging.error(f"Reaper: erro ao examinar conexões ociosas: {e}", exc_info=True)
+
+    # Avança o ponteiro um slot e examina as conexões cujo prazo caiu nele
+    def tick(self) -> int:
+        with self._lock:
+            self.now = now = time.monotonic()
+            self._cursor = (self._cursor + 1) % self._num_slots
+            due = self._slots[self._cursor]
+            self._slots[self._cursor] = []
+
+            expired = []
+            for watch in due:
+                if watch.closed:
+                    continue
+                deadline = watch.last_seen + self._timeout
+                if deadline <= now:
+                    expired.append(watch)
+                else:
+                    self._slots[self._slot_for_unlocked(deadline)].append(watch)
+
+        for watch in expired:
+            watch.closed = True
+            logging.info(f"Reaper: encerrando {watch.name}, sem tráfego há {now - watch.last_seen:.0f}s.")
+            try:
+                watch.evict()
+            except OSError as e:
+                logging.debug(f"Reaper: falha ao encerrar {watch.name}: {e}")
+        self.evicted += len(expired)
+        return len(expired)
+
+    def __len__(self):
+        return sum(len(slot) for slot in self._slots)
+
+
+# Instância global usada pelos modos thread e asyncio
+idle_reaper = _IdleReaper(config.HEARTBEAT_TIMEOUT_SECONDS, config.HEARTBEAT_TICK_SECONDS)
+metrics.register_gauge('voip_idle_evictions_total', 'Conexões encerradas por falta de heartbeat',
+                       lambda: idle_reaper.evicted, kind='counter')
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Tuple, Dict
+from concurrent.futures import Future
+from typing import Iterator, List, Optional, Tuple, Dict
 import socket
 from models import UserProfile 
 
@@ -13,20 +14,40 @@ class IAuthenticationService(ABC):
     def login_user(self, nickname: str, password: str, writer: socket.socket) -> tuple[bool, str]:
         pass
 
+    @abstractmethod
+    def verify_credentials(self, nickname: str, password: str) -> bool:
+        pass
+
+    @abstractmethod
+    def complete_login(self, nickname: str, credentials_ok: bool, writer: socket.socket) -> tuple[bool, str]:
+        pass
+
 # Interface para o Serviço de Amizade
 class IFriendshipService(ABC):
     @abstractmethod
-    def search_users(self, query: str, current_user_nickname: str) -> List[UserProfile]:
+    def search_users(self, query: str, current_user_nickname: str, cursor: Optional[str] = None) -> Tuple[List[UserProfile], str]:
         pass
 
     @abstractmethod
     def send_request(self, requester_nickname: str, target_nickname: str) -> tuple[bool, str]:
         pass
 
+    @abstractmethod
+    def send_request_async(self, requester_nickname: str, target_nickname: str) -> Future:
+        pass
+
     @abstractmethod
     def accept_request(self, requester_nickname: str, acceptor_nickname: str) -> tuple[bool, Optional[str], Optional[str]]:
         pass
 
+    @abstractmethod
+    def accept_request_async(self, requester_nickname: str, acceptor_nickname: str) -> Future:
+        pass
+
+    @abstractmethod
+    def complete_accept(self, requester_nickname: str, acceptor_nickname: str, success: bool) -> tuple[bool, Optional[str], Optional[str]]:
+        pass
+
     @abstractmethod
     def reject_request(self, requester_nickname: str, rejector_nickname: str) -> None:
         pass
@@ -39,8 +60,24 @@ class IFriendshipService(ABC):
     def get_pending_requests(self, nickname: str) -> List[str]:
         pass
 
+    @abstractmethod
+    def get_initial_data(self, nickname: str) -> Tuple[Iterator[Dict], List[str]]:
+        pass
+
+    @abstractmethod
+    def get_friendship_version(self, nickname: str) -> int:
+        pass
+
+    @abstractmethod
+    def get_friend_list_delta(self, nickname: str, since_version: int) -> Optional[Dict]:
+        pass
+
 # Interface para o Serviço de Chamada
 class ICallService(ABC):
     @abstractmethod
     def create_call_session(self, caller_nickname: str, callee_nickname: str) -> tuple[bool, str, Optional[dict]]:
+        pass
+
+    @abstractmethod
+    def end_call_session(self, nickname: str) -> None:
         pass
\ No newline at end of file
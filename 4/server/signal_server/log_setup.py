@@ -0,0 +1,95 @@
+import atexit
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+from typing import Optional
+import config
+
+LOG_FORMAT = '%(asctime)s - %(threadName)s - %(message)s'
+
+# Loggers do caminho quente: registros por frame/comando, amostrados no modo production
+FRAME_LOGGER = 'frames'
+SERVICE_LOGGER = 'services'
+
+# Contador de amostragem: sample() é verdadeiro em 1 a cada `every` chamadas
+class _Sampler:
+    def __init__(self, every: int = 1):
+        self.every = max(1, every)
+        self._counter = itertools.count()
+
+    def sample(self) -> bool:
+        return self.every == 1 or next(self._counter) % self.every == 0
+
+# Logger do caminho quente: registros abaixo de WARNING passam pela amostragem antes de o LogRecord ser
+# criado (criar o registro e localizar o chamador custa mais que escrevê-lo). Avisos e erros sempre passam.
+class SampledLogger(logging.LoggerAdapter):
+    def __init__(self, name: str, sampler: _Sampler):
+        super().__init__(logging.getLogger(name), {})
+        self.sampler = sampler
+
+    def isEnabledFor(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level) and (level >= logging.WARNING or self.sampler.sample())
+
+    def process(self, msg, kwargs):
+        return msg, kwargs
+
+# QueueHandler sem formatação na thread de origem: o registro vai para a fila com msg e args separados
+# e é formatado só pela thread do QueueListener. Os args precisam ser imutáveis (strings, números),
+# como são em todo o servidor.
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+# Configuração do logging do processo: 'dev' escreve de forma síncrona no stderr a cada chamada;
+# 'production' enfileira os registros para uma thread escritora e amostra os logs por frame;
+# 'off' escreve como 'dev', mas só avisos e erros
+class _LogSetup:
+    def __init__(self):
+        self.mode: Optional[str] = None
+        self.frame_sampler = _Sampler(1)
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._listener_pid = 0
+        self._output: Optional[logging.Handler] = None
+
+    def configure(self, mode: str = config.LOG_MODE, sample_every: int = config.LOG_FRAME_SAMPLE_EVERY,
+                  fmt: str = LOG_FORMAT, stream=None):
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        self._stop_listener()
+
+        self._output = logging.StreamHandler(stream)
+        self._output.setFormatter(logging.Formatter(fmt))
+        self.mode = mode
+        if mode == 'production':
+            log_queue = queue.SimpleQueue()
+            self._listener = logging.handlers.QueueListener(log_queue, self._output, respect_handler_level=True)
+            self._listener.start()
+            self._listener_pid = os.getpid()
+            root.addHandler(_LazyQueueHandler(log_queue))
+            self.frame_sampler.every = max(1, sample_every)
+        else:
+            root.addHandler(self._output)
+            self.frame_sampler.every = 1
+        root.setLevel(logging.WARNING if mode == 'off' else logging.INFO)
+
+    # Logger amostrado pelo modo atual (a amostragem é lida a cada chamada, então vale após configure())
+    def sampled_logger(self, name: str) -> SampledLogger:
+        return SampledLogger(name, self.frame_sampler)
+
+    # Esvazia a fila e para a thread escritora. Depois de um fork a thread do pai não existe no
+    # filho, então o listener herdado é só descartado (configure() cria outro)
+    def _stop_listener(self):
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self._listener.stop()
+        self._listener = None
+
+    def shutdown(self):
+        self._stop_listener()
+
+
+# Instância global; a thread escritora é esvaziada na saída do processo
+log_setup = _LogSetup()
+atexit.register(log_setup.shutdown)
@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import logging
+import socket
+import time
+import config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(message)s')
+
+# Formato dos pacotes, igual ao relay em C++ (media_relay/): id da sessão (16 bytes, os primeiros 16
+# caracteres do token da chamada), token mágico fixo (8 bytes) e o áudio
+SESSION_ID_LEN = 16
+TOKEN_LEN = 8
+HEADER_LEN = SESSION_ID_LEN + TOKEN_LEN
+MAGIC_TOKEN = bytes.fromhex('DEADBEEFCAFEBABE')
+MAX_PACKET_SIZE = 1500
+
+# Uma sessão: endereços dos participantes (na ordem em que apareceram) e a última atividade
+class _Session:
+    __slots__ = ('peers', 'last_seen')
+
+    def __init__(self, now: float):
+        self.peers: list = []
+        self.last_seen = now
+
+# Tabela de sessões do relay: registra o remetente na sessão do pacote e devolve para quem encaminhar.
+# Sessões sem pacotes há mais de RELAY_SESSION_TIMEOUT_SECONDS são removidas pela limpeza periódica.
+class RelaySessions:
+    def __init__(self, timeout_seconds: float):
+        self._timeout = timeout_seconds
+        self._sessions: dict[bytes, _Session] = {}
+        self.forwarded = 0
+        self.dropped = 0
+
+    # Valida o cabeçalho e devolve os outros participantes da sessão (None se o pacote deve ser descartado)
+    def route(self, packet, addr, now: float):
+        if len(packet) <= HEADER_LEN or packet[SESSION_ID_LEN:HEADER_LEN] != MAGIC_TOKEN:
+            self.dropped += 1
+            return None
+        session_id = bytes(packet[:SESSION_ID_LEN])
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session(now)
+        session.last_seen = now
+        peers = session.peers
+        if addr not in peers:
+            peers.append(addr)
+        self.forwarded += len(peers) - 1
+        return peers
+
+    def cleanup(self, now: float) -> int:
+        expired = [sid for sid, session in self._sessions.items() if now - session.last_seen > self._timeout]
+        for sid in expired:
+            del self._sessions[sid]
+        if expired:
+            logging.info(f"[Limpeza]: Removidas {len(expired)} sessões inativas. Sessões ativas: {len(self._sessions)}")
+        return len(expired)
+
+    def __len__(self):
+        return len(self._sessions)
+
+# Caminho portátil: um datagram_received por pacote (funciona em qualquer event loop, inclusive no Windows)
+class RelayProtocol(asyncio.DatagramProtocol):
+    def __init__(self, sessions: RelaySessions):
+        self._sessions = sessions
+        self._transport = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        peers = self._sessions.route(data, addr, time.monotonic())
+        if peers is None:
+            return
+        sendto = self._transport.sendto
+        for peer in peers:
+            if peer != addr:
+                sendto(data, peer)
+
+    def error_received(self, exc):
+        # ICMP "port unreachable" de um participante que saiu não deve derrubar o relay
+        logging.debug(f"Relay: erro de socket ignorado: {exc}")
+
+# Caminho em lote: o Python não expõe recvmmsg, então a cada evento de leitura o socket é esvaziado
+# com até RELAY_RECV_BATCH chamadas a recvfrom_into em buffers pré-alocados. O relógio é lido uma vez
+# por lote e o despacho do event loop é pago uma vez por lote, e não por pacote.
+class BatchedRelay:
+    def __init__(self, sock: socket.socket, sessions: RelaySessions, batch_size: int):
+        self._sock = sock
+        self._sessions = sessions
+        self._buffers = [bytearray(MAX_PACKET_SIZE) for _ in range(max(1, batch_size))]
+        self._views = [memoryview(buffer) for buffer in self._buffers]
+
+    def on_readable(self):
+        recvfrom_into = self._sock.recvfrom_into
+        sendto = self._sock.sendto
+        route = self._sessions.route
+        now = time.monotonic()
+        for view in self._views:
+            try:
+                nbytes, addr = recvfrom_into(view)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logging.debug(f"Relay: recvfrom falhou ({e}), continuando...")
+                continue
+            packet = view[:nbytes]
+            peers = route(packet, addr, now)
+            if peers is None:
+                continue
+            for peer in peers:
+                if peer != addr:
+                    try:
+                        sendto(packet, peer)
+                    except (BlockingIOError, InterruptedError):
+                        # Buffer de envio cheio: o pacote de áudio é descartado, como faria a rede
+                        self._sessions.dropped += 1
+                    except OSError as e:
+                        logging.debug(f"Relay: sendto para {peer} falhou: {e}")
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, config.RELAY_SOCKET_BUFFER_BYTES)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, config.RELAY_SOCKET_BUFFER_BYTES)
+    sock.bind((host, port))
+    sock.setblocking(False)
+    return sock
+
+# Sobe o relay e roda até ser cancelado; limpeza de sessões inativas a cada RELAY_CLEANUP_INTERVAL_SECONDS
+async def serve(host: str, port: int, batched: bool):
+    loop = asyncio.get_running_loop()
+    sessions = RelaySessions(config.RELAY_SESSION_TIMEOUT_SECONDS)
+    sock = _bind_socket(host, port)
+
+    # add_reader só existe nos loops baseados em selectors (não no Proactor do Windows)
+    if batched and hasattr(socket.socket, 'recvfrom_into') and isinstance(loop, asyncio.SelectorEventLoop):
+        relay = BatchedRelay(sock, sessions, config.RELAY_RECV_BATCH)
+        loop.add_reader(sock.fileno(), relay.on_readable)
+        close = lambda: (loop.remove_reader(sock.fileno()), sock.close())
+        mode = f"lote de até {config.RELAY_RECV_BATCH} pacotes"
+    else:
+        transport, _ = await loop.create_datagram_endpoint(lambda: RelayProtocol(sessions), sock=sock)
+        close = transport.close
+        mode = "um pacote por evento"
+    logging.info(f"Servidor de Relay escutando em {host}:{port} ({mode})...")
+
+    try:
+        while True:
+            await asyncio.sleep(config.RELAY_CLEANUP_INTERVAL_SECONDS)
+            sessions.cleanup(time.monotonic())
+            logging.debug(f"Relay: {len(sessions)} sessões, {sessions.forwarded} encaminhados, "
+                          f"{sessions.dropped} descartados")
+    finally:
+        close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de Relay UDP (substituto em Python do relay em C++)")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=config.RELAY_SERVER_PORT)
+    parser.add_argument('--no-batch', dest='batched', action='store_false',
+                        help="Usa um datagram_received por pacote em vez de esvaziar o socket em lote")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.batched))
+    except KeyboardInterrupt:
+        logging.info("Servidor de Relay desligado manualmente.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+import config
+from protocol import CommandCode
+
+# Limites (s) dos buckets de latência: de 50 µs (comando em memória) a 1 s (banco sob carga)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# Histograma de buckets fixos: observar é uma busca binária e dois incrementos, sem lock.
+# No modo thread dois incrementos simultâneos podem raramente perder um (load/store não atômicos);
+# para métricas isso é aceitável e evita um lock no caminho quente.
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+# Lock que mede a espera só quando há disputa: a tentativa sem bloquear resolve o caso comum
+# e o relógio só é lido quando o lock está ocupado
+class TimedLock:
+    __slots__ = ('_lock', '_metrics')
+
+    def __init__(self, metrics: '_Metrics'):
+        self._lock = threading.Lock()
+        self._metrics = metrics
+
+    def __enter__(self):
+        metrics = self._metrics
+        metrics.lock_acquisitions += 1
+        if not self._lock.acquire(False):
+            started = time.perf_counter()
+            self._lock.acquire()
+            metrics.lock_contended += 1
+            metrics.lock_wait.observe(time.perf_counter() - started)
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+# Métricas do processo: contadores e histogramas por CommandCode, bytes trafegados, chamadas ao banco,
+# espera nos locks do estado e valores lidos na hora da coleta (gauges registrados pelos módulos)
+class _Metrics:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        # Tudo pré-criado: o caminho quente só incrementa, nunca insere em dicionário
+        self.command_latency: Dict[CommandCode, Histogram] = {code: Histogram() for code in CommandCode}
+        self.frames_out: Dict[CommandCode, int] = {code: 0 for code in CommandCode}
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.db_latency: Dict[str, Histogram] = {}
+        self.lock_acquisitions = 0
+        self.lock_contended = 0
+        self.lock_wait = Histogram()
+        self._gauges = []
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def observe_command(self, command_code: CommandCode, seconds: float):
+        self.command_latency[command_code].observe(seconds)
+
+    def count_in(self, num_bytes: int):
+        self.frames_in += 1
+        self.bytes_in += num_bytes
+
+    def count_out(self, command_code: CommandCode, num_bytes: int):
+        self.frames_out[command_code] += 1
+        self.bytes_out += num_bytes
+
+    # Decorador para as funções do db_manager; com as métricas desligadas devolve a própria função
+    def timed_db(self, func: Callable) -> Callable:
+        if not self.enabled:
+            return func
+        histogram = self.db_latency.setdefault(func.__name__, Histogram())
+
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+
+    # Lock dos shards do estado: cronometrado se as métricas estiverem ligadas
+    def new_lock(self):
+        return TimedLock(self) if self.enabled else threading.Lock()
+
+    # Valor lido na coleta. `collect()` devolve um número ou, com `label`, um dicionário rótulo -> número
+    def register_gauge(self, name: str, help_text: str, collect: Callable, kind: str = 'gauge', label: str = None):
+        self._gauges.append((name, help_text, collect, kind, label))
+
+    # Texto no formato de exposição do Prometheus (version 0.0.4)
+    def render(self) -> str:
+        lines = []
+
+        def header(name, help_text, kind):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, labels, hist):
+            bucket_prefix = f"{labels}," if labels else ''
+            suffix = f"{{{labels}}}" if labels else ''
+            counts = list(hist.counts)
+            cumulative = 0
+            for bound, count in zip(hist.bounds, counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{bucket_prefix}le="{bound:g}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{name}_bucket{{{bucket_prefix}le="+Inf"}} {cumulative}')
+            lines.append(f"{name}_sum{suffix} {hist.sum:.6f}")
+            lines.append(f"{name}_count{suffix} {cumulative}")
+
+        header('voip_command_duration_seconds', 'Tempo de execução dos comandos recebidos', 'histogram')
+        for code, hist in self.command_latency.items():
+            if any(hist.counts):
+                histogram('voip_command_duration_seconds', f'command="{code.name}"', hist)
+
+        header('voip_frames_sent_total', 'Frames enviados aos clientes por comando', 'counter')
+        for code, count in self.frames_out.items():
+            if count:
+                lines.append(f'voip_frames_sent_total{{command="{code.name}"}} {count}')
+
+        header('voip_frames_received_total', 'Frames recebidos dos clientes', 'counter')
+        lines.append(f"voip_frames_received_total {self.frames_in}")
+        header('voip_received_bytes_total', 'Bytes recebidos dos clientes (com cabeçalho)', 'counter')
+        lines.append(f"voip_received_bytes_total {self.bytes_in}")
+        header('voip_sent_bytes_total', 'Bytes enviados aos clientes (com cabeçalho)', 'counter')
+        lines.append(f"voip_sent_bytes_total {self.bytes_out}")
+
+        header('voip_db_call_duration_seconds', 'Tempo das chamadas ao db_manager', 'histogram')
+        for name, hist in self.db_latency.items():
+            if any(hist.counts):
+                histogram('voip_db_call_duration_seconds', f'call="{name}"', hist)
+
+        header('voip_state_lock_acquisitions_total', 'Aquisições dos locks dos shards do estado', 'counter')
+        lines.append(f"voip_state_lock_acquisitions_total {self.lock_acquisitions}")
+        header('voip_state_lock_contended_total', 'Aquisições que encontraram o lock ocupado', 'counter')
+        lines.append(f"voip_state_lock_contended_total {self.lock_contended}")
+        header('voip_state_lock_wait_seconds', 'Espera pelos locks dos shards quando ocupados', 'histogram')
+        histogram('voip_state_lock_wait_seconds', '', self.lock_wait)
+
+        for name, help_text, collect, kind, label in self._gauges:
+            try:
+                value = collect()
+            except Exception as e:
+                logging.warning(f"Métricas: falha ao coletar {name}: {e}")
+                continue
+            header(name, help_text, kind)
+            if label is None:
+                lines.append(f"{name} {value}")
+            else:
+                for label_value, item in value.items():
+                    lines.append(f'{name}{{{label}="{label_value}"}} {item}')
+        lines.append('')
+        return '\n'.join(lines)
+
+    # Sobe o endpoint HTTP (GET /metrics) numa thread de fundo
+    def start_http_server(self, host: str, port: int):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="Metrics").start()
+        logging.info(f"Métricas disponíveis em http://{host}:{port}/metrics")
+
+
+# Instância global (METRICS_ENABLED=0 desliga a instrumentação)
+metrics = _Metrics(config.METRICS_ENABLED)
@@ -8,14 +8,22 @@ class ConnectedUser:
         self.conn: socket.socket = conn 
         self.status: UserStatus = UserStatus.ONLINE
         self.in_call_with: str | None = None 
+        # Cliente anunciou FEATURE_STATUS_BATCH no login (espelhos de outros processos ficam com False)
+        self.status_batch: bool = False
+        # Chamado após cada mudança de estado da chamada (usado para propagá-la entre processos)
+        self.on_change = None
 
     def start_call(self, partner_nickname: str):
         self.status = UserStatus.IN_CALL
         self.in_call_with = partner_nickname
+        if self.on_change:
+            self.on_change(self)
 
     def end_call(self):
         self.status = UserStatus.ONLINE
         self.in_call_with = None
+        if self.on_change:
+            self.on_change(self)
 
     def get_status_str(self) -> str:
         return self.status.value
\ No newline at end of file
@@ -1,48 +1,157 @@
-import socket 
-import threading 
+import socket
+from typing import Iterable
 
 from .ConnectedUser import ConnectedUser
+from metrics import metrics
 
+# Número padrão de partições (shards) do estado de usuários conectados
+DEFAULT_NUM_SHARDS = 64
+
+
+# Uma partição do estado: os usuários cujo nickname cai neste shard e seu próprio lock.
+# O dicionário de usuários é copy-on-write: escritores trocam a referência sob o lock,
+# leitores usam a referência atual sem lock e nunca bloqueiam (nem são bloqueados por) escritores.
+# Com as métricas ligadas o lock mede o tempo de espera quando está ocupado.
+class _Shard:
+    __slots__ = ('lock', 'users', 'online_friends')
 
-# Gerencia o estado dos usuários conectados ao servidor.
-class _StateManager:
     def __init__(self):
-        self._connected_users: dict[str, ConnectedUser] = {}
-        self._lock = threading.Lock()
+        self.lock = metrics.new_lock()
+        self.users: dict[str, ConnectedUser] = {}
+        # Índice reverso de presença: usuário deste shard -> amigos dele que estão online
+        self.online_friends: dict[str, set[str]] = {}
+
+
+# Gerencia o estado dos usuários conectados ao servidor, particionado por hash do nickname.
+class _StateManager:
+    def __init__(self, num_shards: int = DEFAULT_NUM_SHARDS):
+        self._shards = [_Shard() for _ in range(max(1, num_shards))]
+        # Observador opcional de entradas e saídas (ver cluster.py): user_added(user, friends) / user_removed(user)
+        self._listener = None
+
+    def set_listener(self, listener):
+        self._listener = listener
+
+    def _shard(self, nickname: str) -> _Shard:
+        return self._shards[hash(nickname) % len(self._shards)]
 
     def _get_user_unlocked(self, nickname: str) -> ConnectedUser | None:
-        return self._connected_users.get(nickname)
+        return self._shard(nickname).users.get(nickname)
 
-    def add_user(self, nickname: str, conn: socket.socket) -> bool:
-        with self._lock:
-            if nickname in self._connected_users:
+    def add_user(self, nickname: str, conn: socket.socket, friends: Iterable[str] = ()) -> bool:
+        friends = tuple(friends)
+        shard = self._shard(nickname)
+        with shard.lock:
+            if nickname in shard.users:
                 return False
-            
+
             user = ConnectedUser(nickname, conn)
-            self._connected_users[nickname] = user
-            return True
+            users = dict(shard.users)
+            users[nickname] = user
+            shard.users = users
+            shard.online_friends[nickname] = set()
+
+        # Cada conjunto do índice só é alterado sob o lock do shard do seu dono;
+        # os locks nunca são aninhados, então não há ordem de aquisição a respeitar.
+        # Um amigo que entre ao mesmo tempo já encontra este usuário em `users` e faz o vínculo por conta própria.
+        online = []
+        for friend in friends:
+            friend_shard = self._shard(friend)
+            if friend not in friend_shard.users:
+                continue
+            with friend_shard.lock:
+                friend_set = friend_shard.online_friends.get(friend)
+                if friend_set is not None:
+                    friend_set.add(nickname)
+                    online.append(friend)
+        if online:
+            with shard.lock:
+                own_set = shard.online_friends.get(nickname)
+                if own_set is not None:
+                    own_set.update(online)
+        if self._listener:
+            self._listener.user_added(user, friends)
+        return True
 
     def remove_user(self, nickname: str) -> ConnectedUser | None:
-        with self._lock:
-            if nickname in self._connected_users:
-                return self._connected_users.pop(nickname)
-            return None
+        return self.remove_user_with_watchers(nickname)[0]
+
+    # Remove o usuário e devolve os amigos online que devem ser avisados da saída
+    def remove_user_with_watchers(self, nickname: str) -> tuple[ConnectedUser | None, list[ConnectedUser]]:
+        shard = self._shard(nickname)
+        with shard.lock:
+            if nickname not in shard.users:
+                return None, []
+            users = dict(shard.users)
+            user = users.pop(nickname)
+            shard.users = users
+            friends = shard.online_friends.pop(nickname, ())
+
+        watchers = []
+        for friend in friends:
+            friend_shard = self._shard(friend)
+            with friend_shard.lock:
+                friend_set = friend_shard.online_friends.get(friend)
+                if friend_set is not None:
+                    friend_set.discard(nickname)
+            friend_obj = friend_shard.users.get(friend)
+            if friend_obj:
+                watchers.append(friend_obj)
+        if self._listener:
+            self._listener.user_removed(user)
+        return user, watchers
+
+    # Registra no índice uma amizade recém-aceita entre dois usuários (se ambos estiverem online)
+    def link_friends(self, nickname_a: str, nickname_b: str):
+        for owner, friend in ((nickname_a, nickname_b), (nickname_b, nickname_a)):
+            shard = self._shard(owner)
+            with shard.lock:
+                if owner in shard.users and self._get_user_unlocked(friend):
+                    shard.online_friends[owner].add(friend)
+
+    # Retorna os amigos online de um usuário sem percorrer todos os conectados
+    def get_online_friends(self, nickname: str) -> list[ConnectedUser]:
+        shard = self._shard(nickname)
+        with shard.lock:
+            friends = tuple(shard.online_friends.get(nickname, ()))
+        # Entradas de quem acabou de sair podem sobrar por um instante no índice; são filtradas aqui
+        result = []
+        for friend in friends:
+            friend_obj = self._get_user_unlocked(friend)
+            if friend_obj:
+                result.append(friend_obj)
+        return result
 
     def get_user(self, nickname: str) -> ConnectedUser | None:
-        with self._lock:
-            return self._get_user_unlocked(nickname) 
+        return self._get_user_unlocked(nickname)
 
+    # Snapshot de todos os conectados, montado shard a shard sem tomar nenhum lock
     def get_all_users_items(self):
-        with self._lock: 
-            return list(self._connected_users.items())
+        items = []
+        for shard in self._shards:
+            items.extend(shard.users.items())
+        return items
 
     def get_user_status_str(self, nickname: str) -> str:
-        with self._lock: 
-            user = self._get_user_unlocked(nickname) 
-            if user:
-                return user.get_status_str()
-            return 'Offline'
+        user = self._get_user_unlocked(nickname)
+        if user:
+            return user.get_status_str()
+        return 'Offline'
+
+    # Status de vários usuários numa única passada (ex.: a lista de amigos enviada após o login)
+    def get_users_status_str(self, nicknames: Iterable[str]) -> list[str]:
+        shards = self._shards
+        num_shards = len(shards)
+        result = []
+        for nickname in nicknames:
+            user = shards[hash(nickname) % num_shards].users.get(nickname)
+            result.append(user.get_status_str() if user else 'Offline')
+        return result
+
+    def __len__(self):
+        return sum(len(shard.users) for shard in self._shards)
 
 
 # Instância global do gerenciador de estado
-state_manager = _StateManager()
\ No newline at end of file
+state_manager = _StateManager()
+metrics.register_gauge('voip_connected_users', 'Usuários conectados a este processo', lambda: len(state_manager))
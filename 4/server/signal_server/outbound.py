@@ -0,0 +1,170 @@
+import logging
+import socket
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Hashable, Optional
+import config
+
+# Limite de buffers por chamada a sendmsg (IOV_MAX é 1024 no Linux)
+_MAX_IOVECS = 512
+
+# Envia uma lista de frames com o menor número de syscalls possível (writev via sendmsg quando disponível)
+def send_frames(sock: socket.socket, frames: list):
+    if not hasattr(sock, 'sendmsg'):
+        sock.sendall(b''.join(frames))
+        return
+
+    views = [memoryview(f) for f in frames]
+    index = 0
+    while index < len(views):
+        sent = sock.sendmsg(views[index:index + _MAX_IOVECS])
+        # Avança pelos buffers já enviados; o último pode ter sido enviado só em parte
+        while sent:
+            remaining = len(views[index])
+            if sent >= remaining:
+                sent -= remaining
+                index += 1
+            else:
+                views[index] = views[index][sent:]
+                sent = 0
+
+# Fila limitada de frames pendentes de uma conexão.
+# Frames com a mesma chave de coalescência (ex.: STATUS_UPDATE do mesmo amigo) são substituídos pelo mais recente.
+# Com a fila cheia, os frames coalescíveis (status defasados) são descartados; se ainda assim não couber, a conexão deve cair.
+class OutboundQueue:
+    def __init__(self, max_frames: int):
+        self._max_frames = max_frames
+        self._entries: deque[list] = deque()
+        self._keyed: dict[Hashable, list] = {}
+
+    # Retorna False quando a fila estourou mesmo após descartar os frames coalescíveis
+    def push(self, frame: bytes, coalesce_key: Optional[Hashable] = None) -> bool:
+        if coalesce_key is not None:
+            entry = self._keyed.get(coalesce_key)
+            if entry is not None:
+                entry[1] = frame
+                return True
+
+        if len(self._entries) >= self._max_frames:
+            self._drop_coalescible()
+            if len(self._entries) >= self._max_frames:
+                return False
+
+        entry = [coalesce_key, frame]
+        self._entries.append(entry)
+        if coalesce_key is not None:
+            self._keyed[coalesce_key] = entry
+        return True
+
+    def _drop_coalescible(self):
+        if not self._keyed:
+            return
+        logging.warning(f"Fila de saída cheia: descartando {len(self._keyed)} atualizações de status pendentes.")
+        self._entries = deque(entry for entry in self._entries if entry[0] is None)
+        self._keyed.clear()
+
+    def take_all(self) -> list:
+        frames = [entry[1] for entry in self._entries]
+        self._entries.clear()
+        self._keyed.clear()
+        return frames
+
+    def __len__(self):
+        return len(self._entries)
+
+# Conexão do modo thread: os handlers só enfileiram frames e uma thread escritora dedicada
+# envia tudo o que estiver pendente de uma vez. Um par lento bloqueia apenas o próprio escritor.
+class BufferedConnection:
+    def __init__(self, sock: socket.socket, addr=None):
+        self._sock = sock
+        self._peername = addr if addr is not None else sock.getpeername()
+        self._queue = OutboundQueue(config.OUTBOX_MAX_FRAMES)
+        self._cond = threading.Condition()
+        self._writer: threading.Thread | None = None
+        self._closed = False
+        self._corked = 0
+
+    @property
+    def socket(self) -> socket.socket:
+        return self._sock
+
+    def send_frame(self, frame: bytes, coalesce_key: Optional[Hashable] = None):
+        with self._cond:
+            if self._closed:
+                raise BrokenPipeError("Conexão encerrada")
+            if not self._queue.push(frame, coalesce_key):
+                self._abort_unlocked(f"fila de saída excedeu {config.OUTBOX_MAX_FRAMES} frames")
+                raise BrokenPipeError("Fila de saída cheia")
+            if not self._corked:
+                self._wake_writer_unlocked()
+
+    def _wake_writer_unlocked(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._writer_loop, daemon=True,
+                                            name=f"Writer-{self._peername}")
+            self._writer.start()
+        else:
+            self._cond.notify()
+
+    # Segura os envios enquanto o bloco executa e entrega tudo o que foi enfileirado numa única escrita ao final.
+    # Usado ao processar um lote de comandos recebidos de uma vez (pipelining).
+    @contextmanager
+    def batch(self):
+        with self._cond:
+            self._corked += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._corked -= 1
+                if not self._corked and self._queue and not self._closed:
+                    self._wake_writer_unlocked()
+
+    def sendall(self, data: bytes):
+        self.send_frame(data)
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                if (not self._queue or self._corked) and not self._closed:
+                    self._cond.wait(config.OUTBOX_WRITER_IDLE_SECONDS)
+                if not self._queue or (self._corked and not self._closed):
+                    # Conexão ociosa: a thread escritora termina e é recriada no próximo envio
+                    self._writer = None
+                    return
+                frames = self._queue.take_all()
+            try:
+                send_frames(self._sock, frames)
+            except OSError as e:
+                logging.warning(f"Falha ao enviar {len(frames)} frame(s) para {self._peername}: {e}")
+                with self._cond:
+                    self._abort_unlocked("erro de escrita")
+                    self._writer = None
+                return
+
+    # Derruba a conexão; a thread leitora acorda do recv e executa a limpeza normal
+    def _abort_unlocked(self, reason: str):
+        if self._closed:
+            return
+        logging.warning(f"Encerrando conexão com {self._peername}: {reason}.")
+        self._closed = True
+        self._queue.take_all()
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._cond.notify_all()
+
+    def getpeername(self):
+        return self._peername
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
@@ -0,0 +1,40 @@
+import hashlib
+import hmac
+import secrets
+import config
+
+# Formato armazenado: pbkdf2_sha256$<iterações>$<sal em hex>$<hash em hex>
+_SCHEME = 'pbkdf2_sha256'
+_SALT_BYTES = 16
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+
+# Gera o hash de uma senha com PBKDF2-HMAC-SHA256 e sal aleatório.
+# O custo é proporcional a PASSWORD_HASH_ITERATIONS; deve rodar fora das threads de I/O (ver workers.py).
+def hash_password(password: str) -> str:
+    iterations = config.PASSWORD_HASH_ITERATIONS
+    salt = secrets.token_bytes(_SALT_BYTES)
+    return f"{_SCHEME}${iterations}${salt.hex()}${_pbkdf2(password, salt, iterations).hex()}"
+
+# Confere a senha contra o hash armazenado; aceita também o formato antigo (sha256 sem sal)
+def verify_password(password: str, stored_hash: str) -> bool:
+    if stored_hash.startswith(_SCHEME + '$'):
+        try:
+            _, iterations, salt_hex, hash_hex = stored_hash.split('$')
+            expected = bytes.fromhex(hash_hex)
+            computed = _pbkdf2(password, bytes.fromhex(salt_hex), int(iterations))
+        except ValueError:
+            return False
+        return hmac.compare_digest(computed, expected)
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(legacy, stored_hash)
+
+# Indica se o hash deve ser refeito (formato antigo ou menos iterações que o configurado)
+def needs_rehash(stored_hash: str) -> bool:
+    if not stored_hash.startswith(_SCHEME + '$'):
+        return True
+    try:
+        return int(stored_hash.split('$')[1]) < config.PASSWORD_HASH_ITERATIONS
+    except (IndexError, ValueError):
+        return True
@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+import config
+from metrics import metrics
+
+# Junta as mudanças de status por (amigo que observa, usuário que mudou) numa janela curta e entrega só o
+# último status de cada par: quem cai e volta várias vezes dentro da janela gera uma atualização por amigo,
+# e cada amigo recebe as da janela de uma vez (ver client_handler.send_status_updates).
+# A janela começa na primeira mudança pendente; sem mudanças a thread fica parada.
+class _PresenceDispatcher:
+    def __init__(self, window_seconds: float, start_thread: bool = True):
+        self._window = window_seconds
+        # Amigo que observa (ConnectedUser) -> {nickname que mudou: último status}
+        self._pending: Dict[object, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # Sem thread própria (start_thread=False) quem usa chama flush()
+        self._start_thread = start_thread
+        self._thread: Optional[threading.Thread] = None
+        self._sender: Optional[Callable] = None
+        self.published = 0
+        self.delivered = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._window > 0
+
+    # `sender(watcher, {nickname: status})` entrega as atualizações juntadas para um amigo
+    def set_sender(self, sender: Callable):
+        self._sender = sender
+
+    def publish(self, nickname: str, status: str, watchers: Iterable):
+        with self._lock:
+            if self._thread is None and self._start_thread:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="Presence")
+                self._thread.start()
+            was_empty = not self._pending
+            count = 0
+            for watcher in watchers:
+                updates = self._pending.get(watcher)
+                if updates is None:
+                    self._pending[watcher] = updates = {}
+                updates[nickname] = status
+                count += 1
+            self.published += count
+            wake = was_empty and count
+        if wake:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self._window)
+            # Limpo antes da troca: o que for publicado depois dela acorda a thread de novo
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Presença: erro ao entregar atualizações de status: {e}", exc_info=True)
+
+    # Entrega tudo o que estiver pendente; retorna o número de atualizações (pares) entregues
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        delivered = 0
+        for watcher, updates in pending.items():
+            try:
+                self._sender(watcher, updates)
+            except Exception as e:
+                logging.warning(f"Presença: falha ao entregar status para {watcher.nickname}: {e}")
+                continue
+            delivered += len(updates)
+        self.delivered += delivered
+        return delivered
+
+    def __len__(self):
+        return sum(len(updates) for updates in self._pending.values())
+
+
+# Instância global (PRESENCE_COALESCE_MS=0 envia cada mudança na hora, sem a janela)
+presence_dispatcher = _PresenceDispatcher(config.PRESENCE_COALESCE_MS / 1000)
+metrics.register_gauge('voip_presence_updates_published_total', 'Atualizações de status (amigo, usuário) publicadas',
+                       lambda: presence_dispatcher.published, kind='counter')
+metrics.register_gauge('voip_presence_updates_delivered_total', 'Atualizações entregues após juntar as repetidas',
+                       lambda: presence_dispatcher.delivered, kind='counter')
@@ -2,19 +2,22 @@ import logging
 import struct
 from enum import IntEnum
 from abc import ABC, abstractmethod
-from typing import List, Dict, Tuple
+from typing import Any, List, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
 
 # Enum para códigos de comando
 class CommandCode(IntEnum):
     REGISTER = 0x01; LOGIN = 0x02; GET_INITIAL_DATA = 0x03; SEARCH_USER = 0x04
-    ADD_FRIEND = 0x05; ACCEPT_FRIEND = 0x06; REJECT_FRIEND = 0x07; INVITE = 0x10
-    ACCEPT = 0x11; REJECT = 0x12; BYE = 0x13
+    ADD_FRIEND = 0x05; ACCEPT_FRIEND = 0x06; REJECT_FRIEND = 0x07; PING = 0x08
+    INVITE = 0x10; ACCEPT = 0x11; REJECT = 0x12; BYE = 0x13
 
     REGISTER_RESPONSE = 0x81; LOGIN_RESPONSE = 0x82; FRIEND_LIST = 0x83
     PENDING_FRIEND_REQUESTS = 0x84; SEARCH_RESPONSE = 0x85; ADD_FRIEND_RESPONSE = 0x86
-    INCOMING_FRIEND_REQUEST = 0x87; FRIEND_REQUEST_ACCEPTED = 0x88; INVITE_RESPONSE = 0x90
-    INCOMING_CALL = 0x91; CALL_ACCEPTED = 0x92; CALL_REJECTED = 0x93
-    CALL_ENDED = 0x94; STATUS_UPDATE = 0xA0; ERROR = 0xFF
+    INCOMING_FRIEND_REQUEST = 0x87; FRIEND_REQUEST_ACCEPTED = 0x88; PONG = 0x89; FRIEND_LIST_DELTA = 0x8A
+    INVITE_RESPONSE = 0x90; INCOMING_CALL = 0x91; CALL_ACCEPTED = 0x92; CALL_REJECTED = 0x93
+    CALL_ENDED = 0x94; STATUS_UPDATE = 0xA0; STATUS_UPDATE_BATCH = 0xA1; ERROR = 0xFF
+
+# Recursos anunciados pelo cliente no LOGIN (campo opcional `features`, máscara de bits)
+FEATURE_STATUS_BATCH = 0x1  # aceita STATUS_UPDATE_BATCH no lugar de vários STATUS_UPDATE
 
 # Mapeamento reverso
 CODE_TO_COMMAND_NAME = {v.value: k for k, v in CommandCode.__members__.items()}
@@ -81,175 +84,296 @@ class BaseProtocol(ABC):
     def deserialize_payload(self, command_code: CommandCode, payload_bytes: bytes) -> dict:
         pass
 
-# SUBCLASSE que implementa a serialização/desserialização específica do VoIP
+# Tipos de campo usados nos esquemas de payload
+FIELD_STR = 'str'               # [Tam (H)][UTF-8]
+FIELD_BOOL = 'bool'             # [?]
+FIELD_PORT = 'port'             # [H]
+FIELD_U32 = 'u32'               # [I]
+FIELD_STR_LIST = 'str_list'     # [Qtd (H)] + N strings
+FIELD_PAIR_LIST = 'pair_list'   # [Qtd (H)] + N pares de strings (ex.: nickname/status)
+
+# Descreve um campo do payload; `only_if` indica um campo booleano anterior que precisa ser verdadeiro.
+# Campos `optional` ficam no fim do payload: só vão para o fio se presentes no dict e, na leitura,
+# podem faltar (clientes antigos não os enviam nem os esperam).
+class Field(NamedTuple):
+    key: str
+    kind: str = FIELD_STR
+    default: Any = None
+    subkeys: Tuple[str, ...] = ()
+    only_if: Optional[str] = None
+    optional: bool = False
+
+_RESPONSE_FIELDS = (Field('success', FIELD_BOOL, False), Field('message', default=''))
+
+# Esquema binário de cada comando (a ordem dos campos é a ordem no fio)
+PAYLOAD_SCHEMAS: Dict[CommandCode, Tuple[Field, ...]] = {
+    # Payloads Cliente -> Servidor
+    CommandCode.REGISTER: (Field('nickname'), Field('password'), Field('name')),
+    CommandCode.LOGIN: (Field('nickname'), Field('password'), Field('features', FIELD_U32, 0, optional=True)),
+    # Versão da lista de amigos que o cliente já tem em cache (clientes antigos não enviam: lista completa)
+    CommandCode.GET_INITIAL_DATA: (Field('since_version', FIELD_U32, 0, optional=True),),
+    CommandCode.SEARCH_USER: (Field('nickname_query'), Field('cursor', optional=True)),
+    CommandCode.ADD_FRIEND: (Field('target_nickname'),),
+    CommandCode.ACCEPT_FRIEND: (Field('requester_nickname'),),
+    CommandCode.REJECT_FRIEND: (Field('requester_nickname'),),
+    CommandCode.INVITE: (Field('target_nickname'),),
+    CommandCode.ACCEPT: (Field('caller_nickname'),),
+    CommandCode.REJECT: (Field('caller_nickname'),),
+    CommandCode.BYE: (),
+    CommandCode.PING: (),
+
+    # Payloads Servidor -> Cliente
+    CommandCode.REGISTER_RESPONSE: _RESPONSE_FIELDS,
+    CommandCode.LOGIN_RESPONSE: _RESPONSE_FIELDS + (Field('nickname', only_if='success'),),
+    CommandCode.ADD_FRIEND_RESPONSE: _RESPONSE_FIELDS,
+    CommandCode.INVITE_RESPONSE: _RESPONSE_FIELDS,
+    CommandCode.ERROR: _RESPONSE_FIELDS + (Field('retry_after_ms', FIELD_U32, 0, optional=True),),
+    CommandCode.FRIEND_LIST: (Field('friends', FIELD_PAIR_LIST, subkeys=('nickname', 'status')),
+                              Field('more', FIELD_BOOL, False, optional=True)),
+    CommandCode.PENDING_FRIEND_REQUESTS: (Field('requests_from', FIELD_STR_LIST),
+                                          Field('more', FIELD_BOOL, False, optional=True)),
+    # Mudanças na lista de amigos desde `since_version`; `statuses` traz só os amigos que não estão Offline
+    CommandCode.FRIEND_LIST_DELTA: (Field('version', FIELD_U32, 0),
+                                    Field('added', FIELD_PAIR_LIST, subkeys=('nickname', 'status')),
+                                    Field('removed', FIELD_STR_LIST),
+                                    Field('statuses', FIELD_PAIR_LIST, subkeys=('nickname', 'status'))),
+    CommandCode.SEARCH_RESPONSE: (Field('success', FIELD_BOOL, True),
+                                  Field('results', FIELD_PAIR_LIST, subkeys=('nickname', 'name')),
+                                  Field('next_cursor', optional=True)),
+    CommandCode.INCOMING_FRIEND_REQUEST: (Field('from_nickname'),),
+    CommandCode.FRIEND_REQUEST_ACCEPTED: (Field('by_nickname'), Field('status')),
+    CommandCode.INCOMING_CALL: (Field('from_nickname'),),
+    CommandCode.CALL_ACCEPTED: (Field('callee_nickname'), Field('relay_ip'),
+                                Field('relay_port', FIELD_PORT, 0), Field('token')),
+    CommandCode.CALL_REJECTED: (Field('callee_nickname'),),
+    CommandCode.CALL_ENDED: (Field('from_nickname'),),
+    CommandCode.STATUS_UPDATE: (Field('nickname'), Field('status')),
+    CommandCode.STATUS_UPDATE_BATCH: (Field('updates', FIELD_PAIR_LIST, subkeys=('nickname', 'status')),
+                                      Field('more', FIELD_BOOL, False, optional=True)),
+    CommandCode.PONG: (),
+}
+
+# Maior payload que cabe no campo de tamanho do cabeçalho (H)
+MAX_PAYLOAD_SIZE = 0xFFFF
+
+# Listas que podem passar de um frame: vão em pedaços (iter_chunked_messages), todos menos o último
+# com `more`=True; o cliente acumula os itens até receber um frame sem `more` (os pedaços de um
+# STATUS_UPDATE_BATCH podem ser aplicados um a um).
+# Uma lista que cabe num frame sai exatamente como antes (sem o campo `more`).
+CHUNKED_LIST_FIELDS = {
+    CommandCode.FRIEND_LIST: 'friends',
+    CommandCode.PENDING_FRIEND_REQUESTS: 'requests_from',
+    CommandCode.STATUS_UPDATE_BATCH: 'updates',
+}
+
+_U16 = struct.Struct(BaseProtocol.FMT_COUNT)
+_BOOL = struct.Struct(BaseProtocol.FMT_BOOL)
+_U32 = struct.Struct('!I')
+_HEADER = struct.Struct(BaseProtocol.FMT_HEADER)
+_EMPTY_STR = _U16.pack(0)
+_MORE = _BOOL.pack(True)
+
+def _encode_str(parts: list, value):
+    if not value:
+        parts.append(_EMPTY_STR)
+        return
+    data = value.encode('utf-8')
+    parts.append(_U16.pack(len(data)))
+    parts.append(data)
+
+def _decode_str(view: memoryview, offset: int) -> Tuple[str, int]:
+    if len(view) < offset + 2:
+        raise ValueError("Buffer insuficiente para ler tamanho da string")
+    str_len = _U16.unpack_from(view, offset)[0]
+    data_offset = offset + 2
+    end_offset = data_offset + str_len
+    if len(view) < end_offset:
+        raise ValueError(f"Buffer insuficiente para ler string completa (necessário {str_len}, disponível {len(view) - data_offset} bytes)")
+    return (str(view[data_offset:end_offset], 'utf-8') if str_len else ''), end_offset
+
+# Compila o esquema de um comando em uma sequência de funções de codificação/decodificação
+def _compile_encoder(fields: Tuple[Field, ...]):
+    steps = []
+    for field in fields:
+        key, default, only_if = field.key, field.default, field.only_if
+        if field.kind == FIELD_STR:
+            def step(payload, parts, key=key, default=default):
+                _encode_str(parts, payload.get(key, default))
+        elif field.kind == FIELD_BOOL:
+            def step(payload, parts, key=key, default=default):
+                parts.append(_BOOL.pack(payload.get(key, default)))
+        elif field.kind == FIELD_PORT:
+            def step(payload, parts, key=key, default=default):
+                parts.append(_U16.pack(payload.get(key, default)))
+        elif field.kind == FIELD_U32:
+            def step(payload, parts, key=key, default=default):
+                parts.append(_U32.pack(payload.get(key, default)))
+        elif field.kind == FIELD_STR_LIST:
+            def step(payload, parts, key=key):
+                values = payload.get(key, [])
+                parts.append(_U16.pack(len(values)))
+                for value in values:
+                    _encode_str(parts, value)
+        elif field.kind == FIELD_PAIR_LIST:
+            def step(payload, parts, key=key, first=field.subkeys[0], second=field.subkeys[1]):
+                items = payload.get(key, [])
+                parts.append(_U16.pack(len(items)))
+                for item in items:
+                    _encode_str(parts, item.get(first))
+                    _encode_str(parts, item.get(second))
+        else:
+            raise ValueError(f"Tipo de campo desconhecido: {field.kind}")
+
+        if only_if:
+            def step(payload, parts, inner=step, only_if=only_if):
+                if payload.get(only_if):
+                    inner(payload, parts)
+        if field.optional:
+            def step(payload, parts, inner=step, key=key):
+                if payload.get(key) is not None:
+                    inner(payload, parts)
+        steps.append(step)
+    return tuple(steps)
+
+def _compile_decoder(fields: Tuple[Field, ...]):
+    steps = []
+    for field in fields:
+        key, only_if = field.key, field.only_if
+        if field.kind == FIELD_STR:
+            def step(view, offset, payload, key=key):
+                payload[key], offset = _decode_str(view, offset)
+                return offset
+        elif field.kind == FIELD_BOOL:
+            def step(view, offset, payload, key=key):
+                payload[key] = _BOOL.unpack_from(view, offset)[0]
+                return offset + 1
+        elif field.kind == FIELD_PORT:
+            def step(view, offset, payload, key=key):
+                payload[key] = _U16.unpack_from(view, offset)[0]
+                return offset + 2
+        elif field.kind == FIELD_U32:
+            def step(view, offset, payload, key=key):
+                payload[key] = _U32.unpack_from(view, offset)[0]
+                return offset + 4
+        elif field.kind == FIELD_STR_LIST:
+            def step(view, offset, payload, key=key):
+                if len(view) < offset + 2:
+                    raise ValueError("Buffer insuficiente para ler contagem da lista de strings")
+                count = _U16.unpack_from(view, offset)[0]
+                offset += 2
+                values = []
+                for _ in range(count):
+                    value, offset = _decode_str(view, offset)
+                    values.append(value)
+                payload[key] = values
+                return offset
+        elif field.kind == FIELD_PAIR_LIST:
+            def step(view, offset, payload, key=key, first=field.subkeys[0], second=field.subkeys[1]):
+                count = _U16.unpack_from(view, offset)[0]
+                offset += 2
+                items = []
+                for _ in range(count):
+                    a, offset = _decode_str(view, offset)
+                    b, offset = _decode_str(view, offset)
+                    items.append({first: a, second: b})
+                payload[key] = items
+                return offset
+        else:
+            raise ValueError(f"Tipo de campo desconhecido: {field.kind}")
+
+        if only_if:
+            def step(view, offset, payload, inner=step, only_if=only_if):
+                return inner(view, offset, payload) if payload.get(only_if) else offset
+        if field.optional:
+            def step(view, offset, payload, inner=step):
+                return inner(view, offset, payload) if offset < len(view) else offset
+        steps.append(step)
+    return tuple(steps)
+
+# SUBCLASSE que implementa a serialização/desserialização específica do VoIP,
+# guiada pela tabela PAYLOAD_SCHEMAS (um codec pré-compilado por comando, despachado por dicionário)
 class VoipProtocol(BaseProtocol):
-    
-    # Implementação da serialização de TODOS os payloads do VoIP
-    def serialize_payload(self, command_code: CommandCode, payload: dict) -> bytes:
-        b = bytearray()
+    ENCODERS = {code: _compile_encoder(fields) for code, fields in PAYLOAD_SCHEMAS.items()}
+    DECODERS = {code: _compile_decoder(fields) for code, fields in PAYLOAD_SCHEMAS.items()}
+
+    def _serialize_parts(self, command_code: CommandCode, payload: dict) -> list:
+        encoder = self.ENCODERS.get(command_code)
+        if encoder is None:
+            raise NotImplementedError(f"Serialização não implementada para: {command_code.name}")
+        parts = []
         try:
-            # Payloads Cliente -> Servidor
-            if command_code in (CommandCode.LOGIN, CommandCode.REGISTER):
-                b.extend(self.serialize_string(payload.get('nickname')))
-                b.extend(self.serialize_string(payload.get('password')))
-                if command_code == CommandCode.REGISTER:
-                    b.extend(self.serialize_string(payload.get('name')))
-            elif command_code == CommandCode.GET_INITIAL_DATA: pass
-            elif command_code == CommandCode.SEARCH_USER:
-                 b.extend(self.serialize_string(payload.get('nickname_query')))
-            elif command_code == CommandCode.ADD_FRIEND:
-                 b.extend(self.serialize_string(payload.get('target_nickname')))
-            elif command_code in (CommandCode.ACCEPT_FRIEND, CommandCode.REJECT_FRIEND):
-                 b.extend(self.serialize_string(payload.get('requester_nickname')))
-            elif command_code == CommandCode.INVITE:
-                 b.extend(self.serialize_string(payload.get('target_nickname')))
-            elif command_code == CommandCode.ACCEPT:
-                 b.extend(self.serialize_string(payload.get('caller_nickname')))
-            elif command_code == CommandCode.REJECT:
-                 b.extend(self.serialize_string(payload.get('caller_nickname')))
-            elif command_code == CommandCode.BYE: pass
-
-            # Payloads Servidor -> Cliente
-            elif command_code in (CommandCode.REGISTER_RESPONSE, CommandCode.LOGIN_RESPONSE,
-                                  CommandCode.ADD_FRIEND_RESPONSE, CommandCode.INVITE_RESPONSE,
-                                  CommandCode.ERROR):
-                b.extend(struct.pack(self.FMT_BOOL, payload.get('success', False)))
-                b.extend(self.serialize_string(payload.get('message', '')))
-                if command_code == CommandCode.LOGIN_RESPONSE and payload.get('success'):
-                    b.extend(self.serialize_string(payload.get('nickname')))
-            elif command_code == CommandCode.FRIEND_LIST:
-                friends = payload.get('friends', [])
-                b.extend(struct.pack(self.FMT_COUNT, len(friends)))
-                for friend in friends:
-                    b.extend(self.serialize_string(friend.get('nickname')))
-                    b.extend(self.serialize_string(friend.get('status')))
-            elif command_code == CommandCode.PENDING_FRIEND_REQUESTS:
-                b.extend(self.serialize_string_list(payload.get('requests_from', [])))
-            elif command_code == CommandCode.SEARCH_RESPONSE:
-                results = payload.get('results', [])
-                b.extend(struct.pack(self.FMT_BOOL, payload.get('success', True)))
-                b.extend(struct.pack(self.FMT_COUNT, len(results)))
-                for user in results:
-                    b.extend(self.serialize_string(user.get('nickname')))
-                    b.extend(self.serialize_string(user.get('name')))
-            elif command_code == CommandCode.INCOMING_FRIEND_REQUEST:
-                 b.extend(self.serialize_string(payload.get('from_nickname')))
-            elif command_code == CommandCode.FRIEND_REQUEST_ACCEPTED:
-                b.extend(self.serialize_string(payload.get('by_nickname')))
-                b.extend(self.serialize_string(payload.get('status')))
-            elif command_code == CommandCode.INCOMING_CALL:
-                b.extend(self.serialize_string(payload.get('from_nickname')))
-            elif command_code == CommandCode.CALL_ACCEPTED:
-                b.extend(self.serialize_string(payload.get('callee_nickname'))) 
-                b.extend(self.serialize_string(payload.get('relay_ip')))
-                b.extend(struct.pack(self.FMT_PORT, payload.get('relay_port', 0)))
-                b.extend(self.serialize_string(payload.get('token')))
-            elif command_code == CommandCode.CALL_REJECTED:
-                b.extend(self.serialize_string(payload.get('callee_nickname')))
-            elif command_code == CommandCode.CALL_ENDED:
-                b.extend(self.serialize_string(payload.get('from_nickname')))
-            elif command_code == CommandCode.STATUS_UPDATE:
-                b.extend(self.serialize_string(payload.get('nickname')))
-                b.extend(self.serialize_string(payload.get('status')))
-            else:
-                 raise NotImplementedError(f"Serialização não implementada para: {command_code.name}")
-            return bytes(b)
+            for step in encoder:
+                step(payload, parts)
+            return parts
         except (struct.error, TypeError, KeyError, AttributeError) as e:
             cmd_name = CODE_TO_COMMAND_NAME.get(command_code, f"UNKNOWN(0x{command_code.value:02X})")
             logging.error(f"Erro ao serializar payload para {cmd_name}: {e}. Payload: {payload}", exc_info=True)
-            error_payload = {'success': False, 'message': 'Erro interno do servidor ao serializar.'}
-            b_error = bytearray()
-            b_error.extend(struct.pack(self.FMT_BOOL, error_payload['success']))
-            b_error.extend(self.serialize_string(error_payload['message']))
-            return bytes(b_error)
+            error_parts = []
+            for step in self.ENCODERS[CommandCode.ERROR]:
+                step({'success': False, 'message': 'Erro interno do servidor ao serializar.'}, error_parts)
+            return error_parts
+
+    # Implementação da serialização de TODOS os payloads do VoIP
+    def serialize_payload(self, command_code: CommandCode, payload: dict) -> bytes:
+        return b''.join(self._serialize_parts(command_code, payload))
+
+    # Monta cabeçalho + payload com uma única cópia
+    def create_message(self, command_code: CommandCode, payload_dict: Dict) -> bytes:
+        parts = self._serialize_parts(command_code, payload_dict)
+        payload_length = sum(len(p) for p in parts)
+        if payload_length > MAX_PAYLOAD_SIZE:
+            raise ValueError(f"Payload de {command_code.name} com {payload_length} bytes excede o limite de "
+                             f"{MAX_PAYLOAD_SIZE} do frame (listas longas: use iter_chunked_messages)")
+        return b''.join([_HEADER.pack(command_code.value, payload_length), *parts])
+
+    # Serializa uma lista longa (FRIEND_LIST, PENDING_FRIEND_REQUESTS) em frames de até `max_payload` bytes.
+    # Consome `items` sob demanda e devolve um frame por vez, sem montar a lista inteira nem o payload completo.
+    def iter_chunked_messages(self, command_code: CommandCode, items: Iterable,
+                              max_payload: int = MAX_PAYLOAD_SIZE) -> Iterator[bytes]:
+        field = PAYLOAD_SCHEMAS[command_code][0]
+        if field.kind == FIELD_PAIR_LIST:
+            first, second = field.subkeys
+            item_values = lambda item: (item.get(first) or '', item.get(second) or '')
+        else:
+            item_values = lambda item: (item or '',)
 
-    # Implementação da desserialização de TODOS os payloads do VoIP            
+        # Reserva a contagem (2 bytes) e a flag `more` (1 byte)
+        budget = min(max_payload, MAX_PAYLOAD_SIZE) - 3
+        parts, size, count = [], 0, 0
+        for item in items:
+            strings = [value.encode('utf-8') for value in item_values(item)]
+            item_size = 2 * len(strings) + sum(len(data) for data in strings)
+            if item_size > budget:
+                raise ValueError(f"Item de {item_size} bytes não cabe num frame de {command_code.name}")
+            if size + item_size > budget or count == 0xFFFF:
+                yield b''.join([_HEADER.pack(command_code.value, 2 + size + 1), _U16.pack(count), *parts, _MORE])
+                parts, size, count = [], 0, 0
+            for data in strings:
+                parts.append(_U16.pack(len(data)))
+                parts.append(data)
+            size += item_size
+            count += 1
+        yield b''.join([_HEADER.pack(command_code.value, 2 + size), _U16.pack(count), *parts])
+
+    # Implementação da desserialização de TODOS os payloads do VoIP.
+    # Aceita bytes ou memoryview; as strings são decodificadas direto do buffer, sem fatias intermediárias.
     def deserialize_payload(self, command_code: CommandCode, payload_bytes: bytes) -> dict:
         payload = {}
         offset = 0
+        view = payload_bytes if isinstance(payload_bytes, memoryview) else memoryview(payload_bytes)
         try:
-            # Payloads Cliente -> Servidor
-            if command_code in (CommandCode.LOGIN, CommandCode.REGISTER):
-                payload['nickname'], offset = self.deserialize_string(payload_bytes, offset)
-                payload['password'], offset = self.deserialize_string(payload_bytes, offset)
-                if command_code == CommandCode.REGISTER:
-                    payload['name'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code == CommandCode.GET_INITIAL_DATA: pass
-            elif command_code == CommandCode.SEARCH_USER:
-                 payload['nickname_query'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code == CommandCode.ADD_FRIEND:
-                 payload['target_nickname'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code in (CommandCode.ACCEPT_FRIEND, CommandCode.REJECT_FRIEND):
-                 payload['requester_nickname'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code == CommandCode.INVITE:
-                 payload['target_nickname'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code == CommandCode.ACCEPT:
-                 payload['caller_nickname'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code == CommandCode.REJECT:
-                 payload['caller_nickname'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code == CommandCode.BYE: pass
-            
-            # Payloads Servidor -> Cliente
-            elif command_code in (CommandCode.REGISTER_RESPONSE, CommandCode.LOGIN_RESPONSE,
-                                  CommandCode.ADD_FRIEND_RESPONSE, CommandCode.INVITE_RESPONSE,
-                                  CommandCode.ERROR):
-                payload['success'] = struct.unpack_from(self.FMT_BOOL, payload_bytes, offset)[0]
-                offset += struct.calcsize(self.FMT_BOOL)
-                payload['message'], offset = self.deserialize_string(payload_bytes, offset)
-                if command_code == CommandCode.LOGIN_RESPONSE and payload.get('success'):
-                    payload['nickname'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code == CommandCode.FRIEND_LIST:
-                count = struct.unpack_from(self.FMT_COUNT, payload_bytes, offset)[0]
-                offset += struct.calcsize(self.FMT_COUNT)
-                friends = []
-                for _ in range(count):
-                    nick, offset = self.deserialize_string(payload_bytes, offset)
-                    status, offset = self.deserialize_string(payload_bytes, offset)
-                    friends.append({'nickname': nick, 'status': status})
-                payload['friends'] = friends
-            elif command_code == CommandCode.PENDING_FRIEND_REQUESTS:
-                requests, offset = self.deserialize_string_list(payload_bytes, offset)
-                payload['requests_from'] = requests
-            elif command_code == CommandCode.SEARCH_RESPONSE:
-                payload['success'] = struct.unpack_from(self.FMT_BOOL, payload_bytes, offset)[0]
-                offset += struct.calcsize(self.FMT_BOOL)
-                count = struct.unpack_from(self.FMT_COUNT, payload_bytes, offset)[0]
-                offset += struct.calcsize(self.FMT_COUNT)
-                results = []
-                for _ in range(count):
-                    nick, offset = self.deserialize_string(payload_bytes, offset)
-                    name, offset = self.deserialize_string(payload_bytes, offset)
-                    results.append({'nickname': nick, 'name': name})
-                payload['results'] = results
-            elif command_code == CommandCode.INCOMING_FRIEND_REQUEST:
-                 payload['from_nickname'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code == CommandCode.FRIEND_REQUEST_ACCEPTED:
-                payload['by_nickname'], offset = self.deserialize_string(payload_bytes, offset)
-                payload['status'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code == CommandCode.INCOMING_CALL:
-                payload['from_nickname'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code == CommandCode.CALL_ACCEPTED:
-                payload['callee_nickname'], offset = self.deserialize_string(payload_bytes, offset)
-                payload['relay_ip'], offset = self.deserialize_string(payload_bytes, offset)
-                payload['relay_port'] = struct.unpack_from(self.FMT_PORT, payload_bytes, offset)[0]
-                offset += struct.calcsize(self.FMT_PORT)
-                payload['token'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code == CommandCode.CALL_REJECTED:
-                payload['callee_nickname'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code == CommandCode.CALL_ENDED:
-                payload['from_nickname'], offset = self.deserialize_string(payload_bytes, offset)
-            elif command_code == CommandCode.STATUS_UPDATE:
-                payload['nickname'], offset = self.deserialize_string(payload_bytes, offset)
-                payload['status'], offset = self.deserialize_string(payload_bytes, offset)
-            else:
+            decoder = self.DECODERS.get(command_code)
+            if decoder is None:
                  raise NotImplementedError(f"Desserialização não implementada para: {command_code.name}")
-            
-            if offset != len(payload_bytes):
-                logging.warning(f"Bytes extras no payload para {command_code.name}. Esperado: {offset}, Recebido: {len(payload_bytes)}")
+            for step in decoder:
+                offset = step(view, offset, payload)
+
+            if offset != len(view):
+                logging.warning(f"Bytes extras no payload para {command_code.name}. Esperado: {offset}, Recebido: {len(view)}")
             return payload
         except (ValueError, struct.error, IndexError, KeyError, AttributeError) as e:
             cmd_name = CODE_TO_COMMAND_NAME.get(command_code, f"UNKNOWN(0x{command_code.value:02X})")
-            data_preview = payload_bytes[:50].hex() + ('...' if len(payload_bytes)>50 else '')
+            data_preview = bytes(view[:50]).hex() + ('...' if len(view)>50 else '')
             logging.error(f"Falha ao desserializar payload BINÁRIO para {cmd_name}: {e}. Buffer(hex): {data_preview}", exc_info=True)
             return {"error": "Falha na desserialização do payload binário"}
         except Exception as e:
@@ -0,0 +1,88 @@
+import logging
+import time
+from typing import Dict, Optional, Tuple
+import config
+from protocol import CommandCode
+
+# Classes de comando com orçamento próprio: o custo no servidor varia muito entre elas
+# (hash de senha, busca no banco, escrita no banco, convite de chamada, o resto)
+COMMAND_CLASSES: Dict[CommandCode, str] = {
+    CommandCode.REGISTER: 'auth', CommandCode.LOGIN: 'auth',
+    CommandCode.SEARCH_USER: 'search',
+    CommandCode.ADD_FRIEND: 'friends', CommandCode.ACCEPT_FRIEND: 'friends', CommandCode.REJECT_FRIEND: 'friends',
+    CommandCode.INVITE: 'call',
+}
+DEFAULT_CLASS = 'other'
+# Nunca limitados: descartar o heartbeat deixaria o reaper derrubar a conexão, e descartar a resposta
+# ou o fim de uma chamada deixaria a sessão aberta até expirar
+UNLIMITED_COMMANDS = frozenset({CommandCode.PING, CommandCode.ACCEPT, CommandCode.REJECT, CommandCode.BYE})
+
+# Lê "classe=taxa:rajada,..." (taxa em comandos/s, rajada = capacidade do balde)
+def parse_rate_limits(value: str) -> Dict[str, Tuple[float, float]]:
+    limits = {}
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, spec = item.partition('=')
+        rate, _, burst = spec.partition(':')
+        limits[name.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+# Baldes de uma conexão: dois números por classe (fichas e instante da última recarga), mais o
+# instante até o qual o cliente já foi avisado. Tamanho fixo, independente do tráfego.
+class ConnectionBudget:
+    __slots__ = ('tokens', 'stamps', 'notified_until')
+
+    def __init__(self, capacities: list, now: float):
+        self.tokens = list(capacities)
+        self.stamps = [now] * len(capacities)
+        self.notified_until = [0.0] * len(capacities)
+
+# Limitador por token bucket, por conexão e por classe de comando, consultado antes do despacho
+class _RateLimiter:
+    def __init__(self, limits: Dict[str, Tuple[float, float]]):
+        names = sorted(set(COMMAND_CLASSES.values()) | {DEFAULT_CLASS})
+        unknown = set(limits) - set(names)
+        if unknown:
+            logging.warning(f"Rate limit: classes desconhecidas ignoradas: {', '.join(sorted(unknown))}")
+        # Classes sem limite configurado não são limitadas
+        self._index = {name: i for i, name in enumerate(names)}
+        self._rates = [limits[name][0] if name in limits else 0.0 for name in names]
+        self._capacities = [limits[name][1] if name in limits else 0.0 for name in names]
+        self._class_of = {code: self._index[COMMAND_CLASSES.get(code, DEFAULT_CLASS)]
+                          for code in CommandCode if code not in UNLIMITED_COMMANDS}
+        self.enabled = any(rate > 0 for rate in self._rates)
+
+    def new_budget(self) -> Optional[ConnectionBudget]:
+        if not self.enabled:
+            return None
+        return ConnectionBudget(self._capacities, time.monotonic())
+
+    # Consome uma ficha da classe do comando. Retorna None se o comando pode seguir; senão o tempo (s)
+    # até haver ficha e se o cliente ainda precisa ser avisado (um aviso por período de espera)
+    def check(self, budget: Optional[ConnectionBudget], command_code: CommandCode) -> Optional[Tuple[float, bool]]:
+        if budget is None:
+            return None
+        i = self._class_of.get(command_code)
+        if i is None:
+            return None
+        rate = self._rates[i]
+        if rate <= 0:
+            return None
+        now = time.monotonic()
+        tokens = min(self._capacities[i], budget.tokens[i] + (now - budget.stamps[i]) * rate)
+        budget.stamps[i] = now
+        if tokens >= 1.0:
+            budget.tokens[i] = tokens - 1.0
+            return None
+        budget.tokens[i] = tokens
+        retry_after = (1.0 - tokens) / rate
+        notify = now >= budget.notified_until[i]
+        if notify:
+            budget.notified_until[i] = now + retry_after
+        return retry_after, notify
+
+
+# Instância global (limites em config.RATE_LIMITS; vazio desliga)
+rate_limiter = _RateLimiter(parse_rate_limits(config.RATE_LIMITS))
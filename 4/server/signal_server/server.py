@@ -1,28 +1,34 @@
+import argparse
+import asyncio
 import logging
+import os
 import socket
 import threading
-from client_handler import handle_client 
+import config
+from client_handler import handle_client
+from log_setup import log_setup, LOG_FORMAT
+from metrics import metrics
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(message)s')
+log_setup.configure()
 
-def main():
-    server_host = '0.0.0.0'
-    server_port = 8888      
-    
+# Modo clássico: uma thread por conexão aceita
+def run_thread_server(server_host: str, server_port: int, reuse_port: bool = False):
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
 
     try:
         server_socket.bind((server_host, server_port))
         server_socket.listen()
         logging.info(f"Servidor de Sinalização iniciado em {server_host}:{server_port}")
 
-        while True: 
-            socket_cli, addr = server_socket.accept() 
-            
+        while True:
+            socket_cli, addr = server_socket.accept()
+
             client_thread = threading.Thread(
-                target=handle_client, 
-                args=(socket_cli, addr), 
+                target=handle_client,
+                args=(socket_cli, addr),
                 daemon=True,
                 name=f"Client-{addr[0]}:{addr[1]}"
             )
@@ -36,5 +42,102 @@ def main():
         logging.info("Fechando socket do servidor.")
         server_socket.close()
 
+# Modo asyncio: todas as conexões atendidas por um único event loop
+def run_async_server(server_host: str, server_port: int, reuse_port: bool = False):
+    import async_server
+    try:
+        asyncio.run(async_server.serve(server_host, server_port, reuse_port))
+    except KeyboardInterrupt:
+        logging.info("Servidor desligado manualmente.")
+    except Exception as e:
+        logging.error(f"Erro fatal no servidor: {e}", exc_info=True)
+
+# Processo de sinalização do cluster: liga-se ao barramento e atende na porta compartilhada
+def _run_worker(worker_id: int, mode: str, server_host: str, server_port: int, bus_address: str, bus_authkey: bytes,
+                metrics_port: int, log_mode: str, log_sample: int):
+    from cluster import cluster_bus
+    threading.current_thread().name = f"Worker-{worker_id}"
+    # O pai faz o fork sem a thread escritora de logs: cada worker configura o modo pedido e cria a sua
+    log_setup.configure(log_mode, log_sample, fmt=LOG_FORMAT.replace('%(threadName)s', f'W{worker_id} %(threadName)s'))
+    cluster_bus.connect(bus_address, bus_authkey, worker_id)
+    if metrics_port:
+        metrics.start_http_server(config.METRICS_HOST, metrics_port + worker_id)
+    if mode == 'async':
+        run_async_server(server_host, server_port, reuse_port=True)
+    else:
+        run_thread_server(server_host, server_port, reuse_port=True)
+
+# Vários processos na mesma porta (o kernel distribui as conexões via SO_REUSEPORT), ligados por um
+# barramento de presença que roda neste processo. Os workers são criados com fork enquanto o pai só tem a
+# thread principal: até lá os logs do pai são síncronos (sem a thread escritora do modo production, cujos
+# locks um filho poderia herdar travados), e o modo pedido só é configurado no pai depois do fork.
+def run_workers(mode: str, server_host: str, server_port: int, num_workers: int, metrics_port: int = 0,
+                log_mode: str = config.LOG_MODE, log_sample: int = config.LOG_FRAME_SAMPLE_EVERY):
+    import multiprocessing
+    import multiprocessing.connection
+    import tempfile
+    from cluster import PresenceBroker
+
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        logging.error("SO_REUSEPORT não é suportado nesta plataforma; use --workers 1.")
+        return
+
+    log_setup.configure('off' if log_mode == 'off' else 'dev')
+    bus_address = config.CLUSTER_SOCKET_PATH or os.path.join(tempfile.gettempdir(), f"voip_presence_{server_port}.sock")
+    broker = PresenceBroker(bus_address)
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_run_worker, name=f"Worker-{i}",
+                               args=(i, mode, server_host, server_port, broker.address, broker.authkey, metrics_port,
+                                     log_mode, log_sample))
+               for i in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    log_setup.configure(log_mode, log_sample)
+    logging.info(f"{num_workers} workers de sinalização ({mode}) iniciados em {server_host}:{server_port}")
+
+    threading.Thread(target=broker.serve_forever, daemon=True, name="PresenceBroker").start()
+    try:
+        alive = {worker.sentinel: worker for worker in workers}
+        while alive:
+            for sentinel in multiprocessing.connection.wait(list(alive)):
+                worker = alive.pop(sentinel)
+                logging.error(f"{worker.name} terminou (código {worker.exitcode}); {len(alive)} workers restantes.")
+    except KeyboardInterrupt:
+        logging.info("Servidor desligado manualmente.")
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+        broker.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de Sinalização VoIP")
+    parser.add_argument('--mode', choices=('thread', 'async'), default=config.SERVER_MODE,
+                        help="Modelo de concorrência do servidor (padrão: SERVER_MODE ou 'thread')")
+    parser.add_argument('--host', default=config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=config.SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=config.SERVER_WORKERS,
+                        help="Processos de sinalização compartilhando a porta (padrão: SERVER_WORKERS ou 1)")
+    parser.add_argument('--metrics-port', type=int, default=config.METRICS_PORT,
+                        help="Porta do endpoint /metrics (formato Prometheus) em METRICS_HOST; 0 desliga")
+    parser.add_argument('--log-mode', choices=('dev', 'production', 'off'), default=config.LOG_MODE,
+                        help="'production': logs escritos por uma thread de fundo, com amostragem dos logs por frame; "
+                             "'off': só avisos e erros")
+    parser.add_argument('--log-sample', type=int, default=config.LOG_FRAME_SAMPLE_EVERY,
+                        help="No modo production, registra 1 a cada N logs por frame/comando")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        run_workers(args.mode, args.host, args.port, args.workers, args.metrics_port, args.log_mode, args.log_sample)
+        return
+    log_setup.configure(args.log_mode, args.log_sample)
+    if args.metrics_port:
+        metrics.start_http_server(config.METRICS_HOST, args.metrics_port)
+    if args.mode == 'async':
+        run_async_server(args.host, args.port)
+    else:
+        run_thread_server(args.host, args.port)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
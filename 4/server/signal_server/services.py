@@ -1,50 +1,77 @@
-import logging
 import socket 
-import secrets 
-from typing import List, Optional
+from concurrent.futures import Future
+from typing import Iterator, List, Optional
 import db_manager as db
 from models import state_manager, UserProfile 
 from interfaces import IAuthenticationService, IFriendshipService, ICallService 
 import config 
+from call_sessions import call_registry
+from log_setup import log_setup, SERVICE_LOGGER
+
+# Logs por comando: formatação adiada (args separados) e amostrados no modo production
+log = log_setup.sampled_logger(SERVICE_LOGGER)
 
 # Serviço de autenticação
 class AuthenticationService(IAuthenticationService):
     # Registra no banco de dados um novo usuário
     def register_user(self, nickname: str, name: str, password: str) -> tuple[bool, str]:
-        logging.info(f"Serviço: Tentando registrar usuário {nickname}")
+        log.info("Serviço: Tentando registrar usuário %s", nickname)
         return db.register_user(nickname, name, password)
 
-    # Realiza o login do usuário
-    def login_user(self, nickname: str, password: str, conn: socket.socket) -> tuple[bool, str]:
-        logging.info(f"Serviço: Tentando login para {nickname}")
-        
-        if not db.check_login(nickname, password):
-            logging.warning(f"Serviço: Login falhou (credenciais inválidas) para {nickname}")
+    # Confere as credenciais (hash da senha + banco). Custoso: é executado no pool de autenticação.
+    def verify_credentials(self, nickname: str, password: str) -> bool:
+        log.info("Serviço: Tentando login para %s", nickname)
+        return db.check_login(nickname, password)
+
+    # Conclui o login depois da verificação, registrando o usuário como conectado
+    def complete_login(self, nickname: str, credentials_ok: bool, conn: socket.socket) -> tuple[bool, str]:
+        if not credentials_ok:
+            log.warning("Serviço: Login falhou (credenciais inválidas) para %s", nickname)
             return (False, "Credenciais invalidas.")
 
-        success_add = state_manager.add_user(nickname, conn)
+        success_add = state_manager.add_user(nickname, conn, db.get_friends_set_db(nickname))
         if not success_add:
-            logging.warning(f"Serviço: Login falhou (já conectado) para {nickname}")
+            log.warning("Serviço: Login falhou (já conectado) para %s", nickname)
             return (False, "Usuario ja conectado.")
 
         return (True, "Login bem-sucedido!")
 
+    # Realiza o login do usuário (verificação e registro na mesma thread)
+    def login_user(self, nickname: str, password: str, conn: socket.socket) -> tuple[bool, str]:
+        return self.complete_login(nickname, self.verify_credentials(nickname, password), conn)
+
 # Serviço de amizade
 class FriendshipService(IFriendshipService):
-    # Procura no banco de dados usuários que correspondam à query
-    def search_users(self, query: str, current_user_nickname: str) -> List[UserProfile]:
-        logging.info(f"Serviço: Buscando usuários com query '{query}' (por {current_user_nickname})")
-        results_dict = db.search_users_db(query, current_user_nickname)
-        return [UserProfile(nickname=res['nickname'], name=res['name']) for res in results_dict]
-
-    # Rejeita um pedido de amizade
+    # Procura no banco de dados usuários cujo nickname começa com a query, uma página por vez.
+    # A página é limitada em quantidade e em bytes (para caber num frame); retorna também o cursor da
+    # próxima página ('' quando não há mais resultados).
+    def search_users(self, query: str, current_user_nickname: str, cursor: Optional[str] = None) -> tuple[List[UserProfile], str]:
+        log.info("Serviço: Buscando usuários com query '%s' (por %s)", query, current_user_nickname)
+        limit = config.SEARCH_RESULT_LIMIT
+        results_dict = db.search_users_db(query, current_user_nickname, cursor, limit + 1)
+
+        profiles = []
+        budget = config.SEARCH_RESPONSE_MAX_BYTES
+        for res in results_dict[:limit]:
+            # Cada resultado ocupa dois prefixos de tamanho (2 bytes cada) mais as strings em UTF-8
+            size = 4 + len(res['nickname'].encode('utf-8')) + len(res['name'].encode('utf-8'))
+            if size > budget:
+                break
+            budget -= size
+            profiles.append(UserProfile(nickname=res['nickname'], name=res['name']))
+
+        has_more = len(profiles) < len(results_dict)
+        next_cursor = profiles[-1].nickname if has_more and profiles else ''
+        return profiles, next_cursor
+
+    # Rejeita um pedido de amizade (não há resposta ao cliente, então não espera a confirmação da escrita)
     def reject_request(self, requester_nickname: str, rejector_nickname: str) -> None:
-        logging.info(f"Serviço: {rejector_nickname} rejeitando pedido de {requester_nickname}")
-        db.update_friend_request_db(requester_nickname, rejector_nickname, 'rejected')
+        log.info("Serviço: %s rejeitando pedido de %s", rejector_nickname, requester_nickname)
+        db.update_friend_request_async(requester_nickname, rejector_nickname, 'rejected')
 
     # Obtém a lista de amigos com seus status
     def get_friends_with_status(self, nickname: str) -> List[dict]:
-        logging.info(f"Serviço: Buscando amigos com status para {nickname}")
+        log.info("Serviço: Buscando amigos com status para %s", nickname)
         friend_nicknames = db.get_friends_list_db(nickname)
         friends_with_status = []
         for friend in friend_nicknames:
@@ -54,25 +81,83 @@ class FriendshipService(IFriendshipService):
 
     # Obtém a lista de pedidos de amizade pendentes
     def get_pending_requests(self, nickname: str) -> List[str]:
-        logging.info(f"Serviço: Buscando pedidos pendentes para {nickname}")
+        log.info("Serviço: Buscando pedidos pendentes para %s", nickname)
         return db.get_pending_friend_requests_db(nickname)
 
-    # Envia um pedido de amizade
-    def send_request(self, requester_nickname: str, target_nickname: str) -> tuple[bool, str]:
-        logging.info(f"Serviço: {requester_nickname} tentando adicionar {target_nickname}")
+    # Obtém amigos (com status) e pedidos pendentes para a carga inicial do cliente.
+    # Uma única consulta ao cache/banco; os amigos saem sob demanda, com os status resolvidos em blocos,
+    # para que listas enormes sejam serializadas em pedaços sem montar todos os dicionários de uma vez.
+    def get_initial_data(self, nickname: str) -> tuple[Iterator[dict], List[str]]:
+        log.info("Serviço: Buscando dados iniciais para %s", nickname)
+        entry = db.get_friendships_db(nickname)
+        # Cópia dos nicknames: o conjunto do cache pode mudar enquanto a lista é enviada
+        return self._iter_friends_with_status(list(entry.friends)), sorted(entry.pending_from)
+
+    @staticmethod
+    def _iter_friends_with_status(friend_nicknames: List[str], block: int = 512) -> Iterator[dict]:
+        for start in range(0, len(friend_nicknames), block):
+            nicknames = friend_nicknames[start:start + block]
+            for friend, status in zip(nicknames, state_manager.get_users_status_str(nicknames)):
+                yield {'nickname': friend, 'status': status}
+
+    # Versão atual da lista de amigos (enviada junto da lista completa para o cliente guardar em cache)
+    def get_friendship_version(self, nickname: str) -> int:
+        return db.get_friendship_version_db(nickname)
+
+    # Mudanças na lista de amigos desde a versão em cache no cliente: amigos que entraram (com status),
+    # que saíram e o status dos demais amigos online. Retorna None quando é preciso enviar a lista completa:
+    # log sem cobertura para a versão pedida ou delta maior que FRIEND_DELTA_MAX_BYTES.
+    def get_friend_list_delta(self, nickname: str, since_version: int) -> Optional[dict]:
+        version, changes = db.get_friendship_changes_db(nickname, since_version)
+        if changes is None:
+            log.info("Serviço: Versão %d das amizades de %s fora do log, enviando lista completa", since_version, nickname)
+            return None
+
+        # A última mudança de cada amigo prevalece (aceito e depois desfeito = removido)
+        latest = dict(changes)
+        added = [friend for friend, was_added in latest.items() if was_added]
+        removed = [friend for friend, was_added in latest.items() if not was_added]
+        added_set = set(added)
+        added_with_status = [{'nickname': friend, 'status': status}
+                             for friend, status in zip(added, state_manager.get_users_status_str(added))]
+        # O cliente mostra os amigos em cache como Offline até receber o delta; só os online precisam de status
+        statuses = [{'nickname': user.nickname, 'status': user.get_status_str()}
+                    for user in state_manager.get_online_friends(nickname) if user.nickname not in added_set]
+
+        # Contagens das três listas (2 bytes cada), a versão (4) e os itens: prefixos de 2 bytes mais UTF-8
+        size = 10 + sum(2 + len(friend.encode('utf-8')) for friend in removed)
+        for item in added_with_status + statuses:
+            size += 4 + len(item['nickname'].encode('utf-8')) + len(item['status'].encode('utf-8'))
+        if size > config.FRIEND_DELTA_MAX_BYTES:
+            log.info("Serviço: Delta das amizades de %s com %d bytes, enviando lista completa", nickname, size)
+            return None
+
+        log.info("Serviço: Delta das amizades de %s (v%d -> v%d): +%d -%d, %d online",
+                 nickname, since_version, version, len(added), len(removed), len(statuses))
+        return {'version': version, 'added': added_with_status, 'removed': removed, 'statuses': statuses}
+
+    # Envia um pedido de amizade; o Future resolve para (sucesso, mensagem) após a escrita ser confirmada
+    def send_request_async(self, requester_nickname: str, target_nickname: str) -> Future:
+        log.info("Serviço: %s tentando adicionar %s", requester_nickname, target_nickname)
         if requester_nickname == target_nickname:
-             return (False, "Voce não pode adicionar a si mesmo.")
+            future = Future()
+            future.set_result((False, "Voce não pode adicionar a si mesmo."))
+            return future
 
-        success, message = db.add_friend_request_db(requester_nickname, target_nickname)
+        return db.add_friend_request_async(requester_nickname, target_nickname)
 
-        return success, message
+    def send_request(self, requester_nickname: str, target_nickname: str) -> tuple[bool, str]:
+        return self.send_request_async(requester_nickname, target_nickname).result()
 
-    # Aceita um pedido de amizade
-    def accept_request(self, requester_nickname: str, acceptor_nickname: str) -> tuple[bool, Optional[str], Optional[str]]:
-        logging.info(f"Serviço: {acceptor_nickname} tentando aceitar pedido de {requester_nickname}")
-        success = db.update_friend_request_db(requester_nickname, acceptor_nickname, 'accepted')
+    # Aceita um pedido de amizade; o Future resolve para True se havia um pedido pendente
+    def accept_request_async(self, requester_nickname: str, acceptor_nickname: str) -> Future:
+        log.info("Serviço: %s tentando aceitar pedido de %s", acceptor_nickname, requester_nickname)
+        return db.update_friend_request_async(requester_nickname, acceptor_nickname, 'accepted')
 
+    # Conclui a aceitação depois da escrita: registra a amizade no estado e devolve os status dos dois
+    def complete_accept(self, requester_nickname: str, acceptor_nickname: str, success: bool) -> tuple[bool, Optional[str], Optional[str]]:
         if success:
+            state_manager.link_friends(requester_nickname, acceptor_nickname)
             acceptor_status = state_manager.get_user_status_str(acceptor_nickname)
             requester_status = state_manager.get_user_status_str(requester_nickname)
          
@@ -80,25 +165,32 @@ class FriendshipService(IFriendshipService):
         else:
             return (False, None, None)
 
+    def accept_request(self, requester_nickname: str, acceptor_nickname: str) -> tuple[bool, Optional[str], Optional[str]]:
+        success = self.accept_request_async(requester_nickname, acceptor_nickname).result()
+        return self.complete_accept(requester_nickname, acceptor_nickname, success)
+
 # Serviço de chamadas
 class CallService(ICallService):
-    # Cria uma sessão de chamada entre dois usuários
+    # Cria uma sessão de chamada entre dois usuários, registrando o token e escolhendo um relay do pool
     def create_call_session(self, caller_nickname: str, callee_nickname: str) -> tuple[bool, str, Optional[dict]]:
-        logging.info(f"Serviço: Criando sessão de chamada para {caller_nickname} e {callee_nickname}")
-        
-        # Gera um token de sessão seguro
-        session_token = secrets.token_hex(16)
-
-        # Prepara as informações do relay
-        relay_info = {
-            'relay_ip': config.RELAY_SERVER_IP,
-            'relay_port': config.RELAY_SERVER_PORT,
-            'token': session_token
-        }
-        
-        # Retorna as informações da sessão
-        logging.info(f"Serviço: Sessão criada. Relay: {config.RELAY_SERVER_IP}:{config.RELAY_SERVER_PORT}, Token: {session_token[:5]}...")
-        return (True, "Sessão criada com sucesso.", relay_info)
+        log.info("Serviço: Criando sessão de chamada para %s e %s", caller_nickname, callee_nickname)
+
+        session = call_registry.create(caller_nickname, callee_nickname)
+        if session is None:
+            log.warning("Serviço: %s ou %s já está numa sessão de chamada", caller_nickname, callee_nickname)
+            return (False, "Um dos participantes já está em outra chamada.", None)
+
+        relay_ip, relay_port = session.relay
+        log.info("Serviço: Sessão criada. Relay: %s:%s, Token: %s... (sessões ativas: %d)",
+                 relay_ip, relay_port, session.token[:5], len(call_registry))
+        return (True, "Sessão criada com sucesso.", session.relay_info())
+
+    # Encerra a sessão de chamada de que o usuário participa (BYE ou desconexão)
+    def end_call_session(self, nickname: str) -> None:
+        session = call_registry.end_for_user(nickname)
+        if session is not None:
+            log.info("Serviço: Sessão de chamada %s <-> %s encerrada (sessões ativas: %d)",
+                     session.caller, session.callee, len(call_registry))
 
 # Instâncias dos serviços
 auth_service = AuthenticationService()
@@ -0,0 +1,161 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_auth --logins 200 --modo async
+#
+# Simula uma "tempestade" de logins (ex.: todos os clientes reconectando após uma queda) contra o servidor
+# num subprocesso com banco temporário, enquanto uma conexão de sonda mede a latência de um comando leve.
+# Compara o hash de senha na própria thread/event loop (AUTH_WORKERS=0) com o pool de autenticação.
+
+import argparse
+import os
+import selectors
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import create_db
+import passwords
+from protocol import CommandCode, protocol
+
+SIGNAL_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HOST = '127.0.0.1'
+FMT_HEADER = struct.Struct('!BH')
+
+# Sobe o servidor apontando o banco para o arquivo temporário
+SERVER_CODE = """
+import sys, create_db, db_manager, server
+db_manager.DB_PATH = sys.argv.pop(1)
+server.main()
+"""
+
+def preparar_banco(db_path: str, num_usuarios: int):
+    import sqlite3
+    create_db.DB_PATH = db_path
+    create_db.DB_DIR = os.path.dirname(db_path)
+    create_db.setup_database()
+    password_hash = passwords.hash_password('senha')
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO users (nickname, name, password_hash) VALUES (?, ?, ?)",
+                     ((f"user{i}", f"Usuario {i}", password_hash) for i in range(num_usuarios)))
+    conn.commit()
+    conn.close()
+
+def esperar_porta(port: int, timeout: float = 10.0):
+    fim = time.time() + timeout
+    while time.time() < fim:
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Servidor não iniciou na porta {port}")
+
+def ler_frame(sock) -> int:
+    header = b''
+    while len(header) < 3:
+        dados = sock.recv(3 - len(header))
+        if not dados:
+            raise ConnectionError("Servidor fechou a conexão")
+        header += dados
+    command_value, tamanho = FMT_HEADER.unpack(header)
+    restante = tamanho
+    while restante:
+        restante -= len(sock.recv(restante))
+    return command_value
+
+# Envia comandos leves (sem login a resposta é um ERROR imediato) e mede o tempo de ida e volta
+def sonda(port: int, parar: threading.Event, latencias: list):
+    with socket.create_connection((HOST, port)) as sock:
+        mensagem = protocol.create_message(CommandCode.GET_INITIAL_DATA, {})
+        while not parar.is_set():
+            inicio = time.perf_counter()
+            sock.sendall(mensagem)
+            ler_frame(sock)
+            latencias.append(time.perf_counter() - inicio)
+            time.sleep(0.005)
+
+def tempestade(port: int, num_logins: int):
+    seletor = selectors.DefaultSelector()
+    sockets = []
+    for i in range(num_logins):
+        sock = socket.create_connection((HOST, port))
+        sockets.append(sock)
+    inicio = time.perf_counter()
+    for i, sock in enumerate(sockets):
+        sock.sendall(protocol.create_message(CommandCode.LOGIN, {'nickname': f"user{i}", 'password': 'senha'}))
+        seletor.register(sock, selectors.EVENT_READ)
+
+    sucesso = ocupado = 0
+    pendentes = len(sockets)
+    while pendentes:
+        for chave, _ in seletor.select(timeout=30):
+            sock = chave.fileobj
+            header = sock.recv(3, socket.MSG_WAITALL)
+            command_value, tamanho = FMT_HEADER.unpack(header)
+            payload = sock.recv(tamanho, socket.MSG_WAITALL) if tamanho else b''
+            resposta = protocol.deserialize_payload(CommandCode(command_value), payload)
+            if resposta.get('success'):
+                sucesso += 1
+            else:
+                ocupado += 1
+            seletor.unregister(sock)
+            pendentes -= 1
+    duracao = time.perf_counter() - inicio
+    for sock in sockets:
+        sock.close()
+    return duracao, sucesso, ocupado
+
+def executar(modo_servidor: str, workers: int, db_path: str, port: int, num_logins: int, log_path: str):
+    env = dict(os.environ, AUTH_WORKERS=str(workers), AUTH_METRICS_LOG_SECONDS='1', RATE_LIMITS='')
+    with open(log_path, 'w') as log:
+        proc = subprocess.Popen([sys.executable, '-c', SERVER_CODE, db_path, '--mode', modo_servidor,
+                                 '--host', HOST, '--port', str(port)],
+                                cwd=SIGNAL_SERVER_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        esperar_porta(port)
+        latencias, parar = [], threading.Event()
+        thread_sonda = threading.Thread(target=sonda, args=(port, parar, latencias))
+        thread_sonda.start()
+        time.sleep(0.2)
+        duracao, sucesso, ocupado = tempestade(port, num_logins)
+        parar.set()
+        thread_sonda.join()
+        time.sleep(1.2)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    metricas = [linha.strip() for linha in open(log_path) if 'Pool Auth:' in linha]
+    ordenadas = sorted(latencias)
+    p99 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.99))]
+    rotulo = "inline (AUTH_WORKERS=0)" if workers == 0 else f"pool ({workers} workers)"
+    print(f"{rotulo}:")
+    print(f"  {num_logins} logins em {duracao:.2f}s ({sucesso} aceitos, {ocupado} recusados)")
+    print(f"  sonda: p50 {statistics.median(ordenadas) * 1000:.1f} ms   p99 {p99 * 1000:.1f} ms   "
+          f"máx {ordenadas[-1] * 1000:.1f} ms   ({len(ordenadas)} amostras)")
+    if metricas:
+        print(f"  {metricas[-1].split(' - ')[-1]}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de tempestade de logins com e sem pool de autenticação")
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--modo', choices=['thread', 'async'], default='async')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=18890)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'voip.db')
+        preparar_banco(db_path, args.logins)
+        print(f"--- Benchmark: tempestade de logins (modo {args.modo}) ---\n")
+        for workers in (0, args.workers):
+            executar(args.modo, workers, db_path, args.port, args.logins, os.path.join(tmp, f'server_{workers}.log'))
+            print()
+    print("--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
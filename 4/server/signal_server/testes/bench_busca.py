@@ -0,0 +1,112 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_busca --usuarios 1000000
+#
+# Mede a latência do SEARCH_USER num banco temporário com muitos usuários:
+# a consulta antiga (LIKE sem índice e sem LIMIT) contra a busca paginada pelo índice
+# idx_users_nickname_nocase, para prefixos de tamanhos diferentes.
+# Também mostra o tamanho que o SEARCH_RESPONSE antigo teria (o frame aceita no máximo 65535 bytes).
+
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import statistics
+import string
+import tempfile
+import time
+
+import create_db
+import db_manager
+from services import friend_service
+
+SQL_BUSCA_ANTIGA = "SELECT nickname, name FROM users WHERE nickname LIKE ? AND nickname != ?"
+
+def preparar_banco(db_path: str, num_usuarios: int):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE users (nickname TEXT PRIMARY KEY, name TEXT NOT NULL, password_hash TEXT NOT NULL, "
+                 "created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)")
+    rng = random.Random(42)
+    letras = string.ascii_lowercase
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (nickname, name, password_hash) VALUES (?, ?, 'x')",
+        ((''.join(rng.choices(letras, k=8)) + str(i), f"Usuario {i}") for i in range(num_usuarios))
+    )
+    conn.commit()
+    conn.close()
+
+def prefixos(tamanho: int, quantidade: int):
+    rng = random.Random(tamanho)
+    return [''.join(rng.choices(string.ascii_lowercase, k=tamanho)) for _ in range(quantidade)]
+
+def resumo(latencias: list) -> str:
+    ordenadas = sorted(latencias)
+    p99 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.99))]
+    return f"p50 {statistics.median(ordenadas) * 1000:>8.2f} ms   p99 {p99 * 1000:>8.2f} ms"
+
+def medir_antiga(db_path: str, consultas: list):
+    conn = sqlite3.connect(db_path)
+    latencias, linhas, maior_payload = [], 0, 0
+    for query in consultas:
+        inicio = time.perf_counter()
+        rows = conn.execute(SQL_BUSCA_ANTIGA, (f'{query}%', 'ninguem')).fetchall()
+        latencias.append(time.perf_counter() - inicio)
+        linhas += len(rows)
+        maior_payload = max(maior_payload, 3 + sum(4 + len(n.encode()) + len(m.encode()) for n, m in rows))
+    conn.close()
+    return latencias, linhas / len(consultas), maior_payload
+
+def medir_paginada(consultas: list, paginas: int):
+    latencias, resultados = [], 0
+    for query in consultas:
+        cursor = ''
+        for _ in range(paginas):
+            inicio = time.perf_counter()
+            profiles, cursor = friend_service.search_users(query, 'ninguem', cursor)
+            latencias.append(time.perf_counter() - inicio)
+            resultados += len(profiles)
+            if not cursor:
+                break
+    return latencias, resultados / len(consultas)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da busca de usuários por prefixo")
+    parser.add_argument('--usuarios', type=int, default=1000000)
+    parser.add_argument('--consultas', type=int, default=20)
+    parser.add_argument('--paginas', type=int, default=3)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'voip.db')
+        print("--- Benchmark: SEARCH_USER ---\n")
+        inicio = time.perf_counter()
+        preparar_banco(db_path, args.usuarios)
+        print(f"{args.usuarios} usuários inseridos em {time.perf_counter() - inicio:.1f}s\n")
+
+        print("Consulta antiga (LIKE sem índice, sem LIMIT):")
+        for tamanho in (1, 2, 3, 5):
+            latencias, linhas, maior = medir_antiga(db_path, prefixos(tamanho, max(2, args.consultas // 4)))
+            aviso = "  (excede o frame!)" if maior > 65535 else ""
+            print(f"  prefixo de {tamanho}: {resumo(latencias)}   {linhas:>9,.0f} linhas/consulta   maior payload {maior:>10,} B{aviso}")
+
+        inicio = time.perf_counter()
+        create_db.DB_PATH = db_path
+        create_db.DB_DIR = tmp
+        create_db.setup_database()
+        logging.getLogger().setLevel(logging.WARNING)
+        print(f"\nÍndice criado em {time.perf_counter() - inicio:.1f}s")
+        db_manager.DB_PATH = db_path
+        db_manager.close_pool()
+
+        print(f"\nBusca paginada pelo índice (até {args.paginas} páginas por consulta):")
+        for tamanho in (1, 2, 3, 5):
+            latencias, resultados = medir_paginada(prefixos(tamanho, args.consultas), args.paginas)
+            print(f"  prefixo de {tamanho}: {resumo(latencias)}   {resultados:>9,.1f} resultados/consulta")
+
+        db_manager.close_pool()
+    print("\n--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_carga --clientes 2000 --modo async --rodadas 3
+# python3 -m testes.bench_carga --clientes 2000 --externo 127.0.0.1:8888 --pid <pid do servidor>
+#
+# Gerador de carga ponta a ponta do protocolo de sinalização. Simula milhares de clientes (asyncio, um
+# único processo, codificação pelo VoipProtocol) contra um servidor local num banco temporário, ou contra
+# um servidor já em execução (--externo). Cada cliente registra, faz login, busca os dados iniciais e
+# pesquisa usuários; os clientes formam pares que trocam pedido de amizade e, a cada rodada, fazem uma
+# chamada completa (INVITE / ACCEPT / BYE). Relata a vazão de cada fase, p50/p99 por comando e a
+# memória do servidor. É a referência para validar mudanças de escala.
+
+import argparse
+import asyncio
+import os
+import resource
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import create_db
+from protocol import CommandCode, protocol
+
+SIGNAL_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HOST = '127.0.0.1'
+FMT_HEADER = struct.Struct('!BH')
+TIMEOUT = 30.0
+
+# Sobe o servidor apontando o banco para o arquivo temporário
+SERVER_CODE = """
+import sys, db_manager, server
+db_manager.DB_PATH = sys.argv.pop(1)
+server.main()
+"""
+
+# Notificações que nenhum fluxo espera; são descartadas ao chegar
+IGNORADOS = {CommandCode.STATUS_UPDATE, CommandCode.PONG, CommandCode.PENDING_FRIEND_REQUESTS}
+
+# Lê VmRSS e VmHWM (pico), em KiB, e Threads de /proc/<pid>/status (apenas Linux)
+def ler_status_processo(pid: int) -> dict:
+    info = {'rss_kib': 0, 'pico_kib': 0, 'threads': 0}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linha in f:
+                if linha.startswith('VmRSS:'):
+                    info['rss_kib'] = int(linha.split()[1])
+                elif linha.startswith('VmHWM:'):
+                    info['pico_kib'] = int(linha.split()[1])
+                elif linha.startswith('Threads:'):
+                    info['threads'] = int(linha.split()[1])
+    except OSError:
+        pass
+    return info
+
+def aumentar_limite_arquivos(necessarios: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    desejado = min(hard, max(soft, necessarios + 256))
+    if desejado > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (desejado, hard))
+    return desejado
+
+# Latências e falhas por comando, somadas de todos os clientes
+class Estatisticas:
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.falhas = defaultdict(int)
+
+    def registrar(self, rotulo: str, segundos: float):
+        self.latencias[rotulo].append(segundos)
+
+    def falhou(self, rotulo: str):
+        self.falhas[rotulo] += 1
+
+    def total(self) -> int:
+        return sum(len(v) for v in self.latencias.values())
+
+# Um cliente simulado: uma conexão, uma tarefa leitora e uma fila de mensagens recebidas por comando
+class ClienteSimulado:
+    def __init__(self, nickname: str, stats: Estatisticas):
+        self.nickname = nickname
+        self.stats = stats
+        self._filas = defaultdict(asyncio.Queue)
+        self._reader = None
+        self._writer = None
+        self._leitor = None
+
+    async def conectar(self, host: str, port: int):
+        self._reader, self._writer = await asyncio.open_connection(host, port)
+        self._leitor = asyncio.create_task(self._ler())
+
+    async def _ler(self):
+        try:
+            while True:
+                command_value, tamanho = FMT_HEADER.unpack(await self._reader.readexactly(3))
+                dados = await self._reader.readexactly(tamanho) if tamanho else b''
+                code = CommandCode(command_value)
+                if code in IGNORADOS:
+                    continue
+                self._filas[code].put_nowait(protocol.deserialize_payload(code, dados))
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+
+    def enviar(self, command_code: CommandCode, payload: dict):
+        self._writer.write(protocol.create_message(command_code, payload))
+
+    # Espera a próxima mensagem `command_code` (resposta ou notificação); um ERROR no lugar vira falha
+    async def esperar(self, command_code: CommandCode) -> dict:
+        espera = asyncio.ensure_future(self._filas[command_code].get())
+        erro = asyncio.ensure_future(self._filas[CommandCode.ERROR].get())
+        feitos, pendentes = await asyncio.wait((espera, erro), timeout=TIMEOUT, return_when=asyncio.FIRST_COMPLETED)
+        for tarefa in pendentes:
+            tarefa.cancel()
+        if espera in feitos:
+            if erro in feitos:
+                self._filas[CommandCode.ERROR].put_nowait(erro.result())
+            return espera.result()
+        if erro in feitos:
+            raise RuntimeError(f"ERROR do servidor: {erro.result().get('message')}")
+        raise TimeoutError(f"{self.nickname}: sem {command_code.name} em {TIMEOUT:.0f}s")
+
+    # Envia um comando e mede até a mensagem esperada chegar (respostas com success=False contam como falha)
+    async def pedir(self, command_code: CommandCode, payload: dict, resposta: CommandCode, rotulo: str = None) -> dict:
+        rotulo = rotulo or command_code.name
+        inicio = time.perf_counter()
+        self.enviar(command_code, payload)
+        recebido = await self.esperar(resposta)
+        if recebido.get('success') is False:
+            raise RuntimeError(f"{rotulo} recusado: {recebido.get('message')}")
+        self.stats.registrar(rotulo, time.perf_counter() - inicio)
+        return recebido
+
+    async def fechar(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._leitor is not None:
+            self._leitor.cancel()
+
+# Roda `fluxo(*args)` contando a falha (exceção) sob o rótulo da fase
+async def protegido(stats: Estatisticas, rotulo: str, sem: asyncio.Semaphore, fluxo, *args):
+    async with sem:
+        try:
+            await fluxo(*args)
+        except (OSError, RuntimeError, TimeoutError, asyncio.IncompleteReadError) as e:
+            stats.falhou(rotulo)
+            if stats.falhas[rotulo] <= 3:
+                print(f"  falha em {rotulo}: {e}")
+
+async def fluxo_registro(cliente: ClienteSimulado, host: str, port: int):
+    await cliente.conectar(host, port)
+    await cliente.pedir(CommandCode.REGISTER, {'nickname': cliente.nickname, 'password': 'senha',
+                                               'name': f"Carga {cliente.nickname}"}, CommandCode.REGISTER_RESPONSE)
+
+async def fluxo_login(cliente: ClienteSimulado):
+    await cliente.pedir(CommandCode.LOGIN, {'nickname': cliente.nickname, 'password': 'senha'}, CommandCode.LOGIN_RESPONSE)
+
+async def fluxo_consultas(cliente: ClienteSimulado, prefixo: str):
+    await cliente.pedir(CommandCode.GET_INITIAL_DATA, {}, CommandCode.FRIEND_LIST)
+    await cliente.pedir(CommandCode.SEARCH_USER, {'nickname_query': prefixo}, CommandCode.SEARCH_RESPONSE)
+
+async def fluxo_amizade(a: ClienteSimulado, b: ClienteSimulado):
+    await a.pedir(CommandCode.ADD_FRIEND, {'target_nickname': b.nickname}, CommandCode.ADD_FRIEND_RESPONSE)
+    await b.esperar(CommandCode.INCOMING_FRIEND_REQUEST)
+    await b.pedir(CommandCode.ACCEPT_FRIEND, {'requester_nickname': a.nickname}, CommandCode.FRIEND_REQUEST_ACCEPTED)
+    await a.esperar(CommandCode.FRIEND_REQUEST_ACCEPTED)
+
+# Chamada completa: o INVITE é medido até o convite chegar ao outro lado, o ACCEPT até o CALL_ACCEPTED
+# e o BYE até o CALL_ENDED do parceiro
+async def fluxo_chamada(a: ClienteSimulado, b: ClienteSimulado):
+    inicio = time.perf_counter()
+    a.enviar(CommandCode.INVITE, {'target_nickname': b.nickname})
+    await b.esperar(CommandCode.INCOMING_CALL)
+    a.stats.registrar('INVITE', time.perf_counter() - inicio)
+    resposta = await a.esperar(CommandCode.INVITE_RESPONSE)
+    if not resposta.get('success'):
+        raise RuntimeError(f"INVITE recusado: {resposta.get('message')}")
+
+    await b.pedir(CommandCode.ACCEPT, {'caller_nickname': a.nickname}, CommandCode.CALL_ACCEPTED)
+    await a.esperar(CommandCode.CALL_ACCEPTED)
+
+    inicio = time.perf_counter()
+    a.enviar(CommandCode.BYE, {})
+    await b.esperar(CommandCode.CALL_ENDED)
+    a.stats.registrar('BYE', time.perf_counter() - inicio)
+
+async def fase(nome: str, stats: Estatisticas, tarefas, pid: int, resultados: list):
+    feitos_antes = stats.total()
+    falhas_antes = sum(stats.falhas.values())
+    inicio = time.perf_counter()
+    await asyncio.gather(*tarefas)
+    duracao = time.perf_counter() - inicio
+    feitos = stats.total() - feitos_antes
+    memoria = ler_status_processo(pid) if pid else {}
+    resultados.append((nome, feitos, sum(stats.falhas.values()) - falhas_antes, duracao, memoria))
+    rss = f", RSS do servidor {memoria['rss_kib'] / 1024:,.1f} MiB" if memoria.get('rss_kib') else ''
+    print(f"  {nome:<22}{feitos:>8,} comandos em {duracao:6.2f}s ({feitos / duracao:8,.0f}/s){rss}")
+
+async def simular(args, host: str, port: int, pid: int):
+    stats = Estatisticas()
+    sem = asyncio.Semaphore(args.concorrencia)
+    prefixo = args.prefixo
+    clientes = [ClienteSimulado(f"{prefixo}{i}", stats) for i in range(args.clientes)]
+    pares = [(clientes[i], clientes[i + 1]) for i in range(0, len(clientes) - 1, 2)]
+    resultados = []
+    base = ler_status_processo(pid) if pid else {}
+
+    print(f"Fases ({args.clientes} clientes, {len(pares)} pares, até {args.concorrencia} fluxos simultâneos):")
+    await fase('registro', stats, [protegido(stats, 'registro', sem, fluxo_registro, c, host, port) for c in clientes],
+               pid, resultados)
+    await fase('login', stats, [protegido(stats, 'login', sem, fluxo_login, c) for c in clientes], pid, resultados)
+    await fase('dados iniciais/busca', stats,
+               [protegido(stats, 'consultas', sem, fluxo_consultas, c, prefixo) for c in clientes], pid, resultados)
+    await fase('amizades', stats, [protegido(stats, 'amizade', sem, fluxo_amizade, a, b) for a, b in pares],
+               pid, resultados)
+    for rodada in range(1, args.rodadas + 1):
+        await fase(f"rodada {rodada}: chamadas", stats,
+                   [protegido(stats, 'chamada', sem, fluxo_chamada, a, b) for a, b in pares], pid, resultados)
+        await fase(f"rodada {rodada}: consultas", stats,
+                   [protegido(stats, 'consultas', sem, fluxo_consultas, c, prefixo) for c in clientes], pid, resultados)
+
+    for cliente in clientes:
+        await cliente.fechar()
+    return stats, resultados, base
+
+def relatorio(stats: Estatisticas, resultados: list, base: dict, num_clientes: int):
+    print(f"\n{'Comando':<18}{'n':>9}{'p50 (ms)':>11}{'p99 (ms)':>11}{'máx (ms)':>11}")
+    for rotulo, valores in sorted(stats.latencias.items()):
+        ordenados = sorted(valores)
+        p99 = ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.99))]
+        print(f"{rotulo:<18}{len(ordenados):>9,}{statistics.median(ordenados) * 1000:>11.2f}"
+              f"{p99 * 1000:>11.2f}{ordenados[-1] * 1000:>11.2f}")
+
+    total = sum(feitos for _, feitos, _, _, _ in resultados)
+    duracao = sum(d for _, _, _, d, _ in resultados)
+    falhas = sum(f for _, _, f, _, _ in resultados)
+    print(f"\nTotal: {total:,} comandos em {duracao:.1f}s ({total / duracao:,.0f}/s), {falhas} fluxos com falha"
+          + (f" ({', '.join(f'{k}: {v}' for k, v in stats.falhas.items())})" if falhas else ""))
+
+    memorias = [m for *_, m in resultados if m.get('rss_kib')]
+    if memorias and base.get('rss_kib'):
+        final = memorias[-1]
+        print(f"Memória do servidor: RSS {base['rss_kib'] / 1024:,.1f} MiB em repouso -> {final['rss_kib'] / 1024:,.1f} MiB "
+              f"(pico {final['pico_kib'] / 1024:,.1f} MiB), "
+              f"{(final['rss_kib'] - base['rss_kib']) / max(num_clientes, 1):,.1f} KiB por cliente, {final['threads']} threads")
+    return falhas
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de carga ponta a ponta do servidor de sinalização")
+    parser.add_argument('--clientes', type=int, default=1000)
+    parser.add_argument('--rodadas', type=int, default=2, help="Rodadas de chamadas + consultas após o login")
+    parser.add_argument('--concorrencia', type=int, default=200, help="Fluxos em andamento ao mesmo tempo")
+    parser.add_argument('--modo', choices=['thread', 'async'], default='async')
+    parser.add_argument('--port', type=int, default=18900)
+    parser.add_argument('--iteracoes-hash', type=int, default=1000,
+                        help="PASSWORD_HASH_ITERATIONS do servidor local (o padrão de produção domina o registro/login)")
+    parser.add_argument('--com-limites', action='store_true', help="Mantém o RATE_LIMITS padrão no servidor local")
+    parser.add_argument('--externo', help="HOST:PORTA de um servidor já em execução (não sobe servidor local)")
+    parser.add_argument('--pid', type=int, default=0, help="PID do servidor externo, para medir a memória")
+    parser.add_argument('--prefixo', default=f"carga{os.getpid()}_", help="Prefixo dos nicknames criados")
+    args = parser.parse_args()
+
+    aumentar_limite_arquivos(args.clientes * 2)
+    print(f"--- Benchmark: carga ponta a ponta ({args.clientes} clientes) ---\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        proc = None
+        if args.externo:
+            host, _, port = args.externo.rpartition(':')
+            port = int(port)
+            pid = args.pid
+        else:
+            host, port = HOST, args.port
+            db_path = os.path.join(tmp, 'voip.db')
+            create_db.DB_PATH = db_path
+            create_db.DB_DIR = tmp
+            create_db.setup_database()
+            env = dict(os.environ, PASSWORD_HASH_ITERATIONS=str(args.iteracoes_hash), LOG_MODE='off')
+            if not args.com_limites:
+                env['RATE_LIMITS'] = ''
+            proc = subprocess.Popen([sys.executable, '-c', SERVER_CODE, db_path, '--mode', args.modo,
+                                     '--host', HOST, '--port', str(port)],
+                                    cwd=SIGNAL_SERVER_DIR, env=env, stdout=subprocess.DEVNULL,
+                                    preexec_fn=lambda: aumentar_limite_arquivos(args.clientes * 2))
+            pid = proc.pid
+            print(f"Servidor local ({args.modo}) na porta {port}, banco temporário\n")
+            time.sleep(1.0)
+
+        try:
+            stats, resultados, base = asyncio.run(simular(args, host, port, pid))
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+
+    falhas = relatorio(stats, resultados, base, args.clientes)
+    print("\n--- Fim do Benchmark ---")
+    sys.exit(1 if falhas else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_dados_iniciais --ops 500
+#
+# Mede o custo de montar a resposta de GET_INITIAL_DATA (amigos com status + pedidos pendentes)
+# num banco temporário: o caminho antigo (três consultas e um get_user_status_str por amigo)
+# contra o novo friend_service.get_initial_data (uma consulta e uma passada pelo estado).
+# As medições são feitas com o cache de amizades frio (logo após o login) e quente.
+# Sem índice em user_nickname_b cada consulta fria percorre a tabela, por isso o padrão de operações é baixo.
+
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+
+import create_db
+import db_manager
+from friend_cache import friend_cache
+from models import state_manager
+from services import friend_service
+
+NUM_USERS = 5000
+FRIENDS_PER_USER = 100
+PENDING_PER_USER = 10
+
+def preparar_banco(db_path: str):
+    create_db.DB_PATH = db_path
+    create_db.DB_DIR = os.path.dirname(db_path)
+    create_db.setup_database()
+
+    conn = sqlite3.connect(db_path)
+    password_hash = hashlib.sha256(b'senha').hexdigest()
+    conn.executemany(
+        "INSERT INTO users (nickname, name, password_hash) VALUES (?, ?, ?)",
+        ((f"user{i}", f"Usuario {i}", password_hash) for i in range(NUM_USERS))
+    )
+    conn.executemany(
+        "INSERT INTO friendships (user_nickname_a, user_nickname_b, status) VALUES (?, ?, 'accepted')",
+        ((f"user{i}", f"user{(i + j) % NUM_USERS}") for i in range(NUM_USERS) for j in range(1, FRIENDS_PER_USER // 2 + 1))
+    )
+    deslocamento = FRIENDS_PER_USER // 2 + 1
+    conn.executemany(
+        "INSERT INTO friendships (user_nickname_a, user_nickname_b, status) VALUES (?, ?, 'pending')",
+        ((f"user{(i + deslocamento + j) % NUM_USERS}", f"user{i}") for i in range(NUM_USERS) for j in range(PENDING_PER_USER))
+    )
+    conn.commit()
+    conn.close()
+
+# Caminho antigo do handle_get_initial_data, mantido aqui como referência
+def legado_carregar(nickname):
+    with db_manager._connection() as conn:
+        friends = [r[0] for r in conn.execute(
+            "SELECT user_nickname_b FROM friendships WHERE user_nickname_a = ? AND status = 'accepted'", (nickname,))]
+        friends.extend(r[0] for r in conn.execute(
+            "SELECT user_nickname_a FROM friendships WHERE user_nickname_b = ? AND status = 'accepted'", (nickname,)))
+        pending = [r[0] for r in conn.execute(
+            "SELECT user_nickname_a FROM friendships WHERE user_nickname_b = ? AND status = 'pending'", (nickname,))]
+    return friends, pending
+
+def legado_dados_iniciais(nickname):
+    friends = friend_cache.get(nickname, legado_carregar).friends
+    friends_with_status = [{'nickname': f, 'status': state_manager.get_user_status_str(f)} for f in friends]
+    pending = friend_cache.get(nickname, legado_carregar).pending_from
+    return friends_with_status, sorted(pending)
+
+# Os amigos vêm sob demanda; a lista é consumida para medir o trabalho completo
+def novo_dados_iniciais(nickname):
+    friends, pending = friend_service.get_initial_data(nickname)
+    return list(friends), pending
+
+def medir(nome: str, operacao, ops: int, cache_frio: bool) -> float:
+    if not cache_frio:
+        for i in range(min(ops, NUM_USERS)):
+            operacao(f"user{i}")
+    inicio = time.perf_counter()
+    for i in range(ops):
+        if cache_frio:
+            friend_cache.clear()
+        operacao(f"user{i % NUM_USERS}")
+    ops_s = ops / (time.perf_counter() - inicio)
+    print(f"  {nome:<34} {ops_s:>12,.0f} ops/s")
+    return ops_s
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da resposta de dados iniciais")
+    parser.add_argument('--ops', type=int, default=500)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'voip.db')
+        preparar_banco(db_path)
+        db_manager.DB_PATH = db_path
+        db_manager.close_pool()
+
+        # Metade dos usuários online, para que os status precisem ser resolvidos no estado
+        for i in range(0, NUM_USERS, 2):
+            state_manager.add_user(f"user{i}", None)
+
+        antigo_amigos, antigo_pendentes = legado_dados_iniciais('user1')
+        novo_amigos, novo_pendentes = novo_dados_iniciais('user1')
+        key = lambda f: f['nickname']
+        assert sorted(antigo_amigos, key=key) == sorted(novo_amigos, key=key) and antigo_pendentes == novo_pendentes
+
+        print("--- Benchmark: GET_INITIAL_DATA ---")
+        print(f"\n{NUM_USERS} usuários, {FRIENDS_PER_USER} amigos e {PENDING_PER_USER} pedidos pendentes cada\n")
+        for cache_frio in (True, False):
+            print(f"Cache de amizades {'frio' if cache_frio else 'quente'}:")
+            a = medir("antigo (3 consultas + N lookups)", legado_dados_iniciais, args.ops, cache_frio)
+            b = medir("get_initial_data", novo_dados_iniciais, args.ops, cache_frio)
+            print(f"  {'ganho':<34} {b / a:>11.2f}x\n")
+
+        db_manager.close_pool()
+    print("--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_db_pool --ops 20000 --threads 8
+#
+# Compara operações/segundo do caminho antigo (sqlite3.connect a cada chamada)
+# com o pool persistente do db_manager, em um banco temporário.
+
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import config
+import create_db
+import db_manager
+
+NUM_USERS = 2000
+FRIENDS_PER_USER = 20
+
+def preparar_banco(db_path: str):
+    create_db.DB_PATH = db_path
+    create_db.DB_DIR = os.path.dirname(db_path)
+    create_db.setup_database()
+
+    conn = sqlite3.connect(db_path)
+    password_hash = hashlib.sha256(b'senha').hexdigest()
+    conn.executemany(
+        "INSERT INTO users (nickname, name, password_hash) VALUES (?, ?, ?)",
+        ((f"user{i}", f"Usuario {i}", password_hash) for i in range(NUM_USERS))
+    )
+    conn.executemany(
+        "INSERT INTO friendships (user_nickname_a, user_nickname_b, status) VALUES (?, ?, 'accepted')",
+        ((f"user{i}", f"user{(i + j) % NUM_USERS}") for i in range(NUM_USERS) for j in range(1, FRIENDS_PER_USER // 2 + 1))
+    )
+    conn.commit()
+    conn.close()
+
+# Caminho antigo: abre e fecha uma conexão por chamada
+def legado_check_login(db_path, nickname, password):
+    password_hash = hashlib.sha256(password.encode()).hexdigest()
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT nickname FROM users WHERE nickname = ? AND password_hash = ?",
+                            (nickname, password_hash)).fetchone() is not None
+    finally:
+        conn.close()
+
+def legado_get_friends(db_path, nickname):
+    conn = sqlite3.connect(db_path)
+    try:
+        friends = [r[0] for r in conn.execute(
+            "SELECT user_nickname_b FROM friendships WHERE user_nickname_a = ? AND status = 'accepted'", (nickname,))]
+        friends += [r[0] for r in conn.execute(
+            "SELECT user_nickname_a FROM friendships WHERE user_nickname_b = ? AND status = 'accepted'", (nickname,))]
+        return list(set(friends))
+    finally:
+        conn.close()
+
+def medir(nome: str, operacao, total_ops: int, num_threads: int) -> float:
+    por_thread = total_ops // num_threads
+
+    def trabalhador(tid):
+        for i in range(por_thread):
+            operacao(f"user{(tid * por_thread + i) % NUM_USERS}")
+
+    threads = [threading.Thread(target=trabalhador, args=(t,)) for t in range(num_threads)]
+    inicio = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    duracao = time.perf_counter() - inicio
+    ops_s = (por_thread * num_threads) / duracao
+    print(f"  {nome:<40} {ops_s:>12,.0f} ops/s")
+    return ops_s
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark: pool SQLite vs conexão por chamada")
+    parser.add_argument('--ops', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # Mede o custo de acesso ao banco, não o do KDF: os hashes antigos são convertidos com uma única iteração
+    config.PASSWORD_HASH_ITERATIONS = 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'voip.db')
+        preparar_banco(db_path)
+        db_manager.DB_PATH = db_path
+        db_manager.close_pool()
+
+        print("--- Benchmark: Pool de Conexões SQLite ---")
+        for num_threads in (1, args.threads):
+            print(f"\n{num_threads} thread(s), {args.ops} operações:")
+            a = medir("check_login (connect por chamada)", lambda n: legado_check_login(db_path, n, 'senha'), args.ops, num_threads)
+            b = medir("check_login (pool)", lambda n: db_manager.check_login(n, 'senha'), args.ops, num_threads)
+            print(f"  {'ganho':<40} {b / a:>11.2f}x")
+            a = medir("get_friends_list_db (connect por chamada)", lambda n: legado_get_friends(db_path, n), args.ops, num_threads)
+            b = medir("get_friends_list_db (pool)", db_manager.get_friends_list_db, args.ops, num_threads)
+            print(f"  {'ganho':<40} {b / a:>11.2f}x")
+
+        db_manager.close_pool()
+    print("\n--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
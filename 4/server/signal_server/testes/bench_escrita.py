@@ -0,0 +1,110 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_escrita --taxa 1000 --segundos 5
+#
+# Tempestade de pedidos de amizade vindos de várias threads (como os handlers do modo thread),
+# num banco temporário em disco: o caminho antigo (um commit, e um fsync, por pedido) contra a fila
+# de escrita do db_manager, que agrupa os pedidos em transações. Mede a vazão atingida e a latência
+# até a confirmação durável, com a taxa alvo (ex.: 1000/s) e sem limite de taxa (--taxa 0 na segunda rodada).
+
+import argparse
+import logging
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+import create_db
+import db_manager
+
+NUM_USERS = 20000
+
+def preparar_banco(db_path: str):
+    create_db.DB_PATH = db_path
+    create_db.DB_DIR = os.path.dirname(db_path)
+    create_db.setup_database()
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO users (nickname, name, password_hash) VALUES (?, ?, 'x')",
+                     ((f"user{i}", f"Usuario {i}") for i in range(NUM_USERS)))
+    conn.commit()
+    conn.close()
+
+# Caminho antigo do add_friend_request_db, mantido aqui como referência
+def legado_add_friend(requester, target):
+    with db_manager._connection() as conn:
+        if conn.execute(db_manager.SQL_FRIENDSHIP_EXISTS, (requester, target, target, requester)).fetchone():
+            return (False, "Já existe uma relação (amigo ou pendente).")
+        conn.execute(db_manager.SQL_INSERT_FRIEND_REQUEST, (requester, target))
+        conn.commit()
+    return (True, "Pedido de amizade enviado.")
+
+def tempestade(operacao, taxa: float, segundos: float, num_threads: int, rodada: int):
+    total = int(taxa * segundos) if taxa > 0 else 4000
+    por_thread = total // num_threads
+    latencias = [[] for _ in range(num_threads)]
+    falhas = [0] * num_threads
+    intervalo = num_threads / taxa if taxa > 0 else 0.0
+    inicio = time.perf_counter() + 0.05
+
+    def trabalhador(tid):
+        for k in range(por_thread):
+            alvo = inicio + k * intervalo
+            espera = alvo - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            n = tid * por_thread + k
+            # Cada pedido é um par novo; a rodada desloca os pares para não colidir com as anteriores
+            requester = f"user{n % NUM_USERS}"
+            target = f"user{(n + 1 + rodada * 7 + n // NUM_USERS) % NUM_USERS}"
+            t0 = time.perf_counter()
+            sucesso, _ = operacao(requester, target)
+            latencias[tid].append(time.perf_counter() - t0)
+            if not sucesso:
+                falhas[tid] += 1
+
+    threads = [threading.Thread(target=trabalhador, args=(t,)) for t in range(num_threads)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    duracao = time.perf_counter() - inicio
+    todas = sorted(l for lista in latencias for l in lista)
+    p99 = todas[min(len(todas) - 1, int(len(todas) * 0.99))]
+    return len(todas) / duracao, statistics.median(todas) * 1000, p99 * 1000, sum(falhas)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escrita em lote de pedidos de amizade")
+    parser.add_argument('--taxa', type=float, default=1000, help="pedidos por segundo (0 = sem limite)")
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory(dir=os.getcwd()) as tmp:
+        db_path = os.path.join(tmp, 'voip.db')
+        preparar_banco(db_path)
+        logging.getLogger().setLevel(logging.WARNING)
+        db_manager.DB_PATH = db_path
+        db_manager.close_pool()
+
+        print("--- Benchmark: tempestade de pedidos de amizade ---\n")
+        print(f"{'Cenário':<34}{'pedidos/s':>11}{'p50 (ms)':>10}{'p99 (ms)':>10}{'falhas':>8}")
+        rodada = 0
+        for taxa in (args.taxa, 0):
+            rotulo_taxa = f"{taxa:.0f}/s" if taxa > 0 else "sem limite"
+            for nome, operacao in (("commit por pedido", legado_add_friend),
+                                   ("fila de escrita", db_manager.add_friend_request_db)):
+                rodada += 1
+                antes = db_manager.write_metrics()
+                vazao, p50, p99, falhas = tempestade(operacao, taxa, args.segundos, args.threads, rodada)
+                depois = db_manager.write_metrics()
+                print(f"{nome + ' (' + rotulo_taxa + ')':<34}{vazao:>11,.0f}{p50:>10.2f}{p99:>10.2f}{falhas:>8}")
+                lotes = depois['batches'] - antes['batches']
+                if lotes:
+                    print(f"{'':<4}{lotes} transações, média de {(depois['jobs'] - antes['jobs']) / lotes:.1f} pedidos por commit")
+
+        db_manager.close_pool()
+    print("\n--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_flood --clientes 50 --modo async --segundos 5
+#
+# Um cliente abusivo (uma conexão logada mandando SEARCH_USER e ADD_FRIEND sem parar) contra clientes
+# normais que fazem uma busca a cada 500 ms e medem a latência. Compara três cenários no servidor em
+# subprocesso: sem flood, flood sem limite (RATE_LIMITS vazio) e flood com os limites padrão.
+# O teste falha se, com o limite ligado, o p99 dos clientes normais passar de --tolerancia vezes o p99 sem flood.
+
+import argparse
+import os
+import socket
+import sqlite3
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import config
+import create_db
+import passwords
+from protocol import CommandCode, protocol
+
+SIGNAL_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HOST = '127.0.0.1'
+FMT_HEADER = struct.Struct('!BH')
+NUM_USUARIOS = 50000
+
+# Sobe o servidor apontando o banco para o arquivo temporário
+SERVER_CODE = """
+import sys, db_manager, server
+db_manager.DB_PATH = sys.argv.pop(1)
+server.main()
+"""
+
+def preparar_banco(db_path: str):
+    create_db.DB_PATH = db_path
+    create_db.DB_DIR = os.path.dirname(db_path)
+    create_db.setup_database()
+    config.PASSWORD_HASH_ITERATIONS = 1
+    password_hash = passwords.hash_password('senha')
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO users (nickname, name, password_hash) VALUES (?, ?, ?)",
+                     ((f"user{i}", f"Usuario {i}", password_hash) for i in range(NUM_USUARIOS)))
+    conn.commit()
+    conn.close()
+
+def esperar_porta(port: int, timeout: float = 10.0):
+    fim = time.time() + timeout
+    while time.time() < fim:
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Servidor não iniciou na porta {port}")
+
+def ler_frame(sock) -> int:
+    header = sock.recv(3, socket.MSG_WAITALL)
+    if len(header) < 3:
+        raise ConnectionError("Servidor fechou a conexão")
+    command_value, tamanho = FMT_HEADER.unpack(header)
+    if tamanho:
+        sock.recv(tamanho, socket.MSG_WAITALL)
+    return command_value
+
+def logar(port: int, nickname: str) -> socket.socket:
+    sock = socket.create_connection((HOST, port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.sendall(protocol.create_message(CommandCode.LOGIN, {'nickname': nickname, 'password': 'senha'}))
+    while ler_frame(sock) != CommandCode.LOGIN_RESPONSE:
+        pass
+    return sock
+
+# Cliente normal: uma busca a cada `intervalo` segundos, dentro do orçamento
+def cliente_normal(sock, parar: threading.Event, intervalo: float, fase: float, latencias: list):
+    pedido = protocol.create_message(CommandCode.SEARCH_USER, {'nickname_query': 'user12'})
+    time.sleep(fase)
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        sock.sendall(pedido)
+        while ler_frame(sock) != CommandCode.SEARCH_RESPONSE:
+            pass
+        latencias.append(time.perf_counter() - inicio)
+        time.sleep(max(0.0, intervalo - (time.perf_counter() - inicio)))
+
+# Cliente abusivo: escreve lotes de comandos sem esperar; outra thread lê e conta as respostas
+def cliente_flood(sock, parar: threading.Event, contagem: dict):
+    lote = b''.join(protocol.create_message(CommandCode.SEARCH_USER, {'nickname_query': 'user'}) if i % 2 else
+                    protocol.create_message(CommandCode.ADD_FRIEND, {'target_nickname': f"user{NUM_USUARIOS - 1 - i}"})
+                    for i in range(64))
+
+    def leitor():
+        try:
+            while True:
+                code = ler_frame(sock)
+                chave = 'erros' if code == CommandCode.ERROR else 'atendidos'
+                contagem[chave] = contagem.get(chave, 0) + 1
+        except (ConnectionError, OSError):
+            pass
+
+    thread = threading.Thread(target=leitor, daemon=True)
+    thread.start()
+    try:
+        while not parar.is_set():
+            sock.sendall(lote)
+            contagem['enviados'] = contagem.get('enviados', 0) + 64
+    except OSError:
+        contagem['desconectado'] = True
+
+def executar(modo: str, db_path: str, port: int, num_clientes: int, segundos: float, flood: bool,
+             rate_limits: str, rotulo: str):
+    env = dict(os.environ, PASSWORD_HASH_ITERATIONS='1', RATE_LIMITS=rate_limits)
+    proc = subprocess.Popen([sys.executable, '-c', SERVER_CODE, db_path, '--mode', modo, '--host', HOST,
+                             '--port', str(port)],
+                            cwd=SIGNAL_SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        esperar_porta(port)
+        sockets = [logar(port, f"user{i}") for i in range(num_clientes)]
+        parar = threading.Event()
+        latencias = [[] for _ in range(num_clientes)]
+        intervalo = 0.5
+        threads = [threading.Thread(target=cliente_normal,
+                                    args=(sock, parar, intervalo, intervalo * i / num_clientes, latencias[i]))
+                   for i, sock in enumerate(sockets)]
+        contagem = {}
+        if flood:
+            threads.append(threading.Thread(target=cliente_flood, args=(logar(port, 'user49999'), parar, contagem)))
+        for t in threads: t.start()
+        time.sleep(segundos)
+        parar.set()
+        for t in threads: t.join()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    todas = sorted(l for lista in latencias for l in lista)
+    p99 = todas[min(len(todas) - 1, int(len(todas) * 0.99))]
+    print(f"{rotulo:<26}p50 {statistics.median(todas) * 1000:7.2f} ms   p99 {p99 * 1000:7.2f} ms   ({len(todas)} buscas)")
+    if flood:
+        extra = "; desconectado pelo servidor" if contagem.get('desconectado') else ""
+        print(f"{'':<26}abusivo: {contagem.get('enviados', 0):,} comandos enviados, {contagem.get('atendidos', 0):,} atendidos, "
+              f"{contagem.get('erros', 0):,} ERROR com retry_after{extra}")
+    return p99
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência dos clientes normais sob flood de uma conexão")
+    parser.add_argument('--clientes', type=int, default=50)
+    parser.add_argument('--modo', choices=['thread', 'async'], default='async')
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--tolerancia', type=float, default=3.0)
+    parser.add_argument('--port', type=int, default=18897)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'voip.db')
+        preparar_banco(db_path)
+        print(f"--- Benchmark: flood de uma conexão (modo {args.modo}, {args.clientes} clientes normais) ---\n")
+        base = executar(args.modo, db_path, args.port, args.clientes, args.segundos, False, config.RATE_LIMITS, "sem flood")
+        executar(args.modo, db_path, args.port, args.clientes, args.segundos, True, '', "flood, sem limite")
+        limitado = executar(args.modo, db_path, args.port, args.clientes, args.segundos, True, config.RATE_LIMITS,
+                            "flood, com limite")
+        ok = limitado <= base * args.tolerancia
+        print(f"\nResultado: p99 com limite = {limitado / base:.1f}x o p99 sem flood "
+              f"({'OK' if ok else 'FALHOU'}, tolerância {args.tolerancia}x)")
+    print("\n--- Fim do Benchmark ---")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
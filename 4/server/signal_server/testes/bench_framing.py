@@ -0,0 +1,91 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_framing --frames 200000
+#
+# Compara a leitura de frames '!BH' com o recvall antigo (dois recv por mensagem)
+# e com o FrameReader (um recv_into por lote), usando um socketpair e clientes
+# que enviam vários comandos em sequência sem esperar resposta (pipelining).
+
+import argparse
+import socket
+import struct
+import threading
+import time
+
+from framing import FrameReader
+from protocol import CommandCode, protocol
+
+# Implementação anterior do handle_client, mantida aqui como referência
+def recvall(conn, n):
+    data = bytearray()
+    while len(data) < n:
+        packet = conn.recv(n - len(data))
+        if not packet:
+            return None
+        data.extend(packet)
+    return data
+
+def ler_com_recvall(sock, total):
+    lidos = 0
+    while lidos < total:
+        header = recvall(sock, 3)
+        if not header:
+            break
+        _, payload_length = struct.unpack('!BH', header)
+        payload = recvall(sock, payload_length) if payload_length > 0 else b''
+        if payload is None:
+            break
+        lidos += 1
+    return lidos
+
+def ler_com_frame_reader(sock, total):
+    reader = FrameReader(sock)
+    lidos = 0
+    while lidos < total:
+        frames = reader.read_frames()
+        if frames is None:
+            break
+        lidos += len(frames)
+    return lidos
+
+# O cliente envia `profundidade` frames por write, como um cliente que não espera as respostas
+def enviar(sock, frame, total, profundidade):
+    lote = frame * profundidade
+    enviados = 0
+    while enviados < total:
+        n = min(profundidade, total - enviados)
+        sock.sendall(lote if n == profundidade else frame * n)
+        enviados += n
+
+def medir(leitor, frame, total, profundidade):
+    servidor, cliente = socket.socketpair()
+    escritor = threading.Thread(target=enviar, args=(cliente, frame, total, profundidade))
+    inicio = time.perf_counter()
+    escritor.start()
+    lidos = leitor(servidor, total)
+    duracao = time.perf_counter() - inicio
+    escritor.join()
+    servidor.close()
+    cliente.close()
+    assert lidos == total, f"esperava {total} frames, li {lidos}"
+    return total / duracao
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de leitura de frames: recvall vs FrameReader")
+    parser.add_argument('--frames', type=int, default=200000)
+    parser.add_argument('--profundidades', type=int, nargs='+', default=[1, 8, 64])
+    args = parser.parse_args()
+
+    frame = protocol.create_message(CommandCode.STATUS_UPDATE, {'nickname': 'amigo_1', 'status': 'Online'})
+
+    print("--- Benchmark: leitura de frames ---\n")
+    print(f"Frame de {len(frame)} bytes, {args.frames} frames por medição\n")
+    print(f"{'Pipeline':>9}{'recvall frames/s':>20}{'FrameReader frames/s':>24}{'ganho':>9}")
+    for profundidade in args.profundidades:
+        antigo = medir(ler_com_recvall, frame, args.frames, profundidade)
+        novo = medir(ler_com_frame_reader, frame, args.frames, profundidade)
+        print(f"{profundidade:>9}{antigo:>20,.0f}{novo:>24,.0f}{novo / antigo:>8.1f}x")
+
+    print("\n--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_listas_grandes --amigos 1000 5000 20000 --modo async
+#
+# Listas maiores que um frame (cabeçalho !BH: payload de até 65535 bytes). Primeiro compara, em memória,
+# o frame único de FRIEND_LIST (que estoura o limite) com o serializador em pedaços (pico de memória e
+# tempo). Depois sobe o servidor com um usuário que tem N amigos e N/10 pedidos pendentes, pede
+# GET_INITIAL_DATA e confere se a lista chega completa, acumulando os frames até o que vem sem `more`.
+
+import argparse
+import logging
+import os
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import config
+import create_db
+import passwords
+from protocol import CommandCode, protocol
+
+SIGNAL_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HOST = '127.0.0.1'
+FMT_HEADER = struct.Struct('!BH')
+
+# Sobe o servidor apontando o banco para o arquivo temporário
+SERVER_CODE = """
+import sys, db_manager, server
+db_manager.DB_PATH = sys.argv.pop(1)
+server.main()
+"""
+
+def amigos_de_exemplo(num_amigos: int):
+    return ({'nickname': f"amigo_{i:06d}", 'status': 'Offline'} for i in range(num_amigos))
+
+def frame_unico(num_amigos: int) -> str:
+    try:
+        frame = protocol.create_message(CommandCode.FRIEND_LIST, {'friends': list(amigos_de_exemplo(num_amigos))})
+        return f"{len(frame):,} bytes"
+    except ValueError:
+        return "excede o frame"
+
+def em_pedacos(num_amigos: int) -> str:
+    frames = total = 0
+    for frame in protocol.iter_chunked_messages(CommandCode.FRIEND_LIST, amigos_de_exemplo(num_amigos)):
+        frames += 1
+        total += len(frame)
+    return f"{frames:3} frames, {total:>9,} bytes"
+
+# Tempo sem o tracemalloc (que distorce a medição) e pico de memória com ele
+def medir(operacao, num_amigos: int):
+    inicio = time.perf_counter()
+    resultado = operacao(num_amigos)
+    tempo = time.perf_counter() - inicio
+    tracemalloc.start()
+    operacao(num_amigos)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return resultado, tempo, pico
+
+def em_memoria(num_amigos: int):
+    unico, tempo_unico, pico_unico = medir(frame_unico, num_amigos)
+    pedacos, tempo_pedacos, pico_pedacos = medir(em_pedacos, num_amigos)
+    print(f"{num_amigos:>8,} amigos   frame único: {unico:<15} pico {pico_unico / 1024:7,.0f} KiB "
+          f"{tempo_unico * 1000:6.1f} ms   em pedaços: {pedacos}, pico {pico_pedacos / 1024:5,.0f} KiB "
+          f"{tempo_pedacos * 1000:6.1f} ms")
+
+def preparar_banco(db_path: str, num_amigos: int):
+    create_db.DB_PATH = db_path
+    create_db.DB_DIR = os.path.dirname(db_path)
+    create_db.setup_database()
+    config.PASSWORD_HASH_ITERATIONS = 1
+    password_hash = passwords.hash_password('senha')
+    num_pendentes = num_amigos // 10
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO users (nickname, name, password_hash) VALUES ('dono', 'Dono', ?)", (password_hash,))
+    conn.executemany("INSERT INTO users (nickname, name, password_hash) VALUES (?, ?, ?)",
+                     ((f"amigo_{i:06d}", f"Amigo {i}", password_hash) for i in range(num_amigos + num_pendentes)))
+    conn.executemany("INSERT INTO friendships (user_nickname_a, user_nickname_b, status) VALUES ('dono', ?, 'accepted')",
+                     ((f"amigo_{i:06d}",) for i in range(num_amigos)))
+    conn.executemany("INSERT INTO friendships (user_nickname_a, user_nickname_b, status) VALUES (?, 'dono', 'pending')",
+                     ((f"amigo_{i:06d}",) for i in range(num_amigos, num_amigos + num_pendentes)))
+    conn.commit()
+    conn.close()
+    return num_pendentes
+
+def esperar_porta(port: int, timeout: float = 10.0):
+    fim = time.time() + timeout
+    while time.time() < fim:
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Servidor não iniciou na porta {port}")
+
+def ler_frame(sock):
+    header = sock.recv(3, socket.MSG_WAITALL)
+    if len(header) < 3:
+        raise ConnectionError("Servidor fechou a conexão")
+    command_value, tamanho = FMT_HEADER.unpack(header)
+    payload = sock.recv(tamanho, socket.MSG_WAITALL) if tamanho else b''
+    return CommandCode(command_value), payload
+
+# Acumula os pedaços das duas listas até receber o último frame (sem `more`) de cada uma
+def receber_listas(sock, esperar_pendentes: bool):
+    itens = {CommandCode.FRIEND_LIST: [], CommandCode.PENDING_FRIEND_REQUESTS: []}
+    frames = {CommandCode.FRIEND_LIST: 0, CommandCode.PENDING_FRIEND_REQUESTS: 0}
+    faltam = {CommandCode.FRIEND_LIST} | ({CommandCode.PENDING_FRIEND_REQUESTS} if esperar_pendentes else set())
+    primeiro = None
+    while faltam:
+        command_code, payload_bytes = ler_frame(sock)
+        if command_code not in itens:
+            continue
+        if primeiro is None:
+            primeiro = time.perf_counter()
+        payload = protocol.deserialize_payload(command_code, payload_bytes)
+        itens[command_code].extend(payload['friends' if command_code == CommandCode.FRIEND_LIST else 'requests_from'])
+        frames[command_code] += 1
+        if not payload.get('more'):
+            faltam.discard(command_code)
+    return itens, frames, primeiro
+
+def no_servidor(modo: str, num_amigos: int, port: int) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'voip.db')
+        num_pendentes = preparar_banco(db_path, num_amigos)
+        env = dict(os.environ, PASSWORD_HASH_ITERATIONS='1', RATE_LIMITS='')
+        proc = subprocess.Popen([sys.executable, '-c', SERVER_CODE, db_path, '--mode', modo, '--host', HOST,
+                                 '--port', str(port), '--log-mode', 'off'],
+                                cwd=SIGNAL_SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            esperar_porta(port)
+            with socket.create_connection((HOST, port)) as sock:
+                sock.sendall(protocol.create_message(CommandCode.LOGIN, {'nickname': 'dono', 'password': 'senha'}))
+                while ler_frame(sock)[0] != CommandCode.LOGIN_RESPONSE:
+                    pass
+                inicio = time.perf_counter()
+                sock.sendall(protocol.create_message(CommandCode.GET_INITIAL_DATA, {}))
+                itens, frames, primeiro = receber_listas(sock, num_pendentes > 0)
+                fim = time.perf_counter()
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    amigos = itens[CommandCode.FRIEND_LIST]
+    pendentes = itens[CommandCode.PENDING_FRIEND_REQUESTS]
+    completo = (sorted(a['nickname'] for a in amigos) == [f"amigo_{i:06d}" for i in range(num_amigos)]
+                and len(pendentes) == num_pendentes)
+    print(f"{num_amigos:>8,} amigos   FRIEND_LIST: {frames[CommandCode.FRIEND_LIST]:3} frames, {len(amigos):>7,} itens   "
+          f"pendentes: {frames[CommandCode.PENDING_FRIEND_REQUESTS]:2} frames, {len(pendentes):>6,} itens   "
+          f"primeiro pedaço {(primeiro - inicio) * 1000:7.1f} ms, total {(fim - inicio) * 1000:7.1f} ms   "
+          f"{'OK' if completo else 'INCOMPLETA'}")
+    return completo
+
+def main():
+    parser = argparse.ArgumentParser(description="Listas de amigos maiores que um frame, enviadas em pedaços")
+    parser.add_argument('--amigos', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--modo', choices=['thread', 'async'], default='async')
+    parser.add_argument('--port', type=int, default=18900)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    print("--- Benchmark: listas maiores que um frame ---\n")
+    print("Serialização em memória:")
+    for num_amigos in args.amigos:
+        em_memoria(num_amigos)
+
+    print(f"\nGET_INITIAL_DATA no servidor ({args.modo}):")
+    ok = True
+    for num_amigos in args.amigos:
+        ok = no_servidor(args.modo, num_amigos, args.port) and ok
+    print("\n--- Fim do Benchmark ---")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_logging --clientes 32 --modo async --segundos 5
+#
+# Vazão do servidor (mensagens/s) conforme o modo de logging: 'off' (só avisos e erros), 'dev'
+# (cada registro escrito de forma síncrona) e 'production' (thread escritora + amostragem dos logs
+# por frame). Clientes logados repetem GET_INITIAL_DATA em ciclo fechado, o que gera um log por frame
+# e um por serviço. O stderr do servidor vai para um arquivo, como num servidor real.
+
+import argparse
+import os
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import config
+import create_db
+import passwords
+from protocol import CommandCode, protocol
+
+SIGNAL_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HOST = '127.0.0.1'
+FMT_HEADER = struct.Struct('!BH')
+
+# Sobe o servidor apontando o banco para o arquivo temporário
+SERVER_CODE = """
+import sys, db_manager, server
+db_manager.DB_PATH = sys.argv.pop(1)
+server.main()
+"""
+
+def preparar_banco(db_path: str, num_usuarios: int):
+    create_db.DB_PATH = db_path
+    create_db.DB_DIR = os.path.dirname(db_path)
+    create_db.setup_database()
+    config.PASSWORD_HASH_ITERATIONS = 1
+    password_hash = passwords.hash_password('senha')
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO users (nickname, name, password_hash) VALUES (?, ?, ?)",
+                     ((f"user{i}", f"Usuario {i}", password_hash) for i in range(num_usuarios)))
+    # Cada usuário com alguns amigos, para o FRIEND_LIST não ser vazio
+    conn.executemany("INSERT INTO friendships (user_nickname_a, user_nickname_b, status) VALUES (?, ?, 'accepted')",
+                     ((f"user{i}", f"user{(i + k) % num_usuarios}") for i in range(num_usuarios) for k in (1, 2, 3)))
+    conn.commit()
+    conn.close()
+
+def esperar_porta(port: int, timeout: float = 10.0):
+    fim = time.time() + timeout
+    while time.time() < fim:
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Servidor não iniciou na porta {port}")
+
+def ler_frame(sock) -> int:
+    header = sock.recv(3, socket.MSG_WAITALL)
+    if len(header) < 3:
+        raise ConnectionError("Servidor fechou a conexão")
+    command_value, tamanho = FMT_HEADER.unpack(header)
+    if tamanho:
+        sock.recv(tamanho, socket.MSG_WAITALL)
+    return command_value
+
+def logar(port: int, nickname: str) -> socket.socket:
+    sock = socket.create_connection((HOST, port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.sendall(protocol.create_message(CommandCode.LOGIN, {'nickname': nickname, 'password': 'senha'}))
+    while ler_frame(sock) != CommandCode.LOGIN_RESPONSE:
+        pass
+    return sock
+
+def cliente(sock, parar: threading.Event, contagem: list, i: int):
+    pedido = protocol.create_message(CommandCode.GET_INITIAL_DATA, {})
+    feitos = 0
+    while not parar.is_set():
+        sock.sendall(pedido)
+        while ler_frame(sock) != CommandCode.FRIEND_LIST:
+            pass
+        feitos += 1
+    contagem[i] = feitos
+
+def executar(modo_servidor: str, modo_log: str, db_path: str, log_path: str, port: int, num_clientes: int,
+             segundos: float, amostragem: int):
+    env = dict(os.environ, PASSWORD_HASH_ITERATIONS='1', RATE_LIMITS='')
+    with open(log_path, 'w') as log_file:
+        proc = subprocess.Popen([sys.executable, '-c', SERVER_CODE, db_path, '--mode', modo_servidor,
+                                 '--host', HOST, '--port', str(port), '--log-mode', modo_log,
+                                 '--log-sample', str(amostragem)],
+                                cwd=SIGNAL_SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=log_file)
+        try:
+            esperar_porta(port)
+            sockets = [logar(port, f"user{i}") for i in range(num_clientes)]
+            # Aquecimento: popula o cache de amizades antes da medição
+            for sock in sockets:
+                sock.sendall(protocol.create_message(CommandCode.GET_INITIAL_DATA, {}))
+                while ler_frame(sock) != CommandCode.FRIEND_LIST:
+                    pass
+
+            parar = threading.Event()
+            contagem = [0] * num_clientes
+            threads = [threading.Thread(target=cliente, args=(sock, parar, contagem, i)) for i, sock in enumerate(sockets)]
+            inicio = time.perf_counter()
+            for t in threads: t.start()
+            time.sleep(segundos)
+            parar.set()
+            for t in threads: t.join()
+            duracao = time.perf_counter() - inicio
+            for sock in sockets:
+                sock.close()
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    tamanho_log = os.path.getsize(log_path)
+    return sum(contagem) / duracao, tamanho_log
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão do servidor com logging desligado, síncrono e em fila")
+    parser.add_argument('--clientes', type=int, default=32)
+    parser.add_argument('--modo', choices=['thread', 'async'], default='async')
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--amostragem', type=int, default=config.LOG_FRAME_SAMPLE_EVERY,
+                        help="1 a cada N logs por frame no modo production")
+    parser.add_argument('--port', type=int, default=18898)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'voip.db')
+        log_path = os.path.join(tmp, 'server.log')
+        preparar_banco(db_path, max(args.clientes, 4))
+        print(f"--- Benchmark: logging no caminho quente (servidor {args.modo}, {args.clientes} clientes) ---\n")
+        resultados = {}
+        for modo_log in ('off', 'dev', 'production'):
+            vazao, tamanho_log = executar(args.modo, modo_log, db_path, log_path, args.port, args.clientes,
+                                          args.segundos, args.amostragem)
+            resultados[modo_log] = vazao
+            print(f"{modo_log:<12}{vazao:10,.0f} mensagens/s   log: {tamanho_log / 1024:8,.0f} KiB")
+
+        print(f"\nCusto do logging síncrono: {1 - resultados['dev'] / resultados['off']:.0%} da vazão; "
+              f"modo production: {1 - resultados['production'] / resultados['off']:.0%} "
+              f"(amostragem 1/{args.amostragem})")
+    print("\n--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
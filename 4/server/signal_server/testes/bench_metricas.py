@@ -0,0 +1,184 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_metricas --clientes 32 --modo async --segundos 5
+#
+# Custo da instrumentação (metrics.py). Primeiro o custo de cada operação isolada (histograma, contadores,
+# lock cronometrado, decorador do banco); depois a vazão do servidor com METRICS_ENABLED=0 e =1, com
+# clientes repetindo GET_INITIAL_DATA e SEARCH_USER em ciclo fechado (logging em modo 'off' nos dois casos).
+
+import argparse
+import os
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import urllib.request
+
+import config
+import create_db
+import passwords
+from metrics import _Metrics
+from protocol import CommandCode, protocol
+
+SIGNAL_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HOST = '127.0.0.1'
+FMT_HEADER = struct.Struct('!BH')
+
+# Sobe o servidor apontando o banco para o arquivo temporário
+SERVER_CODE = """
+import sys, db_manager, server
+db_manager.DB_PATH = sys.argv.pop(1)
+server.main()
+"""
+
+def custo_ns(stmt, number: int = 200000) -> float:
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e9
+
+def micro():
+    ligado = _Metrics(True)
+    lock_simples = threading.Lock()
+    lock_medido = ligado.new_lock()
+    funcao = lambda: None
+    funcao_medida = ligado.timed_db(funcao)
+
+    def com_lock_simples():
+        with lock_simples:
+            pass
+
+    def com_lock_medido():
+        with lock_medido:
+            pass
+
+    histograma = custo_ns(lambda: ligado.observe_command(CommandCode.SEARCH_USER, 0.0003))
+    contador = custo_ns(lambda: ligado.count_out(CommandCode.FRIEND_LIST, 120))
+    lock_sem, lock_com = custo_ns(com_lock_simples), custo_ns(com_lock_medido)
+    banco_sem, banco_com = custo_ns(funcao), custo_ns(funcao_medida)
+    print("Custo por operação (ns):")
+    print(f"  histograma de comando        {histograma:7.0f}")
+    print(f"  contador de frames/bytes     {contador:7.0f}")
+    print(f"  lock do shard (sem / com)    {lock_sem:7.0f} / {lock_com:.0f}")
+    print(f"  chamada ao banco (sem / com) {banco_sem:7.0f} / {banco_com:.0f}")
+    inicio = time.perf_counter()
+    texto = ligado.render()
+    print(f"  coleta completa (/metrics)   {(time.perf_counter() - inicio) * 1e6:7.0f} µs, {len(texto):,} bytes\n")
+    # Uma mensagem do benchmark: frame recebido, comando, frame enviado, uma chamada ao banco e um lock
+    return histograma + 2 * contador + max(0.0, lock_com - lock_sem) + (banco_com - banco_sem)
+
+def preparar_banco(db_path: str, num_usuarios: int):
+    create_db.DB_PATH = db_path
+    create_db.DB_DIR = os.path.dirname(db_path)
+    create_db.setup_database()
+    config.PASSWORD_HASH_ITERATIONS = 1
+    password_hash = passwords.hash_password('senha')
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO users (nickname, name, password_hash) VALUES (?, ?, ?)",
+                     ((f"user{i}", f"Usuario {i}", password_hash) for i in range(num_usuarios)))
+    conn.executemany("INSERT INTO friendships (user_nickname_a, user_nickname_b, status) VALUES (?, ?, 'accepted')",
+                     ((f"user{i}", f"user{(i + k) % num_usuarios}") for i in range(num_usuarios) for k in (1, 2, 3)))
+    conn.commit()
+    conn.close()
+
+def esperar_porta(port: int, timeout: float = 10.0):
+    fim = time.time() + timeout
+    while time.time() < fim:
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Servidor não iniciou na porta {port}")
+
+def ler_frame(sock) -> int:
+    header = sock.recv(3, socket.MSG_WAITALL)
+    if len(header) < 3:
+        raise ConnectionError("Servidor fechou a conexão")
+    command_value, tamanho = FMT_HEADER.unpack(header)
+    if tamanho:
+        sock.recv(tamanho, socket.MSG_WAITALL)
+    return command_value
+
+def logar(port: int, nickname: str) -> socket.socket:
+    sock = socket.create_connection((HOST, port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.sendall(protocol.create_message(CommandCode.LOGIN, {'nickname': nickname, 'password': 'senha'}))
+    while ler_frame(sock) != CommandCode.LOGIN_RESPONSE:
+        pass
+    return sock
+
+def cliente(sock, parar: threading.Event, contagem: list, i: int):
+    pedidos = ((protocol.create_message(CommandCode.GET_INITIAL_DATA, {}), CommandCode.FRIEND_LIST),
+               (protocol.create_message(CommandCode.SEARCH_USER, {'nickname_query': 'user1'}), CommandCode.SEARCH_RESPONSE))
+    feitos = 0
+    while not parar.is_set():
+        pedido, resposta = pedidos[feitos % 2]
+        sock.sendall(pedido)
+        while ler_frame(sock) != resposta:
+            pass
+        feitos += 1
+    contagem[i] = feitos
+
+def executar(modo: str, ligado: bool, db_path: str, port: int, num_clientes: int, segundos: float):
+    env = dict(os.environ, PASSWORD_HASH_ITERATIONS='1', RATE_LIMITS='', METRICS_ENABLED='1' if ligado else '0')
+    args = [sys.executable, '-c', SERVER_CODE, db_path, '--mode', modo, '--host', HOST, '--port', str(port),
+            '--log-mode', 'off']
+    if ligado:
+        args += ['--metrics-port', str(port + 1)]
+    proc = subprocess.Popen(args, cwd=SIGNAL_SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        esperar_porta(port)
+        sockets = [logar(port, f"user{i}") for i in range(num_clientes)]
+        parar = threading.Event()
+        contagem = [0] * num_clientes
+        threads = [threading.Thread(target=cliente, args=(sock, parar, contagem, i)) for i, sock in enumerate(sockets)]
+        inicio = time.perf_counter()
+        for t in threads: t.start()
+        time.sleep(segundos)
+        parar.set()
+        for t in threads: t.join()
+        duracao = time.perf_counter() - inicio
+        amostra = ''
+        if ligado:
+            texto = urllib.request.urlopen(f"http://{HOST}:{port + 1}/metrics", timeout=5).read().decode()
+            amostra = next(linha for linha in texto.splitlines() if linha.startswith('voip_frames_received_total '))
+        for sock in sockets:
+            sock.close()
+    finally:
+        proc.terminate()
+        proc.wait()
+    return sum(contagem) / duracao, amostra
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo da instrumentação de métricas do servidor")
+    parser.add_argument('--clientes', type=int, default=32)
+    parser.add_argument('--modo', choices=['thread', 'async'], default='async')
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--rodadas', type=int, default=2, help="Rodadas alternadas de cada configuração")
+    parser.add_argument('--port', type=int, default=18899)
+    args = parser.parse_args()
+
+    print(f"--- Benchmark: custo das métricas (servidor {args.modo}, {args.clientes} clientes) ---\n")
+    custo_mensagem = micro()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'voip.db')
+        preparar_banco(db_path, max(args.clientes, 4))
+        vazoes = {False: [], True: []}
+        # Alterna as configurações para que variações da máquina afetem as duas igualmente
+        for _ in range(args.rodadas):
+            for ligado in (False, True):
+                vazao, amostra = executar(args.modo, ligado, db_path, args.port, args.clientes, args.segundos)
+                vazoes[ligado].append(vazao)
+                print(f"métricas {'ligadas' if ligado else 'desligadas':<11}{vazao:10,.0f} mensagens/s   {amostra}")
+
+    sem, com = max(vazoes[False]), max(vazoes[True])
+    print(f"\nMelhor rodada: {sem:,.0f} -> {com:,.0f} mensagens/s ({(sem - com) / sem:+.1%}; diferenças "
+          f"de poucos % estão dentro do ruído entre rodadas)")
+    print(f"Estimativa: {custo_mensagem / 1000:.1f} µs de instrumentação por mensagem, sobre {1e6 / sem:.0f} µs "
+          f"de servidor por mensagem = {custo_mensagem / 1000 * sem / 1e6:.1%}")
+    print("\n--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_migracoes --amizades 2000000
+#
+# Popula um banco temporário (só com as tabelas base, versão 0 do esquema) com milhões de amizades,
+# mede as consultas de amigos/pedidos pendentes, aplica as migrações de create_db e mede de novo.
+
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import create_db
+from db_manager import SQL_FRIENDSHIPS_OF
+
+CONSULTAS = {
+    'amigos (como A)': "SELECT user_nickname_b FROM friendships WHERE user_nickname_a = ? AND status = 'accepted'",
+    'amigos (como B)': "SELECT user_nickname_a FROM friendships WHERE user_nickname_b = ? AND status = 'accepted'",
+    'pedidos pendentes': "SELECT user_nickname_a FROM friendships WHERE user_nickname_b = ? AND status = 'pending'",
+}
+
+def preparar_banco(db_path: str, num_usuarios: int, num_amizades: int):
+    conn = sqlite3.connect(db_path)
+    conn.execute(create_db.SQL_CREATE_USERS_TABLE)
+    conn.execute(create_db.SQL_CREATE_FRIENDSHIPS_TABLE)
+    conn.executemany("INSERT INTO users (nickname, name, password_hash) VALUES (?, ?, 'x')",
+                     ((f"user{i}", f"Usuario {i}") for i in range(num_usuarios)))
+    rng = random.Random(7)
+
+    def amizades():
+        for k in range(num_amizades):
+            a = k % num_usuarios
+            b = (a + 1 + k // num_usuarios + rng.randrange(num_usuarios - 1)) % num_usuarios
+            if a != b:
+                yield f"user{a}", f"user{b}", 'pending' if rng.random() < 0.1 else 'accepted'
+
+    conn.executemany("INSERT OR IGNORE INTO friendships (user_nickname_a, user_nickname_b, status) VALUES (?, ?, ?)",
+                     amizades())
+    conn.commit()
+    total = conn.execute("SELECT COUNT(*) FROM friendships").fetchone()[0]
+    conn.close()
+    return total
+
+def medir(conn, sql: str, parametros: int, usuarios: list) -> str:
+    latencias = []
+    for nickname in usuarios:
+        inicio = time.perf_counter()
+        conn.execute(sql, (nickname,) * parametros).fetchall()
+        latencias.append(time.perf_counter() - inicio)
+    ordenadas = sorted(latencias)
+    p99 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.99))]
+    return f"p50 {statistics.median(ordenadas) * 1000:>9.3f} ms   p99 {p99 * 1000:>9.3f} ms"
+
+def plano(conn, sql: str, parametros: int) -> str:
+    linhas = conn.execute("EXPLAIN QUERY PLAN " + sql, ('user0',) * parametros).fetchall()
+    return '; '.join(linha[3] for linha in linhas)
+
+def relatorio(conn, usuarios: list):
+    for nome, sql in (*CONSULTAS.items(), ('carga do cache (UNION)', SQL_FRIENDSHIPS_OF)):
+        parametros = sql.count('?')
+        print(f"  {nome:<24} {medir(conn, sql, parametros, usuarios)}")
+        print(f"  {'':<24} plano: {plano(conn, sql, parametros)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das consultas de amizade antes/depois das migrações")
+    parser.add_argument('--usuarios', type=int, default=200000)
+    parser.add_argument('--amizades', type=int, default=2000000)
+    parser.add_argument('--consultas', type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'voip.db')
+        print("--- Benchmark: migrações do esquema ---\n")
+        inicio = time.perf_counter()
+        total = preparar_banco(db_path, args.usuarios, args.amizades)
+        print(f"{total:,} amizades entre {args.usuarios:,} usuários inseridas em {time.perf_counter() - inicio:.1f}s\n")
+
+        usuarios = [f"user{random.randrange(args.usuarios)}" for _ in range(args.consultas)]
+        conn = sqlite3.connect(db_path)
+
+        print(f"Antes (esquema versão {conn.execute('PRAGMA user_version').fetchone()[0]}):")
+        relatorio(conn, usuarios)
+
+        inicio = time.perf_counter()
+        versao = create_db.migrate(conn)
+        print(f"\nMigrações aplicadas em {time.perf_counter() - inicio:.1f}s\n")
+
+        print(f"Depois (esquema versão {versao}):")
+        relatorio(conn, usuarios)
+        conn.close()
+
+    print("\n--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
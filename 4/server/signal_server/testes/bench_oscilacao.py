@@ -0,0 +1,202 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_oscilacao --observadores 20 --oscilantes 10 --segundos 3 --modo async
+#
+# Tempestade de presença: usuários "oscilantes" entram e saem sem parar enquanto "observadores" (amigos de
+# todos eles) recebem as mudanças de status. Compara os frames de status recebidos pelos observadores com
+# PRESENCE_COALESCE_MS=0 (um STATUS_UPDATE por mudança), com a janela de presença para clientes antigos
+# (um STATUS_UPDATE por usuário e janela) e para clientes que anunciam FEATURE_STATUS_BATCH (um frame
+# STATUS_UPDATE_BATCH por janela). No fim confere que todos os observadores veem os oscilantes Offline.
+
+import argparse
+import logging
+import os
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import config
+import create_db
+import passwords
+from protocol import CommandCode, FEATURE_STATUS_BATCH, protocol
+
+SIGNAL_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HOST = '127.0.0.1'
+FMT_HEADER = struct.Struct('!BH')
+
+# Sobe o servidor apontando o banco para o arquivo temporário
+SERVER_CODE = """
+import sys, db_manager, server
+db_manager.DB_PATH = sys.argv.pop(1)
+server.main()
+"""
+
+def preparar_banco(db_path: str, num_observadores: int, num_oscilantes: int):
+    create_db.DB_PATH = db_path
+    create_db.DB_DIR = os.path.dirname(db_path)
+    create_db.setup_database()
+    config.PASSWORD_HASH_ITERATIONS = 1
+    password_hash = passwords.hash_password('senha')
+    observadores = [f"obs{i}" for i in range(num_observadores)]
+    oscilantes = [f"osc{i}" for i in range(num_oscilantes)]
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO users (nickname, name, password_hash) VALUES (?, ?, ?)",
+                     ((nickname, nickname, password_hash) for nickname in observadores + oscilantes))
+    conn.executemany("INSERT INTO friendships (user_nickname_a, user_nickname_b, status) VALUES (?, ?, 'accepted')",
+                     ((obs, osc) for obs in observadores for osc in oscilantes))
+    conn.commit()
+    conn.close()
+    return observadores, oscilantes
+
+def esperar_porta(port: int, timeout: float = 10.0):
+    fim = time.time() + timeout
+    while time.time() < fim:
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Servidor não iniciou na porta {port}")
+
+def ler_frame(sock):
+    header = sock.recv(3, socket.MSG_WAITALL)
+    if len(header) < 3:
+        raise ConnectionError("Servidor fechou a conexão")
+    command_value, tamanho = FMT_HEADER.unpack(header)
+    payload = sock.recv(tamanho, socket.MSG_WAITALL) if tamanho else b''
+    return CommandCode(command_value), payload
+
+def logar(port: int, nickname: str, features: int = 0) -> socket.socket:
+    sock = socket.create_connection((HOST, port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    payload = {'nickname': nickname, 'password': 'senha'}
+    if features:
+        payload['features'] = features
+    sock.sendall(protocol.create_message(CommandCode.LOGIN, payload))
+    while True:
+        code, payload_bytes = ler_frame(sock)
+        if code == CommandCode.LOGIN_RESPONSE:
+            if not protocol.deserialize_payload(code, payload_bytes)['success']:
+                raise RuntimeError(f"Login de {nickname} recusado")
+            return sock
+
+# Conta os frames de status recebidos e mantém a visão do observador (nickname -> último status)
+class Observador(threading.Thread):
+    def __init__(self, sock):
+        super().__init__(daemon=True)
+        self.sock = sock
+        self.frames = 0
+        self.atualizacoes = 0
+        self.visao = {}
+
+    def run(self):
+        try:
+            while True:
+                code, payload_bytes = ler_frame(self.sock)
+                if code == CommandCode.STATUS_UPDATE:
+                    payload = protocol.deserialize_payload(code, payload_bytes)
+                    updates = [payload]
+                elif code == CommandCode.STATUS_UPDATE_BATCH:
+                    updates = protocol.deserialize_payload(code, payload_bytes)['updates']
+                else:
+                    continue
+                self.frames += 1
+                self.atualizacoes += len(updates)
+                for update in updates:
+                    self.visao[update['nickname']] = update['status']
+        except (ConnectionError, OSError):
+            pass
+
+def oscilar(port: int, nickname: str, parar: threading.Event, ciclos: list, i: int):
+    feitos = 0
+    while not parar.is_set():
+        logar(port, nickname).close()
+        # Espera o servidor registrar a saída antes de entrar de novo ("já conectado" derrubaria o ciclo)
+        time.sleep(0.002)
+        feitos += 1
+    ciclos[i] = feitos
+
+def executar(modo: str, janela_ms: float, lote: bool, db_path: str, port: int, observadores: list,
+             oscilantes: list, segundos: float):
+    env = dict(os.environ, PASSWORD_HASH_ITERATIONS='1', RATE_LIMITS='', PRESENCE_COALESCE_MS=str(janela_ms))
+    proc = subprocess.Popen([sys.executable, '-c', SERVER_CODE, db_path, '--mode', modo, '--host', HOST,
+                             '--port', str(port), '--log-mode', 'off'],
+                            cwd=SIGNAL_SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        esperar_porta(port)
+        features = FEATURE_STATUS_BATCH if lote else 0
+        leitores = [Observador(logar(port, nickname, features)) for nickname in observadores]
+        for leitor in leitores:
+            leitor.start()
+
+        parar = threading.Event()
+        ciclos = [0] * len(oscilantes)
+        threads = [threading.Thread(target=oscilar, args=(port, nickname, parar, ciclos, i))
+                   for i, nickname in enumerate(oscilantes)]
+        inicio = time.perf_counter()
+        for t in threads: t.start()
+        time.sleep(segundos)
+        parar.set()
+        for t in threads: t.join()
+        duracao = time.perf_counter() - inicio
+        # Tempo para a última janela ser entregue
+        time.sleep(janela_ms / 1000 + 0.5)
+        # shutdown() acorda o recv bloqueado na thread do observador (close() sozinho não acorda)
+        for leitor in leitores:
+            leitor.sock.shutdown(socket.SHUT_RDWR)
+            leitor.join()
+            leitor.sock.close()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    frames = sum(leitor.frames for leitor in leitores)
+    atualizacoes = sum(leitor.atualizacoes for leitor in leitores)
+    coerente = all(leitor.visao.get(nickname) == 'Offline' for leitor in leitores for nickname in oscilantes)
+    return sum(ciclos) / duracao, frames / duracao, atualizacoes / duracao, coerente
+
+def main():
+    parser = argparse.ArgumentParser(description="Frames de status enviados durante oscilação de presença")
+    parser.add_argument('--observadores', type=int, default=20)
+    parser.add_argument('--oscilantes', type=int, default=10)
+    parser.add_argument('--segundos', type=float, default=3)
+    parser.add_argument('--janela', type=float, default=200, help="PRESENCE_COALESCE_MS nas rodadas com janela")
+    parser.add_argument('--modo', choices=['thread', 'async'], default='async')
+    parser.add_argument('--port', type=int, default=18902)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    print(f"--- Benchmark: oscilação de presença ({args.oscilantes} oscilantes, {args.observadores} observadores, "
+          f"servidor {args.modo}) ---\n")
+    configuracoes = (('sem janela', 0, False),
+                     (f"janela {args.janela:g} ms", args.janela, False),
+                     (f"janela {args.janela:g} ms + lote", args.janela, True))
+    resultados = {}
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'voip.db')
+        observadores, oscilantes = preparar_banco(db_path, args.observadores, args.oscilantes)
+        for nome, janela, lote in configuracoes:
+            ciclos, frames, atualizacoes, coerente = executar(args.modo, janela, lote, db_path, args.port,
+                                                              observadores, oscilantes, args.segundos)
+            resultados[nome] = (ciclos, frames)
+            ok = ok and coerente
+            print(f"{nome:<24}{ciclos:8,.0f} entradas+saídas/s  {frames:10,.0f} frames de status/s  "
+                  f"{atualizacoes:10,.0f} atualizações/s   estado final {'OK' if coerente else 'INCORRETO'}")
+
+    # Normaliza pela taxa de oscilação de cada rodada, que varia com a carga do servidor
+    base_ciclos, base_frames = resultados['sem janela']
+    print()
+    for nome, (ciclos, frames) in list(resultados.items())[1:]:
+        reducao = (base_frames / base_ciclos) / max(frames / ciclos, 1e-9)
+        print(f"{nome}: {reducao:.0f}x menos frames de status por oscilação")
+    print("\n--- Fim do Benchmark ---")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
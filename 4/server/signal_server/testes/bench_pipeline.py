@@ -0,0 +1,98 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_pipeline --rodadas 2000
+#
+# Simula clientes que enviam vários comandos de uma vez (pipelining) para o handle_client
+# do modo thread, por um socketpair, e mede a latência de cada rodada e quantas escritas
+# (send_frames) o servidor fez para entregar as respostas. Compara o envio em lote
+# (BufferedConnection.batch) com o envio frame a frame.
+# Os comandos são enviados sem login, então cada um gera uma resposta de ERROR sem tocar no banco.
+
+import argparse
+import contextlib
+import logging
+import socket
+import statistics
+import threading
+import time
+
+import client_handler
+import outbound
+from outbound import BufferedConnection
+from protocol import CommandCode, protocol
+
+COMANDOS = [
+    protocol.create_message(CommandCode.GET_INITIAL_DATA, {}),
+    protocol.create_message(CommandCode.SEARCH_USER, {'nickname_query': 'ana'}),
+    protocol.create_message(CommandCode.ADD_FRIEND, {'target_nickname': 'bruno'}),
+]
+
+# Conta as chamadas de escrita feitas pelas threads escritoras
+escritas = 0
+send_frames_original = outbound.send_frames
+
+def send_frames_contando(sock, frames):
+    global escritas
+    escritas += 1
+    send_frames_original(sock, frames)
+
+def receber_respostas(sock, esperadas: int):
+    buffer = bytearray()
+    recebidas = 0
+    while recebidas < esperadas:
+        dados = sock.recv(65536)
+        if not dados:
+            raise ConnectionError("Servidor fechou a conexão")
+        buffer.extend(dados)
+        while len(buffer) >= 3:
+            tamanho = 3 + int.from_bytes(buffer[1:3], 'big')
+            if len(buffer) < tamanho:
+                break
+            del buffer[:tamanho]
+            recebidas += 1
+
+def executar(rodadas: int, profundidade: int) -> tuple:
+    global escritas
+    servidor, cliente = socket.socketpair()
+    handler = threading.Thread(target=client_handler.handle_client, args=(servidor, ('socketpair', 0)), daemon=True)
+    handler.start()
+
+    lote = b''.join(COMANDOS[i % len(COMANDOS)] for i in range(profundidade))
+    latencias = []
+    escritas = 0
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        cliente.sendall(lote)
+        receber_respostas(cliente, profundidade)
+        latencias.append(time.perf_counter() - inicio)
+
+    cliente.close()
+    handler.join(timeout=5)
+    return latencias, escritas / rodadas
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de comandos em pipeline no modo thread")
+    parser.add_argument('--rodadas', type=int, default=2000)
+    parser.add_argument('--profundidades', type=int, nargs='+', default=[1, 3, 16])
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    outbound.send_frames = send_frames_contando
+
+    batch_original = BufferedConnection.batch
+    print("--- Benchmark: comandos em pipeline ---\n")
+    print(f"{'Pipeline':>9}{'Modo':>14}{'p50 (us)':>10}{'p99 (us)':>11}{'escritas/rodada':>18}")
+    for profundidade in args.profundidades:
+        for modo in ('frame a frame', 'lote'):
+            if modo == 'lote':
+                BufferedConnection.batch = batch_original
+            else:
+                BufferedConnection.batch = lambda self: contextlib.nullcontext()
+            latencias, escritas_rodada = executar(args.rodadas, profundidade)
+            latencias_us = sorted(l * 1e6 for l in latencias)
+            p99 = latencias_us[min(len(latencias_us) - 1, int(len(latencias_us) * 0.99))]
+            print(f"{profundidade:>9}{modo:>14}{statistics.median(latencias_us):>10.0f}{p99:>11.0f}{escritas_rodada:>18.2f}")
+    BufferedConnection.batch = batch_original
+
+    print("\n--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_presenca --usuarios 50000 --amigos 200
+#
+# Compara o custo de um broadcast de status com varredura de todos os conectados
+# (caminho antigo) contra o índice reverso de amigos online do StateManager.
+
+import argparse
+import random
+import time
+
+from models import _StateManager
+
+# Grafo em anel: o usuário i é amigo dos `amigos/2` vizinhos de cada lado (simétrico, grau fixo)
+def amigos_de(i: int, num_usuarios: int, num_amigos: int):
+    metade = num_amigos // 2
+    for d in range(1, metade + 1):
+        yield f"user{(i + d) % num_usuarios}"
+        yield f"user{(i - d) % num_usuarios}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do índice reverso de presença")
+    parser.add_argument('--usuarios', type=int, default=50000)
+    parser.add_argument('--amigos', type=int, default=200)
+    parser.add_argument('--broadcasts', type=int, default=200)
+    args = parser.parse_args()
+
+    print("--- Benchmark: Broadcast de Status ---")
+    print(f"{args.usuarios} usuários online, {args.amigos} amigos cada, {args.broadcasts} broadcasts\n")
+
+    manager = _StateManager()
+    inicio = time.perf_counter()
+    for i in range(args.usuarios):
+        manager.add_user(f"user{i}", None, amigos_de(i, args.usuarios, args.amigos))
+    print(f"Carga do estado (login de todos): {time.perf_counter() - inicio:.2f}s")
+
+    amostra = [random.randrange(args.usuarios) for _ in range(args.broadcasts)]
+
+    # Caminho antigo: copia todos os conectados e testa pertinência na lista de amigos
+    entregues_antigo = 0
+    inicio = time.perf_counter()
+    for i in amostra:
+        friends_of_changed_user = frozenset(amigos_de(i, args.usuarios, args.amigos))
+        for nickname, user_obj in manager.get_all_users_items():
+            if nickname in friends_of_changed_user:
+                entregues_antigo += 1
+    duracao_antigo = time.perf_counter() - inicio
+
+    # Caminho novo: apenas os amigos online, pelo índice reverso
+    entregues_indice = 0
+    inicio = time.perf_counter()
+    for i in amostra:
+        for user_obj in manager.get_online_friends(f"user{i}"):
+            entregues_indice += 1
+    duracao_indice = time.perf_counter() - inicio
+
+    assert entregues_antigo == entregues_indice, "Os dois caminhos deveriam entregar as mesmas mensagens"
+
+    print(f"\n{'Caminho':<22}{'broadcasts/s':>14}{'us/broadcast':>14}{'entregas':>12}")
+    for nome, duracao, entregas in (("varredura completa", duracao_antigo, entregues_antigo),
+                                    ("índice reverso", duracao_indice, entregues_indice)):
+        print(f"{nome:<22}{args.broadcasts / duracao:>14,.0f}{duracao / args.broadcasts * 1e6:>14.1f}{entregas:>12}")
+    print(f"\nGanho: {duracao_antigo / duracao_indice:.1f}x")
+    print("\n--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
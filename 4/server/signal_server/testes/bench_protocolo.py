@@ -0,0 +1,72 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_protocolo --iteracoes 50000
+#
+# Mede a vazão de codificação (create_message) e decodificação (deserialize_payload)
+# do VoipProtocol para cada CommandCode, com payloads de exemplo.
+
+import argparse
+import time
+
+from protocol import CommandCode, protocol, PAYLOAD_SCHEMAS
+
+AMIGOS = [{'nickname': f"amigo_{i}", 'status': 'Online' if i % 3 else 'Offline'} for i in range(50)]
+
+# Payload de exemplo para cada comando
+EXEMPLOS = {
+    CommandCode.REGISTER: {'nickname': 'usuario_teste', 'password': 'senha_secreta', 'name': 'Usuário de Teste'},
+    CommandCode.LOGIN: {'nickname': 'usuario_teste', 'password': 'senha_secreta'},
+    CommandCode.GET_INITIAL_DATA: {},
+    CommandCode.SEARCH_USER: {'nickname_query': 'ana'},
+    CommandCode.ADD_FRIEND: {'target_nickname': 'amigo_1'},
+    CommandCode.ACCEPT_FRIEND: {'requester_nickname': 'amigo_2'},
+    CommandCode.REJECT_FRIEND: {'requester_nickname': 'amigo_3'},
+    CommandCode.INVITE: {'target_nickname': 'amigo_1'},
+    CommandCode.ACCEPT: {'caller_nickname': 'amigo_1'},
+    CommandCode.REJECT: {'caller_nickname': 'amigo_1'},
+    CommandCode.BYE: {},
+    CommandCode.REGISTER_RESPONSE: {'success': True, 'message': 'Registo concluido com sucesso!'},
+    CommandCode.LOGIN_RESPONSE: {'success': True, 'message': 'Login bem-sucedido!', 'nickname': 'usuario_teste'},
+    CommandCode.ADD_FRIEND_RESPONSE: {'success': True, 'message': 'Pedido de amizade enviado.'},
+    CommandCode.INVITE_RESPONSE: {'success': True, 'message': 'A chamar amigo_1...'},
+    CommandCode.ERROR: {'success': False, 'message': 'Autenticacao necessaria.'},
+    CommandCode.FRIEND_LIST: {'friends': AMIGOS},
+    CommandCode.PENDING_FRIEND_REQUESTS: {'requests_from': [a['nickname'] for a in AMIGOS[:10]]},
+    CommandCode.SEARCH_RESPONSE: {'success': True, 'results': [{'nickname': a['nickname'], 'name': 'Nome'} for a in AMIGOS[:20]]},
+    CommandCode.INCOMING_FRIEND_REQUEST: {'from_nickname': 'amigo_4'},
+    CommandCode.FRIEND_REQUEST_ACCEPTED: {'by_nickname': 'amigo_4', 'status': 'Online'},
+    CommandCode.INCOMING_CALL: {'from_nickname': 'amigo_1'},
+    CommandCode.CALL_ACCEPTED: {'callee_nickname': 'amigo_1', 'relay_ip': '127.0.0.1', 'relay_port': 9000,
+                                'token': '0123456789abcdef0123456789abcdef'},
+    CommandCode.CALL_REJECTED: {'callee_nickname': 'amigo_1'},
+    CommandCode.CALL_ENDED: {'from_nickname': 'amigo_1'},
+    CommandCode.STATUS_UPDATE: {'nickname': 'amigo_1', 'status': 'Em Chamada'},
+}
+
+def medir(funcao, iteracoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(iteracoes):
+        funcao()
+    return iteracoes / (time.perf_counter() - inicio)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de codificação/decodificação do VoipProtocol")
+    parser.add_argument('--iteracoes', type=int, default=50000)
+    args = parser.parse_args()
+
+    print("--- Benchmark: VoipProtocol ---\n")
+    print(f"{'Comando':<26}{'bytes':>7}{'encode/s':>14}{'decode/s':>14}")
+    for command_code in PAYLOAD_SCHEMAS:
+        payload = EXEMPLOS.get(command_code, {})
+        mensagem = protocol.create_message(command_code, payload)
+        corpo = memoryview(mensagem)[3:]
+        assert protocol.deserialize_payload(command_code, corpo) is not None
+
+        iteracoes = args.iteracoes if len(mensagem) < 512 else max(args.iteracoes // 20, 1)
+        encode_s = medir(lambda: protocol.create_message(command_code, payload), iteracoes)
+        decode_s = medir(lambda: protocol.deserialize_payload(command_code, corpo), iteracoes)
+        print(f"{command_code.name:<26}{len(mensagem):>7}{encode_s:>14,.0f}{decode_s:>14,.0f}")
+
+    print("\n--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_reaper --conexoes 100000 --segundos 20
+#
+# Custo do reaper de conexões ociosas com muitas conexões: os clientes mandam PING periodicamente
+# (touch em parte das conexões a cada tick) e uma fração fica muda, como uma conexão TCP meio aberta.
+# Compara o tick da roda de temporização (examina só o slot atual) com uma varredura de todas as
+# conexões a cada tick, e confere que todas as mudas e só elas foram encerradas dentro do prazo.
+
+import argparse
+import random
+import statistics
+import time
+
+from heartbeat import _IdleReaper
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do reaper de conexões ociosas")
+    parser.add_argument('--conexoes', type=int, default=100000)
+    parser.add_argument('--timeout', type=float, default=6.0, help="timeout do heartbeat (s)")
+    parser.add_argument('--tick', type=float, default=0.1)
+    parser.add_argument('--intervalo-ping', type=float, default=2.0, help="intervalo do PING dos clientes (s)")
+    parser.add_argument('--mudas', type=float, default=0.01, help="fração de conexões que param de responder")
+    parser.add_argument('--segundos', type=float, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    reaper = _IdleReaper(args.timeout, args.tick, start_thread=False)
+    encerradas = {}
+    watches = [reaper.register(lambda i=i: encerradas.__setitem__(i, time.monotonic()), i) for i in range(args.conexoes)]
+    mudas = set(rng.sample(range(args.conexoes), int(args.conexoes * args.mudas)))
+    ativas = [w for i, w in enumerate(watches) if i not in mudas]
+    inicio_mudas = time.monotonic()
+
+    print(f"--- Benchmark: reaper de conexões ociosas ({args.conexoes:,} conexões) ---\n")
+    por_tick = max(1, int(len(ativas) * args.tick / args.intervalo_ping))
+    tempos_roda, tempos_varredura, tempos_touch = [], [], []
+    proximo = time.monotonic()
+    fim = proximo + args.segundos
+    cursor = 0
+    while proximo < fim:
+        proximo += args.tick
+        espera = proximo - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+
+        # PINGs que chegaram neste tick
+        t0 = time.perf_counter()
+        for _ in range(por_tick):
+            ativas[cursor].touch(reaper)
+            cursor = (cursor + 1) % len(ativas)
+        tempos_touch.append((time.perf_counter() - t0) / por_tick)
+
+        t0 = time.perf_counter()
+        reaper.tick()
+        tempos_roda.append(time.perf_counter() - t0)
+
+        # Alternativa ingênua: varrer todas as conexões procurando prazos vencidos
+        t0 = time.perf_counter()
+        limite = reaper.now - args.timeout
+        vencidas = [w for w in watches if not w.closed and w.last_seen <= limite]
+        tempos_varredura.append(time.perf_counter() - t0)
+
+    def resumo(tempos):
+        ordenados = sorted(tempos)
+        return (f"p50 {statistics.median(ordenados) * 1000:7.3f} ms   máx {ordenados[-1] * 1000:7.3f} ms   "
+                f"({sum(ordenados) / args.segundos * 100:.2f}% de uma CPU)")
+
+    print(f"Tick da roda ({reaper._num_slots} slots):   {resumo(tempos_roda)}")
+    print(f"Varredura completa por tick: {resumo(tempos_varredura)}")
+    print(f"touch() por PING:            {statistics.mean(tempos_touch) * 1e9:.0f} ns")
+
+    indevidas = set(encerradas) - mudas
+    atrasos = [encerradas[i] - inicio_mudas for i in mudas if i in encerradas]
+    print(f"\nMudas encerradas: {len(atrasos)}/{len(mudas)} (indevidas: {len(indevidas)}), "
+          f"após {min(atrasos):.2f}-{max(atrasos):.2f}s (timeout {args.timeout}s)" if atrasos else "\nNenhuma conexão encerrada")
+    print("\n--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
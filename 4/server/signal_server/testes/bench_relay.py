@@ -0,0 +1,163 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_relay --pares 200 --pps 50 --segundos 5
+#
+# Sobe o relay UDP em Python (media_relay.py) num subprocesso e simula pares de chamada: cada participante
+# tem seu próprio socket e envia pacotes no formato do relay (id da sessão + token mágico + áudio) com o
+# instante de envio no payload; o outro lado mede a latência de ponta a ponta. Roda duas cargas:
+# ritmo de áudio (--pps pacotes/s por participante, 50 = quadros de 20 ms) e vazão máxima com janela de
+# pacotes em trânsito. Compara um datagram_received por pacote (--no-batch) com a leitura em lote.
+
+import argparse
+import os
+import secrets
+import selectors
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import time
+
+from media_relay import MAGIC_TOKEN
+
+SIGNAL_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HOST = '127.0.0.1'
+FMT_TIMESTAMP = struct.Struct('!d')
+AUDIO_BYTES = 160
+
+class Par:
+    def __init__(self):
+        self.prefixo = secrets.token_hex(16)[:16].encode() + MAGIC_TOKEN
+        self.sockets = []
+        for _ in range(2):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            sock.bind((HOST, 0))
+            sock.setblocking(False)
+            self.sockets.append(sock)
+
+def pacote(par: Par) -> bytes:
+    return par.prefixo + FMT_TIMESTAMP.pack(time.perf_counter()) + bytes(AUDIO_BYTES)
+
+def esvaziar(sock, latencias) -> int:
+    recebidos = 0
+    while True:
+        try:
+            dados = sock.recv(2048)
+        except BlockingIOError:
+            return recebidos
+        if latencias is not None:
+            latencias.append(time.perf_counter() - FMT_TIMESTAMP.unpack_from(dados, 24)[0])
+        recebidos += 1
+
+def esperar_relay(relay, timeout: float = 10.0):
+    # O relay não responde a pacotes de sessão nova sem par: espera um par de teste trocar um pacote
+    par = Par()
+    fim = time.time() + timeout
+    while time.time() < fim:
+        for sock in par.sockets:
+            sock.sendto(pacote(par), relay)
+        time.sleep(0.1)
+        if esvaziar(par.sockets[0], None) or esvaziar(par.sockets[1], None):
+            break
+    else:
+        raise RuntimeError("Relay não respondeu")
+    for sock in par.sockets:
+        sock.close()
+
+def simular(relay, pares: list, pps: float, segundos: float, janela: int):
+    seletor = selectors.DefaultSelector()
+    participantes = [(par, sock) for par in pares for sock in par.sockets]
+    for par, sock in participantes:
+        seletor.register(sock, selectors.EVENT_READ)
+        # Primeiro pacote de cada lado registra o endereço na sessão do relay
+        sock.sendto(pacote(par), relay)
+    time.sleep(0.2)
+    for _, sock in participantes:
+        esvaziar(sock, None)
+
+    latencias = []
+    enviados = recebidos = descontados = 0
+    intervalo = 1.0 / (pps * len(participantes)) if pps > 0 else 0.0
+    inicio = time.perf_counter()
+    fim = inicio + segundos
+    proximo = inicio
+    i = 0
+    while True:
+        agora = time.perf_counter()
+        if agora >= fim:
+            break
+        if pps > 0:
+            while proximo <= agora:
+                par, sock = participantes[i % len(participantes)]
+                sock.sendto(pacote(par), relay)
+                enviados += 1
+                i += 1
+                proximo += intervalo
+            timeout = max(0.0, min(proximo, fim) - time.perf_counter())
+        else:
+            # Vazão máxima: mantém no máximo `janela` pacotes em trânsito
+            while enviados - recebidos - descontados < janela:
+                par, sock = participantes[i % len(participantes)]
+                try:
+                    sock.sendto(pacote(par), relay)
+                except BlockingIOError:
+                    break
+                enviados += 1
+                i += 1
+            timeout = 0.01
+        prontos = seletor.select(timeout)
+        for chave, _ in prontos:
+            recebidos += esvaziar(chave.fileobj, latencias)
+        if pps == 0 and not prontos:
+            # Nada chegou em 10 ms: o que estava em trânsito se perdeu; libera a janela
+            descontados = enviados - recebidos
+    duracao = time.perf_counter() - inicio
+    time.sleep(0.1)
+    for _, sock in participantes:
+        esvaziar(sock, latencias)
+    seletor.close()
+    return enviados, len(latencias), duracao, latencias
+
+def executar(batched: bool, port: int, num_pares: int, pps: float, segundos: float, janela: int):
+    relay = (HOST, port)
+    args = [sys.executable, 'media_relay.py', '--host', HOST, '--port', str(port)]
+    if not batched:
+        args.append('--no-batch')
+    proc = subprocess.Popen(args, cwd=SIGNAL_SERVER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        esperar_relay(relay)
+        rotulo = "lote (recvfrom_into até esvaziar)" if batched else "datagram_received por pacote"
+        print(f"Relay: {rotulo}")
+        for carga, taxa in ((f"{num_pares} pares a {pps:.0f} pps", pps), (f"vazão máxima (janela {janela})", 0)):
+            pares = [Par() for _ in range(num_pares)]
+            enviados, recebidos, duracao, latencias = simular(relay, pares, taxa, segundos, janela)
+            for par in pares:
+                for sock in par.sockets:
+                    sock.close()
+            ordenadas = sorted(latencias) or [0.0]
+            p99 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.99))]
+            perda = (1 - recebidos / enviados) * 100 if enviados else 0.0
+            print(f"  {carga:<28} {recebidos / duracao:>9,.0f} pacotes/s   perda {perda:5.2f}%   "
+                  f"p50 {statistics.median(ordenadas) * 1000:6.2f} ms   p99 {p99 * 1000:6.2f} ms")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de vazão e latência do relay UDP em Python")
+    parser.add_argument('--pares', type=int, default=200)
+    parser.add_argument('--pps', type=float, default=50, help="pacotes por segundo por participante")
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--janela', type=int, default=256, help="pacotes em trânsito na carga de vazão máxima")
+    parser.add_argument('--port', type=int, default=19900)
+    args = parser.parse_args()
+
+    print("--- Benchmark: relay UDP em Python ---\n")
+    for batched in (False, True):
+        executar(batched, args.port, args.pares, args.pps, args.segundos, args.janela)
+        print()
+    print("--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_sincronizacao --amigos 5000 --novos 20 --online 50 --modo async
+#
+# Reconexão com a lista de amigos em cache. Um usuário com N amigos (anteriores à migração 3, então a
+# primeira sincronização é completa) conecta com since_version=0 e guarda lista e versão. Desconectado,
+# aceita --novos amizades noutra sessão e --online amigos entram. Na reconexão compara os bytes da
+# FRIEND_LIST completa (cliente sem cache) com o FRIEND_LIST_DELTA, e confere que o cache mais o delta
+# é igual à lista completa (amigos e status).
+
+import argparse
+import logging
+import os
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import config
+import create_db
+import passwords
+from protocol import CommandCode, protocol
+
+SIGNAL_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HOST = '127.0.0.1'
+FMT_HEADER = struct.Struct('!BH')
+
+# Sobe o servidor apontando o banco para o arquivo temporário
+SERVER_CODE = """
+import sys, db_manager, server
+db_manager.DB_PATH = sys.argv.pop(1)
+server.main()
+"""
+
+# Tabelas base populadas antes das migrações, como um banco já em uso que recebe a migração 3
+def preparar_banco(db_path: str, num_amigos: int, num_novos: int):
+    config.PASSWORD_HASH_ITERATIONS = 1
+    password_hash = passwords.hash_password('senha')
+    conn = sqlite3.connect(db_path)
+    conn.execute(create_db.SQL_CREATE_USERS_TABLE)
+    conn.execute(create_db.SQL_CREATE_FRIENDSHIPS_TABLE)
+    conn.execute("INSERT INTO users (nickname, name, password_hash) VALUES ('dono', 'Dono', ?)", (password_hash,))
+    conn.executemany("INSERT INTO users (nickname, name, password_hash) VALUES (?, ?, ?)",
+                     ((f"amigo_{i:06d}", f"Amigo {i}", password_hash) for i in range(num_amigos + num_novos)))
+    conn.executemany("INSERT INTO friendships (user_nickname_a, user_nickname_b, status) VALUES ('dono', ?, 'accepted')",
+                     ((f"amigo_{i:06d}",) for i in range(num_amigos)))
+    conn.commit()
+    create_db.migrate(conn)
+    conn.close()
+
+def esperar_porta(port: int, timeout: float = 10.0):
+    fim = time.time() + timeout
+    while time.time() < fim:
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Servidor não iniciou na porta {port}")
+
+def ler_frame(sock):
+    header = sock.recv(3, socket.MSG_WAITALL)
+    if len(header) < 3:
+        raise ConnectionError("Servidor fechou a conexão")
+    command_value, tamanho = FMT_HEADER.unpack(header)
+    payload = sock.recv(tamanho, socket.MSG_WAITALL) if tamanho else b''
+    return CommandCode(command_value), payload
+
+def logar(port: int, nickname: str) -> socket.socket:
+    sock = socket.create_connection((HOST, port))
+    sock.sendall(protocol.create_message(CommandCode.LOGIN, {'nickname': nickname, 'password': 'senha'}))
+    while ler_frame(sock)[0] != CommandCode.LOGIN_RESPONSE:
+        pass
+    return sock
+
+def esperar(sock, command_code: CommandCode) -> dict:
+    while True:
+        code, payload_bytes = ler_frame(sock)
+        if code == command_code:
+            return protocol.deserialize_payload(code, payload_bytes)
+
+# Pede os dados iniciais e aplica a resposta ao cache (dicionário nickname -> status); retorna os bytes
+# recebidos e a versão. Sem `since_version` só chega a FRIEND_LIST; com ela, um delta (precedido da lista
+# completa quando o servidor não consegue montar o delta).
+def sincronizar(sock, cache: dict, since_version=None):
+    payload = {} if since_version is None else {'since_version': since_version}
+    sock.sendall(protocol.create_message(CommandCode.GET_INITIAL_DATA, payload))
+    recebidos, version, completa = 0, since_version, False
+    while True:
+        code, payload_bytes = ler_frame(sock)
+        if code not in (CommandCode.FRIEND_LIST, CommandCode.FRIEND_LIST_DELTA):
+            continue
+        recebidos += 3 + len(payload_bytes)
+        dados = protocol.deserialize_payload(code, payload_bytes)
+        if code == CommandCode.FRIEND_LIST:
+            if not completa:
+                cache.clear()
+                completa = True
+            cache.update((f['nickname'], f['status']) for f in dados['friends'])
+            if dados.get('more') or since_version is not None:
+                continue
+            return recebidos, version, completa
+        for nickname in dados['removed']:
+            cache.pop(nickname, None)
+        cache.update((f['nickname'], f['status']) for f in dados['added'])
+        cache.update((f['nickname'], f['status']) for f in dados['statuses'] if f['nickname'] in cache)
+        return recebidos, dados['version'], completa
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincronização incremental da lista de amigos na reconexão")
+    parser.add_argument('--amigos', type=int, default=5000)
+    parser.add_argument('--novos', type=int, default=20, help="Amizades aceitas enquanto o cliente estava fora")
+    parser.add_argument('--online', type=int, default=50, help="Amigos que entram enquanto o cliente estava fora")
+    parser.add_argument('--modo', choices=['thread', 'async'], default='async')
+    parser.add_argument('--port', type=int, default=18901)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    print(f"--- Benchmark: sincronização da lista de amigos ({args.amigos:,} amigos, servidor {args.modo}) ---\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'voip.db')
+        preparar_banco(db_path, args.amigos, args.novos)
+        env = dict(os.environ, PASSWORD_HASH_ITERATIONS='1', RATE_LIMITS='')
+        proc = subprocess.Popen([sys.executable, '-c', SERVER_CODE, db_path, '--mode', args.modo, '--host', HOST,
+                                 '--port', str(args.port), '--log-mode', 'off'],
+                                cwd=SIGNAL_SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            esperar_porta(args.port)
+            cache = {}
+            with logar(args.port, 'dono') as sock:
+                inicio = time.perf_counter()
+                primeira, versao, completa = sincronizar(sock, cache, 0)
+                tempo_primeira = time.perf_counter() - inicio
+            print(f"Primeira sincronização (since_version=0): {primeira:>9,} bytes {tempo_primeira * 1000:7.1f} ms   "
+                  f"{'lista completa' if completa else 'delta'} -> versão {versao}, {len(cache):,} amigos em cache")
+
+            # Enquanto o cliente está fora: novas amizades aceitas noutra sessão e amigos que entram
+            novos = [f"amigo_{i:06d}" for i in range(args.amigos, args.amigos + args.novos)]
+            with logar(args.port, 'dono') as sock:
+                for nickname in novos:
+                    with logar(args.port, nickname) as outro:
+                        outro.sendall(protocol.create_message(CommandCode.ADD_FRIEND, {'target_nickname': 'dono'}))
+                        esperar(outro, CommandCode.ADD_FRIEND_RESPONSE)
+                    sock.sendall(protocol.create_message(CommandCode.ACCEPT_FRIEND, {'requester_nickname': nickname}))
+                    esperar(sock, CommandCode.FRIEND_REQUEST_ACCEPTED)
+            online = [logar(args.port, f"amigo_{i:06d}") for i in range(min(args.online, args.amigos))]
+
+            with logar(args.port, 'dono') as sock:
+                referencia = {}
+                inicio = time.perf_counter()
+                completa_bytes, _, _ = sincronizar(sock, referencia)
+                tempo_completa = time.perf_counter() - inicio
+                # Como o cliente: os amigos em cache começam como Offline até o delta chegar
+                cache = dict.fromkeys(cache, 'Offline')
+                inicio = time.perf_counter()
+                delta_bytes, nova_versao, completa = sincronizar(sock, cache, versao)
+                tempo_delta = time.perf_counter() - inicio
+            for outro in online:
+                outro.close()
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(f"Reconexão sem cache (FRIEND_LIST):          {completa_bytes:>9,} bytes {tempo_completa * 1000:7.1f} ms")
+    print(f"Reconexão com cache (since_version={versao}):     {delta_bytes:>9,} bytes {tempo_delta * 1000:7.1f} ms   "
+          f"{'lista completa' if completa else 'delta'} -> versão {nova_versao}")
+    print(f"\nRedução: {completa_bytes / max(delta_bytes, 1):.0f}x menos bytes na reconexão")
+    igual = cache == referencia
+    print(f"Cache + delta igual à lista completa: {'sim' if igual else 'NÃO'} ({len(cache):,} amigos, "
+          f"{sum(1 for s in cache.values() if s != 'Offline')} online)")
+    print("\n--- Fim do Benchmark ---")
+    if not igual or completa:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.bench_workers --clientes 64 --workers 4 --segundos 5
+#
+# Mede a vazão de comandos do servidor com um processo e com vários workers na mesma porta (--workers,
+# SO_REUSEPORT). Os clientes rodam em processos separados, cada um com várias conexões logadas que
+# mantêm um SEARCH_USER em trânsito o tempo todo. Como a vazão é limitada pelo GIL de cada processo,
+# o ganho esperado é proporcional ao número de núcleos livres (com 1 núcleo não há ganho).
+# Ao final confere a entrega entre workers: um pedido de amizade entre todos os pares de clientes.
+
+import argparse
+import multiprocessing
+import os
+import selectors
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import config
+import create_db
+import passwords
+from protocol import CommandCode, protocol
+
+SIGNAL_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HOST = '127.0.0.1'
+FMT_HEADER = struct.Struct('!BH')
+
+# Sobe o servidor apontando o banco para o arquivo temporário
+SERVER_CODE = """
+import sys, db_manager, server
+db_manager.DB_PATH = sys.argv.pop(1)
+server.main()
+"""
+
+def preparar_banco(db_path: str, num_usuarios: int):
+    create_db.DB_PATH = db_path
+    create_db.DB_DIR = os.path.dirname(db_path)
+    create_db.setup_database()
+    config.PASSWORD_HASH_ITERATIONS = 1
+    password_hash = passwords.hash_password('senha')
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO users (nickname, name, password_hash) VALUES (?, ?, ?)",
+                     ((f"user{i}", f"Usuario {i}", password_hash) for i in range(num_usuarios)))
+    conn.commit()
+    conn.close()
+
+def esperar_porta(port: int, timeout: float = 10.0):
+    fim = time.time() + timeout
+    while time.time() < fim:
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Servidor não iniciou na porta {port}")
+
+class Cliente:
+    def __init__(self, port: int, nickname: str):
+        self.sock = socket.create_connection((HOST, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer = b''
+        self.nickname = nickname
+
+    def enviar(self, code, payload):
+        self.sock.sendall(protocol.create_message(code, payload))
+
+    # Lê frames disponíveis; com bloquear=True espera até chegar pelo menos um
+    def frames(self, bloquear: bool = True):
+        saida = []
+        while not saida:
+            dados = self.sock.recv(65536)
+            if not dados:
+                raise ConnectionError("Servidor fechou a conexão")
+            self.buffer += dados
+            while len(self.buffer) >= 3:
+                code, tamanho = FMT_HEADER.unpack_from(self.buffer)
+                if len(self.buffer) < 3 + tamanho:
+                    break
+                saida.append((code, protocol.deserialize_payload(CommandCode(code), self.buffer[3:3 + tamanho])))
+                self.buffer = self.buffer[3 + tamanho:]
+            if not bloquear:
+                break
+        return saida
+
+    def esperar(self, code):
+        while True:
+            for recebido, payload in self.frames():
+                if recebido == code:
+                    return payload
+
+def logar(port: int, nicknames) -> list:
+    clientes = []
+    for nickname in nicknames:
+        cliente = Cliente(port, nickname)
+        cliente.enviar(CommandCode.LOGIN, {'nickname': nickname, 'password': 'senha'})
+        if not cliente.esperar(CommandCode.LOGIN_RESPONSE)['success']:
+            raise RuntimeError(f"Login falhou para {nickname}")
+        clientes.append(cliente)
+    return clientes
+
+# Processo cliente: mantém um SEARCH_USER em trânsito por conexão e conta as respostas
+def gerar_carga(port: int, nicknames, segundos: float, resultado):
+    clientes = logar(port, nicknames)
+    seletor = selectors.DefaultSelector()
+    pedido = protocol.create_message(CommandCode.SEARCH_USER, {'nickname_query': 'user1'})
+    for cliente in clientes:
+        seletor.register(cliente.sock, selectors.EVENT_READ, cliente)
+        cliente.sock.sendall(pedido)
+    respostas = 0
+    fim = time.perf_counter() + segundos
+    while time.perf_counter() < fim:
+        for chave, _ in seletor.select(0.1):
+            cliente = chave.data
+            for code, _ in cliente.frames(bloquear=False):
+                if code == CommandCode.SEARCH_RESPONSE:
+                    respostas += 1
+                    cliente.sock.sendall(pedido)
+    resultado.put(respostas)
+    for cliente in clientes:
+        cliente.sock.close()
+
+# Cada cliente pede amizade ao seguinte; a notificação só chega se o barramento entregar entre workers
+def conferir_entregas(port: int, num_clientes: int) -> int:
+    clientes = logar(port, [f"user{i}" for i in range(num_clientes)])
+    for i, cliente in enumerate(clientes):
+        cliente.enviar(CommandCode.ADD_FRIEND, {'target_nickname': clientes[(i + 1) % num_clientes].nickname})
+    entregues = 0
+    for cliente in clientes:
+        cliente.sock.settimeout(5)
+        try:
+            cliente.esperar(CommandCode.INCOMING_FRIEND_REQUEST)
+            entregues += 1
+        except socket.timeout:
+            pass
+        cliente.sock.close()
+    return entregues
+
+def executar(modo: str, workers: int, db_path: str, port: int, num_clientes: int, processos: int,
+             segundos: float, log_path: str):
+    env = dict(os.environ, PASSWORD_HASH_ITERATIONS='1', RATE_LIMITS='', CLUSTER_SOCKET_PATH=os.path.join(os.path.dirname(db_path), 'bus.sock'))
+    with open(log_path, 'w') as log:
+        proc = subprocess.Popen([sys.executable, '-c', SERVER_CODE, db_path, '--mode', modo, '--host', HOST,
+                                 '--port', str(port), '--workers', str(workers)],
+                                cwd=SIGNAL_SERVER_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        esperar_porta(port)
+        time.sleep(0.5)
+        fila = multiprocessing.Queue()
+        por_processo = num_clientes // processos
+        geradores = [multiprocessing.Process(target=gerar_carga, args=(
+            port, [f"user{p * por_processo + i}" for i in range(por_processo)], segundos, fila))
+            for p in range(processos)]
+        for gerador in geradores: gerador.start()
+        total = sum(fila.get() for _ in geradores)
+        for gerador in geradores: gerador.join()
+        time.sleep(0.5)
+        entregues = conferir_entregas(port, num_clientes)
+    finally:
+        proc.terminate()
+        proc.wait()
+    rotulo = "1 processo" if workers <= 1 else f"{workers} workers"
+    print(f"{rotulo:<14}{total / segundos:>12,.0f} SEARCH_USER/s   notificações entregues: {entregues}/{num_clientes}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de vazão com vários workers de sinalização")
+    parser.add_argument('--clientes', type=int, default=64)
+    parser.add_argument('--processos', type=int, default=4, help="processos geradores de carga")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modo', choices=['thread', 'async'], default='async')
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--port', type=int, default=18895)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'voip.db')
+        preparar_banco(db_path, args.clientes)
+        print(f"--- Benchmark: workers de sinalização (modo {args.modo}, {os.cpu_count()} CPU(s)) ---\n")
+        for workers in (1, args.workers):
+            executar(args.modo, workers, db_path, args.port, args.clientes, args.processos,
+                     args.segundos, os.path.join(tmp, f'server_{workers}.log'))
+            # Cada rodada cria pedidos de amizade; as seguintes partem de um banco limpo
+            conn = sqlite3.connect(db_path)
+            conn.execute("DELETE FROM friendships")
+            conn.commit()
+            conn.close()
+    print("\n--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.simulacao_chamadas --chamadas 20000 --threads 16 --relays 4
+#
+# Simula muitas chamadas simultâneas passando pelo registro de sessões: várias threads (como os handlers
+# do modo thread) criam chamadas entre pares de usuários, conferem a sessão de cada participante, mantêm parte delas abertas e
+# encerram as outras por BYE. Verifica que tokens e ids de sessão do relay não se repetem entre sessões
+# ativas, que a carga fica distribuída entre os relays, que a contagem volta a zero ao encerrar tudo e que
+# sessões esquecidas expiram pelo TTL.
+
+import argparse
+import random
+import threading
+import time
+
+from call_sessions import RELAY_SESSION_ID_LEN, _CallSessionRegistry
+
+def simular(registro: _CallSessionRegistry, num_chamadas: int, num_threads: int, abertas_por_thread: int):
+    por_thread = num_chamadas // num_threads
+    erros = []
+    em_andamento = []
+    tokens_vistos = set()
+    lock = threading.Lock()
+
+    def trabalhador(tid):
+        rng = random.Random(tid)
+        abertas = []
+        for k in range(por_thread):
+            caller, callee = f"t{tid}_a{k}", f"t{tid}_b{k}"
+            sessao = registro.create(caller, callee)
+            if sessao is None:
+                erros.append(f"criação recusada para {caller}")
+                continue
+            if registro.get_for_user(caller) is not sessao or registro.get_for_user(callee) is not sessao:
+                erros.append(f"sessão recém-criada não encontrada pelos participantes: {sessao.token[:5]}...")
+            if registro.create(caller, f"outro_{tid}_{k}") is not None:
+                erros.append(f"{caller} entrou em duas chamadas ao mesmo tempo")
+            with lock:
+                if sessao.token in tokens_vistos:
+                    erros.append(f"token repetido: {sessao.token[:5]}...")
+                tokens_vistos.add(sessao.token)
+            abertas.append(sessao)
+            # Mantém até `abertas_por_thread` chamadas em andamento; encerra uma aleatória (BYE de um dos lados)
+            if len(abertas) > abertas_por_thread:
+                encerrada = abertas.pop(rng.randrange(len(abertas)))
+                registro.end_for_user(rng.choice((encerrada.caller, encerrada.callee)))
+                if registro.get_for_user(encerrada.caller) is not None or registro.get_for_user(encerrada.callee) is not None:
+                    erros.append(f"sessão continuou ativa após BYE: {encerrada.token[:5]}...")
+        em_andamento.append(abertas)
+
+    threads = [threading.Thread(target=trabalhador, args=(t,)) for t in range(num_threads)]
+    inicio = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    duracao = time.perf_counter() - inicio
+    abertas = [sessao for lista in em_andamento for sessao in lista]
+    return duracao, abertas, erros
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulação de chamadas simultâneas no registro de sessões")
+    parser.add_argument('--chamadas', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--relays', type=int, default=4)
+    parser.add_argument('--abertas', type=int, default=200, help="chamadas em andamento por thread")
+    args = parser.parse_args()
+
+    relays = [('10.0.0.%d' % (i + 1), 9000) for i in range(args.relays)]
+    falhou = False
+    print("--- Benchmark: simulação de chamadas simultâneas ---\n")
+    for selecao in ('least_loaded', 'hash'):
+        registro = _CallSessionRegistry(relays, selecao, ttl_seconds=3600)
+        duracao, abertas, erros = simular(registro, args.chamadas, args.threads, args.abertas)
+        cargas = registro.relay_loads()
+
+        ids_ativos = [sessao.relay_session_id for sessao in abertas]
+        if len(set(ids_ativos)) != len(ids_ativos) or any(len(i) != RELAY_SESSION_ID_LEN for i in ids_ativos):
+            erros.append("ids de sessão do relay repetidos entre sessões ativas")
+        if sum(cargas.values()) != len(abertas) or len(registro) != len(abertas):
+            erros.append(f"contagem inconsistente: {sum(cargas.values())} no relay x {len(abertas)} abertas")
+
+        print(f"Seleção '{selecao}': {args.chamadas} chamadas em {duracao:.2f}s "
+              f"({args.chamadas / duracao:,.0f} criações/s, {args.threads} threads)")
+        print(f"  {len(abertas)} em andamento; carga por relay: "
+              + ", ".join(f"{ip}={n}" for (ip, _), n in cargas.items()))
+        media = len(abertas) / len(relays)
+        print(f"  maior desvio da média: {max(abs(n - media) for n in cargas.values()) / media * 100:.1f}%")
+
+        for sessao in abertas:
+            registro.end_for_user(sessao.callee)
+        if len(registro) or any(registro.relay_loads().values()):
+            erros.append("sessões restantes após encerrar todas as chamadas")
+
+        for erro in erros[:10]:
+            print(f"  ERRO: {erro}")
+        falhou = falhou or bool(erros)
+        print()
+
+    # Sessões cujo BYE se perdeu devem sair pelo TTL na próxima criação
+    registro = _CallSessionRegistry(relays, 'least_loaded', ttl_seconds=0.05)
+    for k in range(100):
+        registro.create(f"esquecido_a{k}", f"esquecido_b{k}")
+    time.sleep(0.1)
+    sessao = registro.create("novo_a", "novo_b")
+    expirou = len(registro) == 1 and registro.get_for_user("novo_a") is sessao
+    print(f"Expiração pelo TTL: {'ok' if expirou else 'ERRO'} ({len(registro)} sessão(ões) ativa(s) após expirar 100)")
+    falhou = falhou or not expirou
+
+    print(f"\nResultado: {'FALHOU' if falhou else 'todas as verificações passaram'}")
+    print("\n--- Fim do Benchmark ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.teste_carga_conexoes --conexoes 5000
+#
+# Sobe o servidor em cada modo (thread e async), abre N conexões ociosas
+# e mede quantas foram aceitas, o uso de memória (RSS) e o número de threads do processo.
+
+import argparse
+import os
+import resource
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+SIGNAL_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HOST = '127.0.0.1'
+FMT_HEADER = struct.Struct('!BH')
+CMD_GET_INITIAL_DATA = 0x03
+
+# Lê VmRSS (KiB) e Threads de /proc/<pid>/status (apenas Linux)
+def ler_status_processo(pid: int) -> dict:
+    info = {'rss_kib': 0, 'threads': 0}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linha in f:
+                if linha.startswith('VmRSS:'):
+                    info['rss_kib'] = int(linha.split()[1])
+                elif linha.startswith('Threads:'):
+                    info['threads'] = int(linha.split()[1])
+    except OSError:
+        pass
+    return info
+
+def aumentar_limite_arquivos(necessarios: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    desejado = min(hard, max(soft, necessarios + 256))
+    if desejado > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (desejado, hard))
+    return desejado
+
+def esperar_porta(port: int, timeout: float = 10.0) -> bool:
+    fim = time.time() + timeout
+    while time.time() < fim:
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def executar_modo(modo: str, port: int, num_conexoes: int) -> dict:
+    proc = subprocess.Popen(
+        [sys.executable, 'server.py', '--mode', modo, '--host', HOST, '--port', str(port)],
+        cwd=SIGNAL_SERVER_DIR,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        preexec_fn=lambda: aumentar_limite_arquivos(num_conexoes)
+    )
+    sockets = []
+    try:
+        if not esperar_porta(port):
+            raise RuntimeError(f"Servidor ({modo}) não iniciou na porta {port}")
+        time.sleep(0.5)
+        base = ler_status_processo(proc.pid)
+
+        inicio = time.perf_counter()
+        for _ in range(num_conexoes):
+            try:
+                s = socket.create_connection((HOST, port), timeout=5)
+            except OSError as e:
+                print(f"  [{modo}] Falha ao abrir conexão #{len(sockets) + 1}: {e}")
+                break
+            sockets.append(s)
+        duracao = time.perf_counter() - inicio
+
+        # Um comando por conexão garante que todas foram aceitas e estão sendo atendidas
+        for s in sockets:
+            s.sendall(FMT_HEADER.pack(CMD_GET_INITIAL_DATA, 0))
+        atendidas = 0
+        for s in sockets:
+            try:
+                if s.recv(3):
+                    atendidas += 1
+            except OSError:
+                pass
+        time.sleep(0.5)
+        carga = ler_status_processo(proc.pid)
+
+        return {
+            'modo': modo,
+            'abertas': len(sockets),
+            'atendidas': atendidas,
+            'tempo_abertura_s': duracao,
+            'rss_base_kib': base['rss_kib'],
+            'rss_carga_kib': carga['rss_kib'],
+            'threads': carga['threads'],
+        }
+    finally:
+        for s in sockets:
+            s.close()
+        proc.terminate()
+        proc.wait(timeout=10)
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga de conexões ociosas por modo de servidor")
+    parser.add_argument('--conexoes', type=int, default=2000)
+    parser.add_argument('--porta', type=int, default=18888)
+    parser.add_argument('--modos', default='thread,async')
+    args = parser.parse_args()
+
+    aumentar_limite_arquivos(args.conexoes * 2)
+
+    print("--- Teste de Carga: Conexões Ociosas ---")
+    resultados = []
+    for i, modo in enumerate(args.modos.split(',')):
+        print(f"\nModo '{modo}': abrindo {args.conexoes} conexões...")
+        resultados.append(executar_modo(modo, args.porta + i, args.conexoes))
+
+    print(f"\n{'Modo':<8}{'Abertas':>9}{'Atendidas':>11}{'Threads':>9}{'RSS base':>12}{'RSS carga':>12}{'KiB/conn':>10}")
+    for r in resultados:
+        por_conexao = (r['rss_carga_kib'] - r['rss_base_kib']) / max(r['abertas'], 1)
+        print(f"{r['modo']:<8}{r['abertas']:>9}{r['atendidas']:>11}{r['threads']:>9}"
+              f"{r['rss_base_kib']:>10}Ki{r['rss_carga_kib']:>10}Ki{por_conexao:>10.1f}")
+
+    print("\n--- Fim do Teste de Carga ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Executar a partir de signal_server/:
+# python3 -m testes.teste_stress_state_manager --threads 64 --segundos 5
+#
+# Teste de estresse multi-thread do StateManager: mede vazão e espera em lock
+# do gerenciador antigo (um único lock global) contra a versão particionada.
+
+import argparse
+import random
+import threading
+import time
+
+from models import _StateManager, ConnectedUser
+
+NUM_USUARIOS = 5000
+AMIGOS = 20
+
+# Lock que contabiliza quantas aquisições precisaram esperar e o tempo total de espera
+class TimedLock:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_ns = 0
+
+    def __enter__(self):
+        if not self._lock.acquire(blocking=False):
+            inicio = time.perf_counter_ns()
+            self._lock.acquire()
+            self.wait_ns += time.perf_counter_ns() - inicio
+            self.contended += 1
+        self.acquisitions += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+# Referência: o gerenciador anterior, com um lock global em todas as leituras e escritas
+class _StateManagerLockGlobal:
+    def __init__(self):
+        self._connected_users: dict[str, ConnectedUser] = {}
+        self._online_friends: dict[str, set[str]] = {}
+        self._lock = TimedLock()
+
+    def add_user(self, nickname, conn, friends=()):
+        with self._lock:
+            if nickname in self._connected_users:
+                return False
+            self._connected_users[nickname] = ConnectedUser(nickname, conn)
+            online = {f for f in friends if f in self._connected_users}
+            self._online_friends[nickname] = online
+            for friend in online:
+                self._online_friends[friend].add(nickname)
+            return True
+
+    def remove_user(self, nickname):
+        with self._lock:
+            if nickname not in self._connected_users:
+                return None
+            for friend in self._online_friends.pop(nickname, ()):
+                self._online_friends[friend].discard(nickname)
+            return self._connected_users.pop(nickname)
+
+    def get_user(self, nickname):
+        with self._lock:
+            return self._connected_users.get(nickname)
+
+    def get_all_users_items(self):
+        with self._lock:
+            return list(self._connected_users.items())
+
+    def get_user_status_str(self, nickname):
+        with self._lock:
+            user = self._connected_users.get(nickname)
+            return user.get_status_str() if user else 'Offline'
+
+    def locks(self):
+        return [self._lock]
+
+def criar_particionado(num_shards: int) -> _StateManager:
+    manager = _StateManager(num_shards)
+    for shard in manager._shards:
+        shard.lock = TimedLock()
+    manager.locks = lambda: [s.lock for s in manager._shards]
+    return manager
+
+def amigos_de(i: int):
+    return [f"user{(i + d) % NUM_USUARIOS}" for d in range(1, AMIGOS + 1)]
+
+def executar(nome: str, manager, num_threads: int, segundos: float):
+    for i in range(NUM_USUARIOS):
+        manager.add_user(f"user{i}", None, amigos_de(i))
+
+    parar = threading.Event()
+    contagens = [0] * num_threads
+
+    def trabalhador(tid: int):
+        rnd = random.Random(tid)
+        ops = 0
+        while not parar.is_set():
+            for _ in range(200):
+                nick = f"user{rnd.randrange(NUM_USUARIOS)}"
+                r = rnd.random()
+                if r < 0.60:
+                    manager.get_user(nick)
+                elif r < 0.95:
+                    manager.get_user_status_str(nick)
+                elif r < 0.995:
+                    # Login/logout de um usuário (escrita)
+                    if manager.remove_user(nick):
+                        manager.add_user(nick, None, amigos_de(int(nick[4:])))
+                else:
+                    manager.get_all_users_items()
+                ops += 1
+        contagens[tid] = ops
+
+    threads = [threading.Thread(target=trabalhador, args=(t,)) for t in range(num_threads)]
+    for t in threads: t.start()
+    time.sleep(segundos)
+    parar.set()
+    for t in threads: t.join()
+
+    locks = manager.locks()
+    total_ops = sum(contagens)
+    aquisicoes = sum(l.acquisitions for l in locks)
+    contendidas = sum(l.contended for l in locks)
+    espera_ms = sum(l.wait_ns for l in locks) / 1e6
+    print(f"{nome:<26}{total_ops / segundos:>12,.0f}{aquisicoes:>14,}{contendidas:>12,}{espera_ms:>14,.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de estresse do StateManager")
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--segundos', type=float, default=3.0)
+    parser.add_argument('--shards', type=int, default=64)
+    args = parser.parse_args()
+
+    print("--- Teste de Estresse: StateManager ---")
+    print(f"{args.threads} threads, {args.segundos}s por cenário, {NUM_USUARIOS} usuários\n")
+    print(f"{'Cenário':<26}{'ops/s':>12}{'aquisições':>14}{'contendidas':>12}{'espera (ms)':>14}")
+    executar("lock global (antigo)", _StateManagerLockGlobal(), args.threads, args.segundos)
+    executar("particionado, 1 shard", criar_particionado(1), args.threads, args.segundos)
+    executar(f"particionado, {args.shards} shards", criar_particionado(args.shards), args.threads, args.segundos)
+    print("\n--- Fim do Teste de Estresse ---")
+
+if __name__ == "__main__":
+    main()
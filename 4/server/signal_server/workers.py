@@ -0,0 +1,121 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+import config
+from metrics import metrics
+
+# Pool de threads para trabalho pesado de CPU/banco (hash de senha no login e no registro),
+# separado das threads de I/O e do event loop. A fila é limitada: quando está cheia, submit
+# devolve None e quem chamou responde "ocupado" ao cliente em vez de acumular trabalho.
+# Com num_workers = 0 o trabalho roda na própria thread de quem chama (comportamento antigo).
+class _WorkerPool:
+    def __init__(self, name: str, num_workers: int, max_queue: int):
+        self._name = name
+        self._num_workers = num_workers
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_queue))
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+
+        # Métricas: profundidade da fila, rejeições e latências (espera na fila e execução)
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._max_depth = 0
+        self._wait_samples: deque[float] = deque(maxlen=1024)
+        self._run_samples: deque[float] = deque(maxlen=1024)
+        self._last_report = time.monotonic()
+
+    def _start_unlocked(self):
+        while len(self._threads) < self._num_workers:
+            thread = threading.Thread(target=self._worker_loop, daemon=True,
+                                      name=f"{self._name}-{len(self._threads)}")
+            self._threads.append(thread)
+            thread.start()
+
+    # Enfileira `job` e devolve um Future com o resultado, ou None se a fila estiver cheia
+    def submit(self, job: Callable, *args) -> Optional[Future]:
+        future = Future()
+        if self._num_workers <= 0:
+            self._run(future, time.perf_counter(), job, args)
+            return future
+
+        with self._lock:
+            self._start_unlocked()
+            try:
+                self._queue.put_nowait((future, time.perf_counter(), job, args))
+            except queue.Full:
+                self._rejected += 1
+                return None
+            self._max_depth = max(self._max_depth, self._queue.qsize())
+        return future
+
+    def _worker_loop(self):
+        while True:
+            future, enqueued_at, job, args = self._queue.get()
+            self._run(future, enqueued_at, job, args)
+
+    def _run(self, future: Future, enqueued_at: float, job: Callable, args: tuple):
+        if not future.set_running_or_notify_cancel():
+            return
+        started_at = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future.set_result(job(*args))
+        except BaseException as e:
+            future.set_exception(e)
+        finished_at = time.perf_counter()
+
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+            self._wait_samples.append(started_at - enqueued_at)
+            self._run_samples.append(finished_at - started_at)
+            report = time.monotonic() - self._last_report >= config.AUTH_METRICS_LOG_SECONDS
+            if report:
+                self._last_report = time.monotonic()
+        if report:
+            self._log_metrics()
+
+    @staticmethod
+    def _percentile(samples, fraction: float) -> float:
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    # Retrato das métricas atuais (latências em ms, sobre as últimas 1024 tarefas)
+    def metrics(self) -> dict:
+        with self._lock:
+            wait = list(self._wait_samples)
+            run = list(self._run_samples)
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_depth,
+                'in_flight': self._in_flight,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'wait_ms_p50': self._percentile(wait, 0.5) * 1000,
+                'wait_ms_p99': self._percentile(wait, 0.99) * 1000,
+                'run_ms_p50': self._percentile(run, 0.5) * 1000,
+                'run_ms_p99': self._percentile(run, 0.99) * 1000,
+            }
+
+    def _log_metrics(self):
+        m = self.metrics()
+        logging.info(f"Pool {self._name}: fila={m['queue_depth']} (máx {m['max_queue_depth']}), em execução={m['in_flight']}, "
+                     f"concluídas={m['completed']}, rejeitadas={m['rejected']}, "
+                     f"espera p50/p99={m['wait_ms_p50']:.1f}/{m['wait_ms_p99']:.1f} ms, "
+                     f"execução p50/p99={m['run_ms_p50']:.1f}/{m['run_ms_p99']:.1f} ms")
+
+
+# Instância global usada para login e registro
+auth_workers = _WorkerPool('Auth', config.AUTH_WORKERS, config.AUTH_QUEUE_SIZE)
+metrics.register_gauge('voip_auth_queue_depth', 'Pedidos de login/registro na fila do pool',
+                       lambda: auth_workers.metrics()['queue_depth'])
+metrics.register_gauge('voip_auth_rejected_total', 'Pedidos recusados com o pool saturado',
+                       lambda: auth_workers.metrics()['rejected'], kind='counter')